@@ -8,9 +8,12 @@ into providers later while keeping the public API stable.
 
 from __future__ import annotations
 
+import hashlib
+import json
 import re
+import threading
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
 
 
 DOMAIN_KEYWORDS: Dict[str, Sequence[str]] = {
@@ -59,6 +62,11 @@ class CategorizationResult:
     program: Optional[str] = None
     program_confidence: Optional[float] = None
     program_rationale: Optional[str] = None
+    # Ranking scores from learned_categorizer, not probabilities; never
+    # compared with the keyword confidences above
+    program_score: Optional[float] = None
+    folder: Optional[str] = None
+    folder_score: Optional[float] = None
 
     def as_dict(self) -> Dict[str, Optional[str]]:
         return {
@@ -68,88 +76,169 @@ class CategorizationResult:
             "program": self.program,
             "program_confidence": self.program_confidence,
             "program_rationale": self.program_rationale,
+            "program_score": self.program_score,
+            "folder": self.folder,
+            "folder_score": self.folder_score,
         }
 
 
-def _tokenize(text: str) -> List[str]:
-    return re.findall(r"[a-zA-Z0-9_]+", (text or "").lower())
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9_]+")
 
 
-def _score_keywords(tokens: Sequence[str], keywords: Sequence[str]) -> Tuple[int, List[str]]:
-    tokens_set = set(tokens)
-    matched = [kw for kw in keywords if kw in tokens_set]
-    return len(matched), matched
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
 
 
 def _program_keywords(program: Dict[str, object]) -> Sequence[str]:
-    raw_keywords = program.get("keywords") or []
-    if isinstance(raw_keywords, str):
-        raw_keywords = [part.strip() for part in raw_keywords.split(",") if part.strip()]
-    if isinstance(raw_keywords, Sequence):
-        keywords = [str(k).strip().lower() for k in raw_keywords if isinstance(k, (str, int))]
-    else:
-        keywords = []
+    keywords: List[str] = []
+    for field in ("keywords", "aliases"):
+        raw = program.get(field) or []
+        if isinstance(raw, str):
+            raw = [part.strip() for part in raw.split(",") if part.strip()]
+        if isinstance(raw, Sequence):
+            keywords.extend(str(k).strip().lower() for k in raw if isinstance(k, (str, int)) and str(k).strip())
     if not keywords:
         desc = str(program.get("description") or "").lower()
-        keywords = [w for w in re.findall(r"[a-zA-Z0-9_]+", desc) if len(w) > 3][:8]
-    return keywords
-
-
-def categorize_note(transcription: str, title: Optional[str], programs: Sequence[Dict[str, object]]) -> CategorizationResult:
-    tokens = _tokenize(f"{title or ''} {transcription or ''}")
-    if not tokens:
-        return CategorizationResult(
-            domain="general",
-            confidence=0.0,
-            rationale="No textual content to analyze.",
-        )
-
-    best_domain = "general"
-    best_conf = 0.0
-    best_matched: List[str] = []
-    for domain, keywords in DOMAIN_KEYWORDS.items():
-        score, matched = _score_keywords(tokens, keywords)
-        if score == 0:
-            continue
-        confidence = min(1.0, score / max(3, len(keywords) / 2))
-        if confidence > best_conf:
-            best_domain = domain
-            best_conf = confidence
-            best_matched = matched
-    if best_conf == 0.0:
-        rationale = "Defaulted to general domain (no keyword matches)."
-        result = CategorizationResult(domain="general", confidence=0.1, rationale=rationale)
-    else:
-        rationale = f"Matched domain '{best_domain}' via keywords: {', '.join(best_matched)}."
-        result = CategorizationResult(domain=best_domain, confidence=round(best_conf, 2), rationale=rationale)
-
-    candidate_programs = [p for p in programs if isinstance(p, dict)]
-    if result.domain != "general":
-        candidate_programs = [
-            p for p in candidate_programs if str(p.get("domain") or "").lower() == result.domain
-        ] or candidate_programs
-
-    best_program_key: Optional[str] = None
-    best_program_score = 0
-    best_program_keywords: List[str] = []
-    for program in candidate_programs:
-        key = str(program.get("key") or "").strip()
-        if not key:
-            continue
-        program_keywords = _program_keywords(program)
-        score, matched = _score_keywords(tokens, program_keywords)
-        if score > best_program_score:
-            best_program_score = score
-            best_program_key = key
-            best_program_keywords = matched
-
-    if best_program_key:
-        program_conf = min(1.0, best_program_score / 3) if best_program_score else 0.2
-        result.program = best_program_key
-        result.program_confidence = round(program_conf, 2)
-        if best_program_keywords:
-            result.program_rationale = f"Matched program keywords: {', '.join(best_program_keywords)}."
+        keywords = [w for w in _TOKEN_RE.findall(desc) if len(w) > 3][:8]
+    return list(dict.fromkeys(keywords))
+
+
+# (target, keyword position, phrase tokens after the first, keyword text)
+_Entry = Tuple[int, int, Tuple[str, ...], str]
+
+
+class KeywordMatcher:
+    """Inverted index from a keyword's first token to every target using it.
+
+    Targets are numbered; multi-word keywords ("vector db") are matched as
+    consecutive tokens. `match` walks the note's tokens once and returns the
+    matched keywords per target in their declared order.
+    """
+
+    def __init__(self, targets: Sequence[Sequence[str]]) -> None:
+        self.sizes = [len(keywords) for keywords in targets]
+        self._index: Dict[str, List[_Entry]] = {}
+        for target, keywords in enumerate(targets):
+            for position, keyword in enumerate(keywords):
+                parts = _tokenize(keyword)
+                if not parts:
+                    continue
+                self._index.setdefault(parts[0], []).append((target, position, tuple(parts[1:]), keyword))
+
+    def match(self, tokens: Sequence[str]) -> Dict[int, List[str]]:
+        found: Dict[int, Dict[int, str]] = {}
+        index = self._index
+        for i, token in enumerate(tokens):
+            entries = index.get(token)
+            if not entries:
+                continue
+            for target, position, rest, keyword in entries:
+                if rest and tuple(tokens[i + 1:i + 1 + len(rest)]) != rest:
+                    continue
+                found.setdefault(target, {})[position] = keyword
+        return {target: [hits[p] for p in sorted(hits)] for target, hits in found.items()}
+
+
+class CompiledCategorizer:
+    """Domain and program matchers built once for a given programs registry."""
+
+    def __init__(self, programs: Sequence[Dict[str, object]]) -> None:
+        self.domains = list(DOMAIN_KEYWORDS)
+        self.domain_matcher = KeywordMatcher([DOMAIN_KEYWORDS[d] for d in self.domains])
+        self.programs: List[Tuple[str, str]] = []
+        program_keywords: List[Sequence[str]] = []
+        for program in programs:
+            if not isinstance(program, dict):
+                continue
+            key = str(program.get("key") or "").strip()
+            if not key:
+                continue
+            self.programs.append((key, str(program.get("domain") or "").lower()))
+            program_keywords.append(_program_keywords(program))
+        self.program_matcher = KeywordMatcher(program_keywords)
+
+    def categorize(self, transcription: str, title: Optional[str]) -> CategorizationResult:
+        tokens = _tokenize(f"{title or ''} {transcription or ''}")
+        if not tokens:
+            return CategorizationResult(
+                domain="general",
+                confidence=0.0,
+                rationale="No textual content to analyze.",
+            )
+
+        best_domain = "general"
+        best_conf = 0.0
+        best_matched: List[str] = []
+        domain_hits = self.domain_matcher.match(tokens)
+        for idx, domain in enumerate(self.domains):
+            matched = domain_hits.get(idx)
+            if not matched:
+                continue
+            confidence = min(1.0, len(matched) / max(3, self.domain_matcher.sizes[idx] / 2))
+            if confidence > best_conf:
+                best_domain = domain
+                best_conf = confidence
+                best_matched = matched
+        if best_conf == 0.0:
+            rationale = "Defaulted to general domain (no keyword matches)."
+            result = CategorizationResult(domain="general", confidence=0.1, rationale=rationale)
         else:
-            result.program_rationale = "Chosen as highest-scoring program for domain."
-
-    return result
+            rationale = f"Matched domain '{best_domain}' via keywords: {', '.join(best_matched)}."
+            result = CategorizationResult(domain=best_domain, confidence=round(best_conf, 2), rationale=rationale)
+
+        candidates = list(range(len(self.programs)))
+        if result.domain != "general":
+            candidates = [i for i in candidates if self.programs[i][1] == result.domain] or candidates
+
+        program_hits = self.program_matcher.match(tokens)
+        best_program_key: Optional[str] = None
+        best_program_score = 0
+        best_program_keywords: List[str] = []
+        for idx in candidates:
+            matched = program_hits.get(idx) or []
+            if len(matched) > best_program_score:
+                best_program_score = len(matched)
+                best_program_key = self.programs[idx][0]
+                best_program_keywords = matched
+
+        if best_program_key:
+            program_conf = min(1.0, best_program_score / 3) if best_program_score else 0.2
+            result.program = best_program_key
+            result.program_confidence = round(program_conf, 2)
+            if best_program_keywords:
+                result.program_rationale = f"Matched program keywords: {', '.join(best_program_keywords)}."
+            else:
+                result.program_rationale = "Chosen as highest-scoring program for domain."
+
+        return result
+
+
+_COMPILED_LOCK = threading.Lock()
+_COMPILED: Tuple[Optional[Hashable], Optional[CompiledCategorizer]] = (None, None)
+
+
+def compiled_categorizer(programs: Sequence[Dict[str, object]], version: Optional[Hashable] = None) -> CompiledCategorizer:
+    """Return the compiled categorizer for `programs`, rebuilding only on change.
+
+    Pass the registry `version` when known; otherwise a fingerprint of the
+    programs is used.
+    """
+    global _COMPILED
+    if version is None:
+        version = hashlib.sha1(json.dumps(list(programs), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    cached_version, compiled = _COMPILED
+    if compiled is not None and cached_version == version:
+        return compiled
+    compiled = CompiledCategorizer(programs)
+    with _COMPILED_LOCK:
+        _COMPILED = (version, compiled)
+    return compiled
+
+
+def categorize_note(
+    transcription: str,
+    title: Optional[str],
+    programs: Sequence[Dict[str, object]],
+    version: Optional[Hashable] = None,
+) -> CategorizationResult:
+    return compiled_categorizer(programs, version).categorize(transcription, title)
@@ -34,9 +34,36 @@ NARRATIVES_DIR = os.path.join(STORAGE_DIR, "narratives")
 FORMATS_DIR = os.path.join(STORAGE_DIR, "formats")
 FOLDERS_DIR = os.path.join(STORAGE_DIR, "folders")
 PROGRAMS_DIR = os.path.join(STORAGE_DIR, "programs")
+MODELS_DIR = os.path.join(STORAGE_DIR, "models")
+INDEX_DIR = os.path.join(STORAGE_DIR, "index")
+# Local LRU cache of audio that lives in Appwrite (bytes; 0 disables eviction)
+AUDIO_CACHE_DIR = os.path.join(STORAGE_DIR, "cache", "audio")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES") or 2 * 1024 ** 3)
+# Resumable uploads: largest accepted recording and how long idle sessions are kept
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES") or 4 * 1024 ** 3)
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS") or 24 * 3600)
+# Waveform peaks sidecars: (min, max) pairs per note and decode worker threads
+PEAKS_DIR = os.path.join(STORAGE_DIR, "peaks")
+PEAKS_BINS = int(os.getenv("PEAKS_BINS") or 1000)
+PEAKS_WORKERS = int(os.getenv("PEAKS_WORKERS") or 2)
 TELEGRAM_BOT_TOKEN = (os.getenv("TELEGRAM_BOT_TOKEN") or "").strip() or None
 TELEGRAM_WEBHOOK_SECRET = (os.getenv("TELEGRAM_WEBHOOK_SECRET") or "").strip() or None
 TELEGRAM_INGEST_TOKEN = (os.getenv("TELEGRAM_INGEST_TOKEN") or "").strip() or None
+TELEGRAM_API_BASE = (os.getenv("TELEGRAM_API_BASE") or "https://api.telegram.org").strip().rstrip("/")
+# Outbound pacing (messages per second) and retries for the Bot API send queue
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE") or 25)
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE") or 1)
+TELEGRAM_SEND_MAX_ATTEMPTS = int(os.getenv("TELEGRAM_SEND_MAX_ATTEMPTS") or 4)
+# Raw webhook updates (pending + processed, used for update_id dedupe)
+TELEGRAM_UPDATES_DIR = os.path.join(STORAGE_DIR, "telegram", "updates")
+TELEGRAM_WEBHOOK_WORKERS = int(os.getenv("TELEGRAM_WEBHOOK_WORKERS") or 4)
+# "webhook" (default) or "polling" to consume getUpdates instead
+TELEGRAM_MODE = (os.getenv("TELEGRAM_MODE") or "webhook").strip().lower()
+TELEGRAM_POLL_TIMEOUT = int(os.getenv("TELEGRAM_POLL_TIMEOUT") or 25)
+TELEGRAM_POLL_LIMIT = int(os.getenv("TELEGRAM_POLL_LIMIT") or 100)
+# Fraction of integration requests whose full payload is logged (0 disables)
+INTEGRATION_LOG_SAMPLE_RATE = float(os.getenv("INTEGRATION_LOG_SAMPLE_RATE") or 0.01)
+INTEGRATION_LOG_PAYLOAD_LIMIT = int(os.getenv("INTEGRATION_LOG_PAYLOAD_LIMIT") or 4000)
 
 # Models and providers
 def _normalize_google_model(name: str) -> str:
@@ -142,3 +169,23 @@ def _parse_bool(value: Optional[str], default: bool = False) -> bool:
 
 LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").strip().upper()
 LOG_JSON = _parse_bool(os.getenv("LOG_JSON"))
+
+# Usage telemetry: how often buffered usage events are written to backend/usage/
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS") or 5)
+
+# Programs registry cache: file re-check interval and Appwrite refetch TTL
+PROGRAMS_CACHE_CHECK_SECONDS = float(os.getenv("PROGRAMS_CACHE_CHECK_SECONDS") or 2)
+PROGRAMS_CACHE_TTL_SECONDS = float(os.getenv("PROGRAMS_CACHE_TTL_SECONDS") or 60)
+
+# Note index: rescan a remote (Appwrite) store after this many seconds so
+# notes written by other instances show up; 0 trusts this process's writes only
+INDEX_REMOTE_REFRESH_SECONDS = float(os.getenv("INDEX_REMOTE_REFRESH_SECONDS") or 300)
+
+# Bulk note operations: concurrent store calls per request
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY") or 16)
+
+# Server-Sent Events: keep-alive comment interval for idle /api/events streams
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS") or 15)
+
+# Responses smaller than this (bytes) are sent uncompressed
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE") or 1024)
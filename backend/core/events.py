@@ -0,0 +1,228 @@
+"""
+In-process notification primitives for the note pipeline.
+
+`COMPLETION_BUS` lets code wait for a note's transcription to finish without
+polling storage: `services.transcribe_and_save` publishes the saved payload
+(or the failure placeholder) keyed by the note's base id, and any coroutine
+awaiting that id wakes up immediately. Recent results are retained briefly so
+a waiter that subscribes just after completion still sees it.
+
+`NOTE_EVENTS` fans note lifecycle events (created, transcribed, classified,
+moved, updated, deleted) out to `GET /api/events` subscribers. Events carry
+ids of the form `<epoch>-<seq>`; the last `retain` are kept so a reconnecting
+EventSource can resume from its `Last-Event-ID`. When that is no longer
+possible (restart, evicted ids, slow consumer) the subscriber is told to
+`reset`, i.e. refetch the list once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class NoteCompletionBus:
+    def __init__(self, retain: int = 1024, retain_seconds: float = 900.0) -> None:
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._recent: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._retain = retain
+        self._retain_seconds = retain_seconds
+
+    def _prune(self, now: float) -> None:
+        while self._recent:
+            key, (stamp, _) = next(iter(self._recent.items()))
+            if len(self._recent) > self._retain or now - stamp > self._retain_seconds:
+                self._recent.pop(key, None)
+            else:
+                break
+
+    def publish(self, note_id: str, result: Dict[str, Any]) -> None:
+        """Record a completion and wake every waiter for `note_id` (thread-safe)."""
+        now = time.monotonic()
+        with self._lock:
+            self._recent.pop(note_id, None)
+            self._recent[note_id] = (now, result)
+            self._prune(now)
+            waiters = self._waiters.pop(note_id, [])
+        for loop, fut in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, result)
+            except RuntimeError:
+                # Loop already closed; nobody is left to notify
+                continue
+
+    def latest(self, note_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._recent.get(note_id)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > self._retain_seconds:
+                self._recent.pop(note_id, None)
+                return None
+            return item[1]
+
+    def forget(self, note_id: str) -> None:
+        """Drop a retained result, e.g. before re-running transcription."""
+        with self._lock:
+            self._recent.pop(note_id, None)
+
+    async def wait(self, note_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the completion result for `note_id`, or None on timeout."""
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        with self._lock:
+            item = self._recent.get(note_id)
+            if item is not None and time.monotonic() - item[0] <= self._retain_seconds:
+                return item[1]
+            self._waiters.setdefault(note_id, []).append((loop, fut))
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._lock:
+                entries = self._waiters.get(note_id)
+                if entries:
+                    entries[:] = [e for e in entries if e[1] is not fut]
+                    if not entries:
+                        self._waiters.pop(note_id, None)
+
+    def waiter_count(self, note_id: Optional[str] = None) -> int:
+        with self._lock:
+            if note_id is not None:
+                return len(self._waiters.get(note_id, []))
+            return sum(len(v) for v in self._waiters.values())
+
+
+def _resolve(fut: asyncio.Future, result: Dict[str, Any]) -> None:
+    if not fut.done():
+        fut.set_result(result)
+
+
+COMPLETION_BUS = NoteCompletionBus()
+
+
+# Fields of a note payload that `GET /api/notes` exposes; events carry the same
+NOTE_EVENT_FIELDS = (
+    "filename",
+    "transcription",
+    "title",
+    "date",
+    "created_at",
+    "created_ts",
+    "length_seconds",
+    "topics",
+    "language",
+    "folder",
+    "tags",
+    "auto_category",
+    "auto_category_confidence",
+    "auto_program",
+    "auto_program_confidence",
+)
+
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+def note_event_data(note_id: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Event body for a note: its id plus the list-view fields of `payload`."""
+    data: Dict[str, Any] = {"id": note_id}
+    if payload is None:
+        return data
+    note = {k: payload.get(k) for k in NOTE_EVENT_FIELDS if k in payload}
+    title = str(note.get("title") or "").strip()
+    if not title or title.lower() in ("untitled", "title generation failed."):
+        note["title"] = os.path.splitext(str(note.get("filename") or note_id))[0]
+    note.setdefault("folder", "")
+    note.setdefault("tags", [])
+    data["note"] = note
+    return data
+
+
+class EventBroker:
+    def __init__(self, retain: int = 1000, queue_size: int = 256) -> None:
+        self._lock = threading.Lock()
+        self._epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._buffer: Deque[Event] = deque(maxlen=retain)
+        self._subscribers: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+        self._queue_size = queue_size
+
+    def event_id(self, seq: int) -> str:
+        return f"{self._epoch}-{seq}"
+
+    @property
+    def last_event_id(self) -> str:
+        with self._lock:
+            return self.event_id(self._seq)
+
+    def publish(self, event: str, data: Dict[str, Any]) -> str:
+        """Append an event and hand it to every subscriber (thread-safe)."""
+        with self._lock:
+            self._seq += 1
+            item: Event = (self._seq, event, data)
+            self._buffer.append(item)
+            subscribers = list(self._subscribers.values())
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, item)
+            except RuntimeError:
+                continue
+        return self.event_id(item[0])
+
+    def _replay_locked(self, last_event_id: Optional[str]) -> Optional[List[Event]]:
+        if not last_event_id:
+            return []
+        epoch, _, seq_text = last_event_id.partition("-")
+        if epoch != self._epoch or not seq_text.isdigit():
+            return None
+        seq = int(seq_text)
+        oldest = self._buffer[0][0] if self._buffer else self._seq + 1
+        if seq > self._seq or seq < oldest - 1:
+            return None
+        return [item for item in self._buffer if item[0] > seq]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[asyncio.Queue, Optional[List[Event]]]:
+        """Register the running loop as a subscriber.
+
+        Returns (queue, backlog). `backlog` holds the events missed since
+        `last_event_id`, or is None when they are gone and the client has to
+        resync. A queue item of None means the same (the consumer fell behind).
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        with self._lock:
+            backlog = self._replay_locked(last_event_id)
+            self._subscribers[id(queue)] = (loop, queue)
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(id(queue), None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _offer(queue: asyncio.Queue, item: Event) -> None:
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        # Drop the backlog and ask the consumer to refetch instead
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+def publish_note_event(event: str, note_id: str, payload: Optional[Dict[str, Any]] = None) -> str:
+    return NOTE_EVENTS.publish(event, note_event_data(note_id, payload))
+
+
+NOTE_EVENTS = EventBroker()
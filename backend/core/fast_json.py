@@ -0,0 +1,62 @@
+"""
+Fast JSON encoding for API responses.
+
+`orjson` (when installed) serializes the notes list several times faster
+than the stdlib encoder. `FastJSONResponse` is the app's default response
+class. Routes that return a `Response` themselves skip FastAPI's
+`jsonable_encoder` pass as well, because the payloads here are plain
+dicts/lists already. Without orjson everything falls back to compact stdlib
+`json` output.
+
+Very large lists can also be streamed as NDJSON (one JSON object per line)
+so clients can render rows as they arrive.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see requirements.txt
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Rows per streamed chunk; one write per row would dominate the cost
+NDJSON_BATCH_ROWS = 256
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def wants_ndjson(request: Request, format: Optional[str] = None) -> bool:
+    if format:
+        return format.lower() == "ndjson"
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_chunks(rows: Iterable[Any]) -> Iterator[bytes]:
+    batch = []
+    for row in rows:
+        batch.append(dumps(row))
+        if len(batch) >= NDJSON_BATCH_ROWS:
+            yield b"\n".join(batch) + b"\n"
+            batch = []
+    if batch:
+        yield b"\n".join(batch) + b"\n"
+
+
+def ndjson_response(rows: Iterable[Any], headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    return StreamingResponse(_ndjson_chunks(rows), media_type=NDJSON_MEDIA_TYPE, headers=headers)
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import os
+import threading
 import uuid
 from typing import Dict, List, Optional
 
@@ -9,6 +10,9 @@ import config
 from store.api import AppwriteClient
 
 _APPWRITE_CLIENT: Optional[AppwriteClient] = None
+_TOMBSTONES_LOCK = threading.Lock()
+# Bumped on every registry/tombstone write made by this process
+_FOLDERS_VERSION = 0
 
 
 def _use_appwrite_registry() -> bool:
@@ -63,7 +67,31 @@ def load_folders_registry() -> List[str]:
         return []
 
 
+def folders_version() -> Optional[tuple]:
+    """Validator for folder listings: local write counter plus file mtimes.
+
+    None when notes or the registry live in a remote store: other instances
+    can change them without touching anything this process can stamp, so
+    those listings are not cached.
+    """
+    if getattr(config, 'STORE_BACKEND', 'filesystem') != 'filesystem':
+        return None
+    stamps = []
+    for name in ('folders.json', 'tombstones.json'):
+        try:
+            stamps.append(os.stat(os.path.join(config.FOLDERS_DIR, name)).st_mtime_ns)
+        except OSError:
+            stamps.append(0)
+    return (_FOLDERS_VERSION, *stamps)
+
+
+def _bump_folders_version() -> None:
+    global _FOLDERS_VERSION
+    _FOLDERS_VERSION += 1
+
+
 def save_folders_registry(names: List[str]) -> None:
+    _bump_folders_version()
     trimmed = sorted({n.strip() for n in names if isinstance(n, str) and n.strip()}, key=str.lower)
     if _use_appwrite_registry():
         client = _get_appwrite_client()
@@ -110,3 +138,87 @@ def save_folders_registry(names: List[str]) -> None:
     with open(tmp, 'w') as f:
         json.dump(trimmed, f, ensure_ascii=False)
     os.replace(tmp, path)
+
+
+# Folders whose notes are still being deleted by a background job, mapped to
+# the note ids the delete was started with. The folder is hidden from listings
+# right away; the tombstone is cleared once those ids are handled, or as soon
+# as the folder is used again (re-created, or a note filed into it), so notes
+# added later are never part of the delete. Deletes that were cancelled,
+# failed or interrupted resume on startup with their remaining ids.
+
+def _tombstones_path() -> str:
+    os.makedirs(config.FOLDERS_DIR, exist_ok=True)
+    return os.path.join(config.FOLDERS_DIR, 'tombstones.json')
+
+
+def _load_tombstones() -> Dict[str, Optional[List[str]]]:
+    try:
+        with open(_tombstones_path(), 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        return {}
+    if isinstance(data, list):
+        # Older files only listed names; their ids are unknown
+        return {str(x): None for x in data if isinstance(x, str) and x.strip()}
+    if isinstance(data, dict):
+        return {
+            str(name): [str(i) for i in ids] if isinstance(ids, list) else None
+            for name, ids in data.items()
+            if str(name).strip()
+        }
+    return {}
+
+
+def load_folder_tombstones() -> List[str]:
+    return sorted(_load_tombstones())
+
+
+def folder_tombstone_ids(name: str) -> Optional[List[str]]:
+    """Note ids a folder delete still has to handle; None if unknown or no tombstone."""
+    return _load_tombstones().get(name)
+
+
+def _save_folder_tombstones(tombstones: Dict[str, Optional[List[str]]]) -> None:
+    path = _tombstones_path()
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(dict(sorted(tombstones.items())), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    _bump_folders_version()
+
+
+def add_folder_tombstone(name: str, note_ids: List[str]) -> None:
+    with _TOMBSTONES_LOCK:
+        tombstones = _load_tombstones()
+        tombstones[name] = sorted(set(note_ids) | set(tombstones.get(name) or []))
+        _save_folder_tombstones(tombstones)
+
+
+def settle_folder_tombstone(name: str, handled_ids: List[str]) -> List[str]:
+    """Drop handled ids from a tombstone, clearing it once none are left.
+
+    Returns the ids still pending (empty if the tombstone is gone, e.g.
+    because the folder was re-created meanwhile).
+    """
+    with _TOMBSTONES_LOCK:
+        tombstones = _load_tombstones()
+        if name not in tombstones:
+            return []
+        pending = sorted(set(tombstones[name] or []) - set(handled_ids))
+        if pending:
+            tombstones[name] = pending
+        else:
+            tombstones.pop(name)
+        _save_folder_tombstones(tombstones)
+        return pending
+
+
+def remove_folder_tombstone(name: str) -> None:
+    with _TOMBSTONES_LOCK:
+        tombstones = _load_tombstones()
+        if name in tombstones:
+            tombstones.pop(name)
+            _save_folder_tombstones(tombstones)
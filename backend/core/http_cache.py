@@ -0,0 +1,147 @@
+"""
+Conditional GET helpers for list/read endpoints.
+
+A route computes a cheap validator first: a version counter, the note index
+change sequence, or directory/file mtimes. `conditional_json` turns it into
+a strong ETag. When the client's `If-None-Match` already has that ETag the
+route answers 304 without building or serializing anything. Otherwise the
+body is built once and its serialized bytes are kept per endpoint, so
+another client asking for the same version doesn't pay for serialization
+again.
+
+ETags include a per-process epoch because some validators (the programs
+and folders version counters) restart from zero with the process.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from core.fast_json import dumps
+
+# Revalidate on every use; the 304 path is what makes refreshes cheap
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+_EPOCH = uuid.uuid4().hex[:8]
+_BODY_CACHE: Dict[str, Tuple[str, bytes]] = {}
+_BODY_LOCK = threading.Lock()
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(repr((_EPOCH,) + parts).encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def path_mtime_ns(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def dir_stamp(path: str, suffixes: Iterable[str] = ()) -> Tuple[int, int, int]:
+    """(dir mtime, entry count, newest entry mtime) of `path`.
+
+    Entry mtimes matter because files rewritten in place don't touch the
+    directory's own mtime. With `suffixes`, only matching entries count.
+    """
+    suffixes = tuple(suffixes)
+    try:
+        dir_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return (0, 0, 0)
+    count = newest = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if suffixes and not entry.name.endswith(suffixes):
+                    continue
+                try:
+                    mtime = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+                count += 1
+                newest = max(newest, mtime)
+    except OSError:
+        pass
+    return (dir_mtime, count, newest)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = [c.strip() for c in header.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def _not_modified_since(request: Request, last_modified: Optional[float]) -> bool:
+    header = request.headers.get("if-modified-since")
+    if last_modified is None or not header or request.headers.get("if-none-match"):
+        return False
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= int(since)
+
+
+def _validator_headers(etag: str, cache_control: str, last_modified: Optional[float]) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def revalidate(
+    request: Request,
+    key: str,
+    validator: Any,
+    cache_control: str = DEFAULT_CACHE_CONTROL,
+    last_modified: Optional[float] = None,
+) -> Tuple[str, Dict[str, str], bool]:
+    """Return (etag, validator headers, client copy is current)."""
+    etag = make_etag(key, validator)
+    headers = _validator_headers(etag, cache_control, last_modified)
+    fresh = etag_matches(request, etag) or _not_modified_since(request, last_modified)
+    return etag, headers, fresh
+
+
+def conditional_json(
+    request: Request,
+    key: str,
+    validator: Any,
+    build: Callable[[], Any],
+    cache_control: str = DEFAULT_CACHE_CONTROL,
+    last_modified: Optional[float] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Answer 304 when the client has `validator`'s version, else build the body."""
+    etag, out_headers, fresh = revalidate(request, key, validator, cache_control, last_modified)
+    out_headers.update(headers or {})
+    if fresh:
+        return Response(status_code=304, headers=out_headers)
+    with _BODY_LOCK:
+        cached = _BODY_CACHE.get(key)
+    if cached is not None and cached[0] == etag:
+        body = cached[1]
+    else:
+        body = dumps(build())
+        with _BODY_LOCK:
+            _BODY_CACHE[key] = (etag, body)
+    return Response(content=body, media_type="application/json", headers=out_headers)
+
+
+def clear_body_cache() -> None:
+    with _BODY_LOCK:
+        _BODY_CACHE.clear()
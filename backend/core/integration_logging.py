@@ -0,0 +1,95 @@
+"""
+Cheap structured logging for the integration ingest paths.
+
+Each request logs a handful of selected fields (`chat_id`, `message_id`,
+media kind, size...) rendered as `key=value` pairs. Full payloads are only
+logged for a sample of requests (`INTEGRATION_LOG_SAMPLE_RATE`, or always at
+DEBUG) and are serialized lazily, so nothing is JSON-encoded unless a handler
+actually emits the record.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+from typing import Any, Dict, Mapping, Optional
+
+import config
+
+MEDIA_KEYS = ("voice", "audio", "video_note", "video", "document", "photo")
+
+
+class _Fields:
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Mapping[str, Any]) -> None:
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(f"{k}={v}" for k, v in self.fields.items() if v is not None)
+
+
+class _Payload:
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload: Any, limit: int) -> None:
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self) -> str:
+        try:
+            text = json.dumps(self.payload, ensure_ascii=False, default=str)
+        except Exception:
+            return "<unserializable>"
+        if len(text) > self.limit:
+            return f"{text[:self.limit]}...(+{len(text) - self.limit} chars)"
+        return text
+
+
+def telegram_update_fields(update: Mapping[str, Any]) -> Dict[str, Any]:
+    """Pick the fields worth logging from a Telegram update without copying it."""
+    message = update.get("message") or update.get("edited_message") or {}
+    fields: Dict[str, Any] = {
+        "update_id": update.get("update_id"),
+        "chat_id": (message.get("chat") or {}).get("id"),
+        "message_id": message.get("message_id"),
+    }
+    text = message.get("text") or message.get("caption")
+    if text:
+        fields["text_len"] = len(text)
+    for key in MEDIA_KEYS:
+        media = message.get(key)
+        if media:
+            fields["media"] = key
+            if isinstance(media, list):
+                # Photos arrive as a list of sizes; the last is the largest
+                media = media[-1] if media else {}
+            if isinstance(media, dict):
+                fields["size"] = media.get("file_size")
+                fields["mime"] = media.get("mime_type")
+            break
+    return fields
+
+
+def _should_sample() -> bool:
+    rate = float(getattr(config, "INTEGRATION_LOG_SAMPLE_RATE", 0.0) or 0.0)
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def log_event(
+    logger: logging.Logger,
+    tag: str,
+    fields: Mapping[str, Any],
+    payload: Optional[Any] = None,
+    level: int = logging.INFO,
+) -> None:
+    """Log `fields` under `tag`; attach the full `payload` only when sampled."""
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, "[%s] %s", tag, _Fields(fields))
+    if payload is None:
+        return
+    if logger.isEnabledFor(logging.DEBUG) or _should_sample():
+        limit = int(getattr(config, "INTEGRATION_LOG_PAYLOAD_LIMIT", 4000) or 4000)
+        logger.log(level, "[%s] sampled payload=%s", tag, _Payload(payload, limit))
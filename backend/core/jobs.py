@@ -0,0 +1,117 @@
+"""
+In-process background jobs with pollable progress.
+
+`JOBS.submit(kind, func, **params)` runs `func(job, **params)` on a daemon
+thread so long corpus-wide passes (e.g. reclassification) never block the
+event loop. The function reports progress through `job.update(...)` and can
+stop early when `job.cancelled` is set. Finished jobs are kept in memory
+(bounded) so `/api/jobs/{id}` can report their result.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    status: str = "queued"
+    progress: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def update(self, **progress: Any) -> None:
+        with self._lock:
+            self.progress.update(progress)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "params": dict(self.params),
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+class JobRegistry:
+    def __init__(self, retain: int = 100) -> None:
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._retain = retain
+
+    def submit(self, kind: str, func: Callable[..., Optional[Dict[str, Any]]], **params: Any) -> Job:
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind, params=params)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        thread = threading.Thread(target=self._run, args=(job, func), name=f"job-{kind}-{job.id}", daemon=True)
+        thread.start()
+        return job
+
+    def _prune(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.status not in ACTIVE_STATUSES]
+        while len(self._jobs) > self._retain and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+    def _run(self, job: Job, func: Callable[..., Optional[Dict[str, Any]]]) -> None:
+        job.status = "running"
+        job.started_at = datetime.utcnow().isoformat()
+        try:
+            job.result = func(job, **job.params)
+            job.status = "cancelled" if job.cancelled else "completed"
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error = str(exc)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow().isoformat()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in reversed(jobs) if kind is None or j.kind == kind]
+
+    def active(self, kind: str) -> Optional[Job]:
+        for job in self.list(kind):
+            if job.status in ACTIVE_STATUSES:
+                return job
+        return None
+
+
+JOBS = JobRegistry()
@@ -1,26 +1,40 @@
 from __future__ import annotations
 
 import asyncio
-import json
+import hashlib
 import logging
 import os
+import shutil
 import subprocess
 import tempfile
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import BackgroundTasks, UploadFile
 from langchain_core.messages import HumanMessage
 
 import categorizer
 import config
+from learned_categorizer import CORRECTIONS, note_tokens
 from note_store import build_note_payload, ensure_placeholder_note, infer_language, infer_topics, save_note_json
 from store import get_notes_store
-from store.media import upload_audio_file
+from store.index import NOTE_INDEX
+from store.media import delete_audio_file, upload_audio_file
 import providers
+import usage_log as usage
 from services import transcribe_and_save
-from core.programs import load_programs_registry
+from core.events import note_event_data, publish_note_event
+from core.folders import (
+    add_folder_tombstone,
+    folder_tombstone_ids,
+    load_folder_tombstones,
+    remove_folder_tombstone,
+    settle_folder_tombstone,
+)
+from core.programs import programs_registry_snapshot
+from core.waveform import delete_peaks, schedule_peaks
 
 logger = logging.getLogger(__name__)
 NOTES_STORE = get_notes_store()
@@ -41,7 +55,8 @@ async def summarize_text_snippet(text: str) -> Optional[str]:
                 )
             }]
         )
-        resp, _ = await asyncio.to_thread(providers.invoke_google, [prompt])
+        with usage.call_context(event="summary"):
+            resp, _ = await asyncio.to_thread(providers.invoke_google, [prompt])
         summary = str(getattr(resp, "content", "")).strip()
         if summary:
             summary = " ".join(summary.split())
@@ -50,13 +65,14 @@ async def summarize_text_snippet(text: str) -> Optional[str]:
             return summary
     except Exception:
         try:
-            summary = providers.openai_chat([
-                HumanMessage(
-                    content=(
-                        "Summarize in <=240 characters. Mention key decisions or follow-ups.\n\n" + snippet[:4000]
+            with usage.call_context(event="summary", fallback=True):
+                summary = providers.openai_chat([
+                    HumanMessage(
+                        content=(
+                            "Summarize in <=240 characters. Mention key decisions or follow-ups.\n\n" + snippet[:4000]
+                        )
                     )
-                )
-            ], temperature=0.2)
+                ], temperature=0.2)
             summary = str(summary or "").strip()
             if summary:
                 summary = " ".join(summary.split())
@@ -68,25 +84,120 @@ async def summarize_text_snippet(text: str) -> Optional[str]:
     return None
 
 
+# Learned suggestions below this score are not surfaced. This is a threshold
+# on NaiveBayes.predict's ranking score, not on a probability.
+LEARNED_MIN_SCORE = 0.6
+
+CLASSIFICATION_FIELDS = (
+    "auto_category",
+    "auto_category_confidence",
+    "auto_category_rationale",
+    "auto_program",
+    "auto_program_confidence",
+    "auto_program_rationale",
+    "auto_program_score",
+    "auto_folder",
+    "auto_folder_score",
+    # Older notes stored the learned folder score under this name
+    "auto_folder_confidence",
+)
+
+
+def classification_fields(classification: categorizer.CategorizationResult) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {
+        "auto_category": classification.domain,
+        "auto_category_confidence": classification.confidence,
+        "auto_category_rationale": classification.rationale,
+    }
+    if classification.program:
+        fields["auto_program"] = classification.program
+    if classification.program_confidence is not None:
+        fields["auto_program_confidence"] = classification.program_confidence
+    if classification.program_rationale:
+        fields["auto_program_rationale"] = classification.program_rationale
+    if classification.program_score is not None:
+        fields["auto_program_score"] = classification.program_score
+    if classification.folder:
+        fields["auto_folder"] = classification.folder
+        fields["auto_folder_score"] = classification.folder_score
+    return fields
+
+
+def refine_with_corrections(
+    classification: categorizer.CategorizationResult,
+    transcription: str,
+    title: Optional[str],
+) -> categorizer.CategorizationResult:
+    """Blend in folder/program guesses learned from manual corrections.
+
+    Learned scores rank labels but aren't probabilities, so a learned program
+    only fills in when the keyword categorizer matched none; it never competes
+    with a keyword confidence.
+    """
+    learned = CORRECTIONS.predict(note_tokens(transcription, title))
+    folder = learned.get("folder")
+    if folder and folder[1] >= LEARNED_MIN_SCORE:
+        classification.folder, classification.folder_score = folder
+    program = learned.get("program")
+    if program and program[1] >= LEARNED_MIN_SCORE and not classification.program:
+        classification.program, classification.program_score = program
+        classification.program_confidence = None
+        classification.program_rationale = "Learned from manually assigned programs."
+    return classification
+
+
+def record_correction(
+    base_id: str,
+    note_data: Dict[str, Any],
+    folder: Optional[str] = None,
+    program: Optional[str] = None,
+) -> None:
+    transcription = str(note_data.get("transcription") or "")
+    if not transcription.strip():
+        return
+    try:
+        CORRECTIONS.record(base_id, transcription, note_data.get("title"), folder=folder, program=program)
+    except Exception:
+        logger.warning("Failed to record classification correction for %s", base_id, exc_info=True)
+
+
+def record_corrections(corrections: List[Dict[str, Any]]) -> None:
+    """Batch form of `record_correction`; corrections.json is written once.
+
+    Items carry `base_id`, `note_data` and optionally `folder`/`program`.
+    """
+    items = []
+    for correction in corrections:
+        note_data = correction["note_data"]
+        transcription = str(note_data.get("transcription") or "")
+        if transcription.strip():
+            items.append({
+                "note_id": correction["base_id"],
+                "transcription": transcription,
+                "title": note_data.get("title"),
+                "folder": correction.get("folder"),
+                "program": correction.get("program"),
+            })
+    if not items:
+        return
+    try:
+        CORRECTIONS.record_many(items)
+    except Exception:
+        logger.warning("Failed to record %s classification corrections", len(items), exc_info=True)
+
+
 def apply_classification(
     note_data: Dict[str, Any],
     title: Optional[str],
     transcription: str,
 ) -> Optional[categorizer.CategorizationResult]:
     try:
-        programs = load_programs_registry()
-        classification = categorizer.categorize_note(transcription, title, programs)
+        programs, version = programs_registry_snapshot()
+        classification = categorizer.categorize_note(transcription, title, programs, version=version)
+        refine_with_corrections(classification, transcription, title)
     except Exception:
         return None
-    note_data["auto_category"] = classification.domain
-    note_data["auto_category_confidence"] = classification.confidence
-    note_data["auto_category_rationale"] = classification.rationale
-    if classification.program:
-        note_data["auto_program"] = classification.program
-    if classification.program_confidence is not None:
-        note_data["auto_program_confidence"] = classification.program_confidence
-    if classification.program_rationale:
-        note_data["auto_program_rationale"] = classification.program_rationale
+    note_data.update(classification_fields(classification))
     logger.info(
         "[categorize] note=%s domain=%s program=%s conf=%.2f",
         note_data.get("filename"),
@@ -97,6 +208,356 @@ def apply_classification(
     return classification
 
 
+RECLASSIFY_BATCH_SIZE = 500
+RECLASSIFY_MAX_DIFFS = 1000
+
+
+def _note_base_id(note: Dict[str, Any]) -> Optional[str]:
+    filename = str(note.get("filename") or "").strip()
+    if filename:
+        return os.path.splitext(filename)[0]
+    doc_id = note.get("$id")
+    return str(doc_id) if doc_id else None
+
+
+def reclassify_notes(job, dry_run: bool = False) -> Dict[str, Any]:
+    """Re-run the categorizer over every note; save only notes that changed.
+
+    Runs as a `core.jobs` job. With `dry_run`, nothing is written and the
+    result lists the would-be changes (capped at RECLASSIFY_MAX_DIFFS).
+    """
+    programs, version = programs_registry_snapshot(recheck_after=0)
+    compiled = categorizer.compiled_categorizer(programs, version)
+    processed = changed = written = skipped = errors = 0
+    diffs: list[Dict[str, Any]] = []
+    job.update(processed=0, changed=0, written=0, skipped=0, errors=0, registry_version=version)
+
+    for note in NOTES_STORE.list_notes():
+        if job.cancelled:
+            break
+        processed += 1
+        base_id = _note_base_id(note)
+        transcription = str(note.get("transcription") or "")
+        if not base_id or not transcription.strip():
+            continue
+        classification = compiled.categorize(transcription, note.get("title"))
+        refine_with_corrections(classification, transcription, note.get("title"))
+        new_fields = classification_fields(classification)
+        before = {k: note.get(k) for k in CLASSIFICATION_FIELDS if note.get(k) is not None}
+        if before != new_fields:
+            changed += 1
+            if len(diffs) < RECLASSIFY_MAX_DIFFS:
+                diffs.append({
+                    "id": base_id,
+                    "before": {"domain": before.get("auto_category"), "program": before.get("auto_program")},
+                    "after": {"domain": new_fields.get("auto_category"), "program": new_fields.get("auto_program")},
+                })
+            if not dry_run:
+                try:
+                    # The listing can be minutes old by now; patch the current
+                    # note so concurrent edits aren't overwritten
+                    current, _, _ = NOTES_STORE.load_note(base_id)
+                    if not current or any(current.get(k) != note.get(k) for k in ("transcription", "title")):
+                        # Deleted or edited since listing; its own save reclassified it
+                        skipped += 1
+                    else:
+                        updated = {k: v for k, v in current.items() if k not in CLASSIFICATION_FIELDS and k != "$id"}
+                        updated.update(new_fields)
+                        NOTES_STORE.save_note(base_id, updated)
+                        written += 1
+                        publish_note_event("note.classified", base_id, updated)
+                except Exception:
+                    errors += 1
+                    logger.warning("Reclassify failed to save %s", base_id, exc_info=True)
+        if processed % RECLASSIFY_BATCH_SIZE == 0:
+            job.update(processed=processed, changed=changed, written=written, skipped=skipped, errors=errors)
+
+    job.update(processed=processed, changed=changed, written=written, skipped=skipped, errors=errors)
+    logger.info(
+        "[reclassify] processed=%s changed=%s written=%s skipped=%s errors=%s dry_run=%s",
+        processed,
+        changed,
+        written,
+        skipped,
+        errors,
+        dry_run,
+    )
+    return {
+        "dry_run": dry_run,
+        "processed": processed,
+        "changed": changed,
+        "written": written,
+        "skipped": skipped,
+        "errors": errors,
+        "diffs": diffs,
+        "diffs_truncated": changed > len(diffs),
+    }
+
+
+def delete_note_everywhere(filename: str) -> tuple[bool, List[str]]:
+    """Delete a note's local audio, remote audio and metadata.
+
+    `filename` may be the audio filename or the bare note id. Returns
+    (existed, errors); every step is attempted even if an earlier one fails.
+    """
+    base_filename = os.path.splitext(filename)[0]
+    data = None
+    try:
+        data, _, _ = NOTES_STORE.load_note(base_filename)
+    except Exception as exc:
+        logger.error("Failed to load note %s: %s", base_filename, exc, exc_info=True)
+        data = None
+    if not os.path.splitext(filename)[1] and data and data.get("filename"):
+        filename = str(data["filename"])
+    file_id = data.get('appwrite_file_id') if data else None
+    audio_path = os.path.join(config.VOICE_NOTES_DIR, filename)
+    note_existed = bool(data) or os.path.exists(audio_path) or bool(file_id)
+    errors: List[str] = []
+
+    if os.path.exists(audio_path):
+        try:
+            os.remove(audio_path)
+        except OSError as exc:
+            errors.append(f"Failed to delete audio file: {exc}")
+            logger.error("Failed to delete audio file %s: %s", audio_path, exc, exc_info=True)
+
+    if file_id:
+        try:
+            delete_audio_file(file_id)
+        except Exception as exc:
+            errors.append(f"Failed to delete remote audio: {exc}")
+            logger.error("Failed to delete Appwrite file %s: %s", file_id, exc, exc_info=True)
+
+    delete_peaks(base_filename)
+
+    try:
+        NOTES_STORE.delete_note(base_filename)
+    except Exception as exc:
+        errors.append(f"Failed to delete note metadata: {exc}")
+        logger.error("Failed to delete note metadata for %s: %s", base_filename, exc, exc_info=True)
+    else:
+        # A deleted note should stop steering learned suggestions
+        try:
+            CORRECTIONS.forget(base_filename)
+        except Exception:
+            logger.warning("Failed to forget corrections for %s", base_filename, exc_info=True)
+
+    if note_existed:
+        publish_note_event("note.deleted", base_filename)
+    return note_existed, errors
+
+
+BULK_OPS = ("move", "set_tags", "add_tag", "remove_tag", "delete")
+BULK_MAX_ITEMS = 5000
+
+
+def _bulk_apply(
+    note_id: str,
+    op: str,
+    folder: str,
+    tags: List[Dict[str, Any]],
+    corrections: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    base_id = os.path.splitext(note_id)[0]
+    if op == "delete":
+        existed, errors = delete_note_everywhere(note_id)
+        if not existed:
+            return {"id": base_id, "ok": False, "error": "not found"}
+        if errors:
+            return {"id": base_id, "ok": False, "error": "; ".join(errors)}
+        return {"id": base_id, "ok": True}
+
+    data, _, _ = NOTES_STORE.load_note(base_id)
+    if not data:
+        return {"id": base_id, "ok": False, "error": "not found"}
+    data.pop("$id", None)
+    current = [t for t in (data.get("tags") or []) if isinstance(t, dict)]
+    labels = {str(t.get("label") or "") for t in current}
+    if op == "move":
+        if str(data.get("folder") or "") == folder:
+            return {"id": base_id, "ok": True, "changed": False}
+        data["folder"] = folder
+    elif op == "set_tags":
+        data["tags"] = tags
+    elif op == "add_tag":
+        if tags[0]["label"] in labels:
+            return {"id": base_id, "ok": True, "changed": False}
+        data["tags"] = current + tags
+    elif op == "remove_tag":
+        if tags[0]["label"] not in labels:
+            return {"id": base_id, "ok": True, "changed": False}
+        data["tags"] = [t for t in current if t.get("label") != tags[0]["label"]]
+    NOTES_STORE.save_note(base_id, data)
+    if op == "move":
+        # Recorded once for the whole batch by bulk_update_notes
+        corrections.append({"base_id": base_id, "note_data": data, "folder": folder})
+    publish_note_event("note.moved" if op == "move" else "note.updated", base_id, data)
+    return {"id": base_id, "ok": True, "changed": True}
+
+
+async def bulk_update_notes(
+    ids: List[str],
+    op: str,
+    folder: Optional[str] = None,
+    tags: Optional[List[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Apply one operation to many notes; returns per-item results.
+
+    Items run on worker threads, at most BULK_CONCURRENCY at a time, so a
+    batch against Appwrite overlaps its HTTP round trips instead of paying
+    for them one after another. One failing item never aborts the batch.
+    """
+    if op not in BULK_OPS:
+        raise ValueError(f"Unknown operation: {op}")
+    if op in ("add_tag", "remove_tag") and not tags:
+        raise ValueError(f"{op} requires a tag")
+    if op == "set_tags" and tags is None:
+        raise ValueError("set_tags requires tags")
+    if len(ids) > BULK_MAX_ITEMS:
+        raise ValueError(f"At most {BULK_MAX_ITEMS} notes per request")
+    unique_ids = list(dict.fromkeys(i.strip() for i in ids if i and i.strip()))
+    desired_folder = str(folder or "").strip()
+    semaphore = asyncio.Semaphore(max(1, int(getattr(config, "BULK_CONCURRENCY", 16) or 1)))
+    corrections: List[Dict[str, Any]] = []
+    if op == "move":
+        reclaim_folder(desired_folder)
+
+    async def run(note_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(_bulk_apply, note_id, op, desired_folder, list(tags or []), corrections)
+            except Exception as exc:
+                logger.warning("Bulk %s failed for %s", op, note_id, exc_info=True)
+                return {"id": os.path.splitext(note_id)[0], "ok": False, "error": str(exc)}
+
+    results = await asyncio.gather(*(run(note_id) for note_id in unique_ids))
+    if corrections:
+        await asyncio.to_thread(record_corrections, corrections)
+    succeeded = sum(1 for r in results if r["ok"])
+    logger.info("[bulk] op=%s items=%s succeeded=%s", op, len(results), succeeded)
+    return {"op": op, "results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
+
+CHANGES_PAGE_SIZE = 1000
+
+
+async def note_changes(since: int, limit: int = CHANGES_PAGE_SIZE) -> Dict[str, Any]:
+    """Delta sync: notes saved or deleted after change sequence `since`.
+
+    Upserts carry the same fields as `GET /api/notes` entries; `deleted`
+    lists note ids. See `NoteIndex.changes_since` for `reset`/`more`.
+    """
+    changes = NOTE_INDEX.changes_since(since, limit=max(1, min(limit, CHANGES_PAGE_SIZE)))
+    semaphore = asyncio.Semaphore(max(1, int(getattr(config, "BULK_CONCURRENCY", 16) or 1)))
+
+    async def load(note_id: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                data, _, _ = await asyncio.to_thread(NOTES_STORE.load_note, note_id)
+            except Exception:
+                logger.warning("Failed to load changed note %s", note_id, exc_info=True)
+                return None
+        return note_event_data(note_id, data).get("note") if data else None
+
+    loaded = await asyncio.gather(*(load(note_id) for note_id in changes["upserts"]))
+    upserts = [note for note in loaded if note is not None]
+    deleted = list(changes["deleted"])
+    # Deleted between the index lookup and the load
+    deleted += [note_id for note_id, note in zip(changes["upserts"], loaded) if note is None]
+    return {**changes, "upserts": upserts, "deleted": deleted}
+
+
+def _delete_folder_member(note_id: str, folder: str) -> tuple[bool, List[str], bool]:
+    """Delete one note of a folder delete; returns (existed, errors, moved_away)."""
+    data, _, _ = NOTES_STORE.load_note(note_id)
+    if data and str(data.get("folder") or "") != folder:
+        # Filed elsewhere since the delete started; not ours to remove
+        return True, [], True
+    existed, errors = delete_note_everywhere(note_id)
+    return existed, errors, False
+
+
+def delete_folder_notes(job, folder: str) -> Dict[str, Any]:
+    """Delete the notes recorded in `folder`'s tombstone (a `core.jobs` job).
+
+    The ids were taken from the note index when the delete was requested, so
+    notes filed into the folder afterwards are never touched, and notes moved
+    out of it meanwhile are skipped. Up to BULK_CONCURRENCY deletes (local
+    unlink, remote file, metadata) run at once. Handled ids are dropped from
+    the tombstone, which is cleared once none are left; after a cancel or
+    failed items the rest stay recorded for the next run.
+    """
+    note_ids = folder_tombstone_ids(folder)
+    if note_ids is None:
+        # Tombstone written before ids were recorded (or already cleared)
+        note_ids = NOTE_INDEX.members("folder", folder) if folder in load_folder_tombstones() else []
+        if note_ids:
+            add_folder_tombstone(folder, note_ids)
+    attempted: set = set()
+    deleted = failed = skipped = 0
+    job.update(total=len(note_ids), deleted=0, failed=0, skipped=0)
+    workers = max(1, int(getattr(config, "BULK_CONCURRENCY", 16) or 1))
+    if not note_ids:
+        # Clears the tombstone of an empty folder
+        note_ids = settle_folder_tombstone(folder, [])
+    remaining: List[str] = list(note_ids)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="folder-delete") as pool:
+        # Another DELETE of the same folder may add ids while this runs
+        while note_ids and not job.cancelled:
+            attempted.update(note_ids)
+            futures = {pool.submit(_delete_folder_member, note_id, folder): note_id for note_id in note_ids}
+            for future in as_completed(futures):
+                if job.cancelled:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+                try:
+                    existed, errors, moved = future.result()
+                except Exception:
+                    logger.warning("Folder delete item failed in %s", folder, exc_info=True)
+                    existed, errors, moved = True, ["unexpected error"], False
+                if errors:
+                    failed += 1
+                elif moved:
+                    skipped += 1
+                elif existed:
+                    deleted += 1
+                job.update(deleted=deleted, failed=failed, skipped=skipped)
+            for pending in futures:
+                pending.cancel()
+            wait(futures)
+            handled = [
+                note_id for future, note_id in futures.items()
+                if not future.cancelled() and future.exception() is None and not future.result()[1]
+            ]
+            remaining = settle_folder_tombstone(folder, handled)
+            note_ids = [note_id for note_id in remaining if note_id not in attempted]
+            job.update(total=len(attempted))
+    logger.info(
+        "[folder-delete] folder=%s total=%s deleted=%s skipped=%s failed=%s remaining=%s",
+        folder, len(attempted), deleted, skipped, failed, len(remaining),
+    )
+    return {
+        "folder": folder,
+        "total": len(attempted),
+        "notes_deleted": deleted,
+        "skipped": skipped,
+        "failed": failed,
+        "remaining": len(remaining),
+    }
+
+
+def reclaim_folder(folder: Optional[str]) -> None:
+    """Filing notes into a folder that is being deleted takes it back.
+
+    The pending delete keeps only the notes it was started with; clearing the
+    tombstone makes the folder and its new notes visible again.
+    """
+    folder = str(folder or "").strip()
+    if folder and folder in load_folder_tombstones():
+        remove_folder_tombstone(folder)
+
+
 async def create_note_from_text_payload(body: dict, include_summary: bool = False) -> dict:
     transcription = str((body or {}).get("transcription") or "").strip()
     if not transcription:
@@ -104,6 +565,7 @@ async def create_note_from_text_payload(body: dict, include_summary: bool = Fals
     title = str((body or {}).get("title") or "").strip()
     date_override = str((body or {}).get("date") or "").strip()
     folder = str((body or {}).get("folder") or "").strip()
+    reclaim_folder(folder)
     tags_raw = (body or {}).get("tags") or []
 
     tags: list[dict] = []
@@ -148,13 +610,15 @@ async def create_note_from_text_payload(body: dict, include_summary: bool = Fals
                     },
                 ]
             )
-            title_response, _ = await asyncio.to_thread(
-                providers.invoke_google, [title_message]
-            )
+            with usage.call_context(event="title"):
+                title_response, _ = await asyncio.to_thread(
+                    providers.invoke_google, [title_message]
+                )
             title = providers.normalize_title_output(getattr(title_response, "content", ""))
         except Exception:
             try:
-                title = providers.title_with_openai(transcription)
+                with usage.call_context(event="title", fallback=True):
+                    title = providers.title_with_openai(transcription)
             except Exception:
                 words = (transcription or '').strip().split()
                 title = ' '.join(words[:8]) if words else 'Text Note'
@@ -178,13 +642,13 @@ async def create_note_from_text_payload(body: dict, include_summary: bool = Fals
     classification = apply_classification(data, title, transcription)
     summary = await summarize_text_snippet(transcription) if include_summary else None
 
-    with open(os.path.join(config.TRANSCRIPTS_DIR, f"{nid}.json"), 'w') as jf:
-        json.dump(data, jf, ensure_ascii=False)
+    save_note_json(nid, data)
     if getattr(config, "STORE_BACKEND", "filesystem") == "appwrite":
         try:
             NOTES_STORE.save_note(nid, data.copy())
         except Exception as exc:
             logger.warning("Failed to save text note to Appwrite (nid=%s): %s", nid, exc, exc_info=True)
+    publish_note_event("note.created", nid, data)
 
     result: Dict[str, Any] = {
         "filename": pseudo_filename,
@@ -204,6 +668,49 @@ async def create_note_from_text_payload(body: dict, include_summary: bool = Fals
     return result
 
 
+# Uploads are spooled to disk in chunks of this size rather than read whole
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+def incoming_dir() -> str:
+    """Staging dir for partial uploads; same filesystem as the voice notes."""
+    return os.path.join(config.VOICE_NOTES_DIR, ".incoming")
+
+
+def discard_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Failed to remove %s", path, exc_info=True)
+
+
+async def spool_upload(file: UploadFile, directory: str) -> tuple[str, str, int]:
+    """Copy an upload to a temp file in `directory`; returns (path, sha256, size)."""
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(file.filename or "")[1] or ".tmp"
+    fd, path = tempfile.mkstemp(prefix=".upload-", suffix=suffix, dir=directory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except Exception:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return path, digest.hexdigest(), size
+
+
 async def process_audio_upload(
     file: UploadFile,
     background_tasks: BackgroundTasks,
@@ -211,11 +718,47 @@ async def process_audio_upload(
     place: Optional[str] = None,
     folder: Optional[str] = None,
 ) -> Dict[str, str]:
+    source_path, sha256, size = await spool_upload(file, incoming_dir())
+    try:
+        return await process_audio_path(
+            source_path,
+            background_tasks,
+            original_name=file.filename or "",
+            content_type=file.content_type or "",
+            date=date,
+            place=place,
+            folder=folder,
+            sha256=sha256,
+            size_bytes=size,
+        )
+    finally:
+        # Already moved away on success; a failed attempt leaves the spool file
+        discard_file(source_path)
+
+
+async def process_audio_path(
+    source_path: str,
+    background_tasks: BackgroundTasks,
+    original_name: str = "",
+    content_type: str = "",
+    date: Optional[str] = None,
+    place: Optional[str] = None,
+    folder: Optional[str] = None,
+    sha256: Optional[str] = None,
+    size_bytes: Optional[int] = None,
+) -> Dict[str, str]:
+    """Store an audio file already on disk as a new note and start transcription.
+
+    On success `source_path` is consumed: it is moved into place (or
+    transcoded and removed). Stage it under `incoming_dir()` so the move is a
+    rename. If transcoding fails it is left in place, so the caller can
+    retry or discard it.
+    """
     os.makedirs(config.VOICE_NOTES_DIR, exist_ok=True)
 
-    ct = file.content_type or ""
+    ct = content_type or ""
     ct_lower = ct.lower()
-    orig_name = (file.filename or "")
+    orig_name = original_name or ""
     name_ext = os.path.splitext(orig_name)[1].lstrip(".").lower()
 
     is_video = False
@@ -287,6 +830,10 @@ async def process_audio_upload(
         metadata_fields["transcoded_from"] = source_ext
     if ct:
         metadata_fields["content_type"] = ct
+    if sha256:
+        metadata_fields["upload_sha256"] = sha256
+    if size_bytes is not None:
+        metadata_fields["upload_size_bytes"] = size_bytes
     if needs_transcode or ext in ("m4a", "wav"):
         if ext == "m4a":
             metadata_fields.setdefault("sample_rate_hz", 44100)
@@ -297,45 +844,37 @@ async def process_audio_upload(
     filename = f"{timestamp}_{uuid.uuid4().hex[:6]}.{ext}"
     file_path = os.path.join(config.VOICE_NOTES_DIR, filename)
 
-    upload_bytes = file.file.read()
     if needs_transcode:
-        with tempfile.NamedTemporaryFile(delete=False, suffix="." + (source_ext or "tmp")) as tmp:
-            tmp.write(upload_bytes)
-            tmp_path = tmp.name
+        cmd = ["ffmpeg", "-y", "-i", source_path]
+        if ext == "m4a":
+            cmd += ["-vn", "-ac", "1", "-ar", "44100", "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", file_path]
+        elif ext == "wav":
+            cmd += ["-vn", "-ac", "1", "-ar", "16000", file_path]
+        else:
+            cmd += ["-vn", file_path]
         try:
-            cmd = ["ffmpeg", "-y", "-i", tmp_path]
-            if ext == "m4a":
-                cmd += ["-vn", "-ac", "1", "-ar", "44100", "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", file_path]
-            elif ext == "wav":
-                cmd += ["-vn", "-ac", "1", "-ar", "16000", file_path]
-            else:
-                cmd += ["-vn", file_path]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            await asyncio.to_thread(
+                subprocess.run, cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
         except Exception as e:
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
             except Exception:
                 pass
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
             raise RuntimeError(f"Failed to normalize audio: {e}")
-        finally:
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
+        try:
+            os.remove(source_path)
+        except OSError:
+            pass
     else:
-        with open(file_path, "wb") as buffer:
-            buffer.write(upload_bytes)
+        shutil.move(source_path, file_path)
 
     appwrite_file_id = None
     if getattr(config, 'STORE_BACKEND', 'filesystem') == 'appwrite' and os.path.exists(file_path):
         try:
             with open(file_path, 'rb') as fh:
-                uploaded = upload_audio_file(filename, fh.read(), stored_mime)
+                uploaded = upload_audio_file(filename, fh, stored_mime)
             if isinstance(uploaded, str) and uploaded.strip():
                 appwrite_file_id = uploaded
             else:
@@ -354,6 +893,7 @@ async def process_audio_upload(
         )
         if folder:
             payload_min["folder"] = (folder or "").strip()
+            reclaim_folder(folder)
         if appwrite_file_id:
             payload_min["appwrite_file_id"] = appwrite_file_id
         save_note_json(base_filename, payload_min)
@@ -371,8 +911,10 @@ async def process_audio_upload(
             ensure_placeholder_note(filename)
         except Exception:
             pass
+        publish_note_event("note.created", base_filename, payload_min)
     except Exception:
         pass
 
+    schedule_peaks(filename)
     background_tasks.add_task(transcribe_and_save, file_path)
     return {"filename": filename, "message": "File upload successful, transcription started."}
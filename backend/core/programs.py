@@ -3,7 +3,8 @@ from __future__ import annotations
 import json
 import os
 import threading
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import config
 from store.api import AppwriteClient
@@ -117,7 +118,7 @@ def normalize_program_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
     return normalized
 
 
-def load_programs_registry() -> List[Dict[str, Any]]:
+def _read_programs_registry() -> List[Dict[str, Any]]:
     try:
         if _use_appwrite_registry():
             client = _get_appwrite_client()
@@ -167,6 +168,91 @@ def load_programs_registry() -> List[Dict[str, Any]]:
         return []
 
 
+# Registry cache. `_REGISTRY_VERSION` increases whenever the cached list is
+# replaced so consumers (e.g. the compiled categorizer) can key on it.
+_REGISTRY_LOCK = threading.Lock()
+_REGISTRY_CACHE: Dict[str, Any] = {}
+_REGISTRY_VERSION = 0
+
+
+def _registry_source() -> Tuple[str, str]:
+    if _use_appwrite_registry():
+        return ("appwrite", config.APPWRITE_PROGRAMS_COLLECTION_ID)
+    return ("file", os.path.join(config.PROGRAMS_DIR, "programs.json"))
+
+
+def _file_stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _store_cache(source: Tuple[str, str], programs: List[Dict[str, Any]], stamp: Any) -> int:
+    global _REGISTRY_VERSION
+    _REGISTRY_VERSION += 1
+    _REGISTRY_CACHE.clear()
+    _REGISTRY_CACHE.update(
+        source=source,
+        programs=programs,
+        stamp=stamp,
+        checked_at=time.monotonic(),
+        loaded_at=time.monotonic(),
+        version=_REGISTRY_VERSION,
+    )
+    return _REGISTRY_VERSION
+
+
+def _cache_is_fresh(source: Tuple[str, str], recheck_after: float) -> bool:
+    if _REGISTRY_CACHE.get("source") != source:
+        return False
+    now = time.monotonic()
+    if source[0] == "appwrite":
+        ttl = float(getattr(config, "PROGRAMS_CACHE_TTL_SECONDS", 60) or 0)
+        return ttl > 0 and now - _REGISTRY_CACHE["loaded_at"] < ttl
+    if now - _REGISTRY_CACHE["checked_at"] < recheck_after:
+        return True
+    if _file_stamp(source[1]) != _REGISTRY_CACHE["stamp"]:
+        return False
+    _REGISTRY_CACHE["checked_at"] = now
+    return True
+
+
+def programs_registry_snapshot(recheck_after: Optional[float] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Return (programs, version) from the cache, reloading only when stale.
+
+    The file is re-stat'ed at most every `recheck_after` seconds (default
+    `PROGRAMS_CACHE_CHECK_SECONDS`), so hot paths do no I/O per call; Appwrite
+    registries are refetched after `PROGRAMS_CACHE_TTL_SECONDS`. Treat the
+    returned list as read-only.
+    """
+    if recheck_after is None:
+        recheck_after = float(getattr(config, "PROGRAMS_CACHE_CHECK_SECONDS", 2.0) or 0)
+    source = _registry_source()
+    with _REGISTRY_LOCK:
+        if _cache_is_fresh(source, recheck_after):
+            return _REGISTRY_CACHE["programs"], _REGISTRY_CACHE["version"]
+        stamp = _file_stamp(source[1]) if source[0] == "file" else None
+        programs = _read_programs_registry()
+        version = _store_cache(source, programs, stamp)
+        return programs, version
+
+
+def load_programs_registry() -> List[Dict[str, Any]]:
+    # Always compares the file stamp so API reads see out-of-band edits
+    return programs_registry_snapshot(recheck_after=0)[0]
+
+
+def registry_version() -> int:
+    return _REGISTRY_VERSION
+
+
+def invalidate_programs_cache() -> None:
+    with _REGISTRY_LOCK:
+        _REGISTRY_CACHE.clear()
+
+
 def save_programs_registry(programs: List[Dict[str, Any]]) -> None:
     if _use_appwrite_registry():
         client = _get_appwrite_client()
@@ -203,10 +289,14 @@ def save_programs_registry(programs: List[Dict[str, Any]]) -> None:
                 client.delete_document(collection, doc_id)
             except Exception:
                 pass
+        with _REGISTRY_LOCK:
+            _store_cache(_registry_source(), list(programs), None)
         return
     path = _programs_registry_path()
     tmp = path + ".tmp"
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(tmp, "w") as f:
-        json.dump(programs, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, path)
+    with _REGISTRY_LOCK:
+        with open(tmp, "w") as f:
+            json.dump(programs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+        _store_cache(("file", path), list(programs), _file_stamp(path))
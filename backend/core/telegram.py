@@ -0,0 +1,580 @@
+"""
+Telegram Bot API client shared by the Telegram integration routes.
+
+A single `httpx.AsyncClient` is kept open for the life of the process so
+webhook replies and file downloads reuse pooled connections. Outgoing
+messages go through an in-memory queue: `enqueue_message` returns right away
+and a per-chat worker sends the chat's messages in order, pacing them with a
+per-chat and a global token bucket (Telegram allows roughly one message per
+second per chat and ~30 per second overall). A 429 response is retried after
+the `retry_after` the API reports.
+
+Incoming webhook updates go through `TelegramUpdateInbox`: the raw update is
+written to `TELEGRAM_UPDATES_DIR` (which doubles as the `update_id` dedupe
+record), the webhook acks at once, and a fixed number of worker tasks process
+the updates. Updates still pending at shutdown are picked up on the next start.
+With `TELEGRAM_MODE=polling`, `TelegramPoller` long-polls `getUpdates` instead
+and feeds the same inbox, persisting its offset next to the updates. Telegram
+refuses `getUpdates` (409) while a webhook is set, so the poller deletes the
+webhook before polling and again whenever it hits that conflict.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = max(0.001, float(rate))
+        self.capacity = max(1.0, float(capacity if capacity is not None else rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self.capacity
+
+
+class TelegramBot:
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        api_base: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        global_rate: Optional[float] = None,
+        chat_rate: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self._token = token
+        self._api_base = api_base
+        self._transport = transport
+        self._global_rate = global_rate
+        self._chat_rate = chat_rate
+        self._max_attempts = max_attempts
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._global_bucket: Optional[TokenBucket] = None
+        self._chat_buckets: Dict[Any, TokenBucket] = {}
+        self._outbox: Dict[Any, Deque[Dict[str, Any]]] = {}
+        self._workers: Dict[Any, asyncio.Task] = {}
+
+    # -- configuration -------------------------------------------------
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token or config.TELEGRAM_BOT_TOKEN
+
+    @property
+    def api_base(self) -> str:
+        base = self._api_base or getattr(config, "TELEGRAM_API_BASE", None) or "https://api.telegram.org"
+        return base.rstrip("/")
+
+    def _bot_base(self) -> str:
+        token = self.token
+        if not token:
+            raise RuntimeError("Telegram bot token is not configured")
+        return f"{self.api_base}/bot{token}"
+
+    def _file_base(self) -> str:
+        token = self.token
+        if not token:
+            raise RuntimeError("Telegram bot token is not configured")
+        return f"{self.api_base}/file/bot{token}"
+
+    # -- connection ----------------------------------------------------
+
+    def _bind_loop(self) -> None:
+        # The client, buckets and workers belong to one event loop; rebuild
+        # them if we are now running under a different one (tests, reloads).
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._client = None
+        self._global_bucket = None
+        self._chat_buckets = {}
+        self._outbox = {}
+        self._workers = {}
+
+    def client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def close(self, drain_timeout: float = 5.0) -> None:
+        """Flush queued messages (bounded by `drain_timeout`) and close the client."""
+        if self._loop is not None and self._loop is asyncio.get_running_loop():
+            try:
+                await self.drain(timeout=drain_timeout)
+            except Exception:
+                logger.warning("telegram outbox drain failed", exc_info=True)
+            for task in list(self._workers.values()):
+                task.cancel()
+            self._workers = {}
+            self._outbox = {}
+        client, self._client = self._client, None
+        if client is not None and not client.is_closed:
+            try:
+                await client.aclose()
+            except RuntimeError:
+                # Client belonged to a loop that has since closed
+                pass
+
+    # -- Bot API calls -------------------------------------------------
+
+    async def call(
+        self,
+        method: str,
+        payload: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        **params: Any,
+    ) -> httpx.Response:
+        """POST a Bot API method; `params` are sent as query parameters."""
+        url = f"{self._bot_base()}/{method}"
+        extra: Dict[str, Any] = {}
+        if timeout is not None:
+            extra["timeout"] = httpx.Timeout(timeout, connect=10.0)
+        if payload is not None:
+            return await self.client().post(url, json=payload, params=params or None, **extra)
+        return await self.client().get(url, params=params or None, **extra)
+
+    async def get_file_path(self, file_id: str) -> str:
+        meta_resp = await self.call("getFile", file_id=file_id)
+        meta_resp.raise_for_status()
+        meta_data = meta_resp.json()
+        if not meta_data.get("ok"):
+            raise RuntimeError(f"telegram getFile failed: {meta_data}")
+        result = meta_data.get("result") or {}
+        file_path = result.get("file_path")
+        if not file_path:
+            raise RuntimeError("telegram getFile missing file_path")
+        return file_path
+
+    async def download_to_file(self, file_id: str, directory: str) -> Tuple[str, str, str, int]:
+        """Stream a Telegram file into a temp file under `directory`.
+
+        Returns (path, remote_name, sha256, size_bytes); memory use stays at
+        one chunk regardless of file size. The caller owns the returned path.
+        """
+        file_path = await self.get_file_path(file_id)
+        remote_name = os.path.basename(file_path)
+        os.makedirs(directory, exist_ok=True)
+        suffix = os.path.splitext(remote_name)[1] or ".tmp"
+        fd, path = tempfile.mkstemp(prefix=".telegram-", suffix=suffix, dir=directory)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async with self.client().stream("GET", f"{self._file_base()}/{file_path}") as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        out.write(chunk)
+        except BaseException:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        return path, remote_name, digest.hexdigest(), size
+
+    # -- outbound queue ------------------------------------------------
+
+    def _rate(self, value: Optional[float], name: str, default: float) -> float:
+        if value is not None:
+            return value
+        return float(getattr(config, name, default) or default)
+
+    def _global(self) -> TokenBucket:
+        if self._global_bucket is None:
+            self._global_bucket = TokenBucket(self._rate(self._global_rate, "TELEGRAM_GLOBAL_RATE", 30.0))
+        return self._global_bucket
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._rate(self._chat_rate, "TELEGRAM_CHAT_RATE", 1.0))
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def enqueue_message(self, chat_id: Any, text: str, reply_to: Optional[int] = None) -> bool:
+        """Queue a sendMessage for delivery; returns False when nothing was queued."""
+        if not text:
+            return False
+        if not self.token:
+            logger.warning("telegram send skipped: Telegram bot token is not configured")
+            return False
+        self._bind_loop()
+        payload: Dict[str, Any] = {"chat_id": chat_id, "text": text}
+        if reply_to is not None:
+            payload["reply_to_message_id"] = reply_to
+            payload["allow_sending_without_reply"] = True
+        self._outbox.setdefault(chat_id, deque()).append(payload)
+        worker = self._workers.get(chat_id)
+        if worker is None or worker.done():
+            self._workers[chat_id] = asyncio.get_running_loop().create_task(self._chat_worker(chat_id))
+        return True
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._outbox.values())
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait until every queued message has been sent (or given up on)."""
+        workers = [t for t in self._workers.values() if not t.done()]
+        if not workers:
+            return
+        await asyncio.wait(workers, timeout=timeout)
+
+    async def _chat_worker(self, chat_id: Any) -> None:
+        queue = self._outbox.get(chat_id)
+        try:
+            while queue:
+                payload = queue[0]
+                await self._chat_bucket(chat_id).acquire()
+                await self._global().acquire()
+                await self._deliver(payload)
+                queue.popleft()
+        finally:
+            if self._outbox.get(chat_id) is queue and not queue:
+                self._outbox.pop(chat_id, None)
+                self._workers.pop(chat_id, None)
+                bucket = self._chat_buckets.get(chat_id)
+                if bucket is not None and bucket.idle():
+                    self._chat_buckets.pop(chat_id, None)
+
+    async def _deliver(self, payload: Dict[str, Any]) -> None:
+        attempts = int(self._max_attempts or getattr(config, "TELEGRAM_SEND_MAX_ATTEMPTS", 4) or 4)
+        for attempt in range(1, attempts + 1):
+            try:
+                resp = await self.call("sendMessage", payload)
+            except Exception:
+                if attempt >= attempts:
+                    logger.exception("Error sending Telegram message")
+                    return
+                await asyncio.sleep(min(2 ** attempt, 30))
+                continue
+            if resp.status_code == 429 and attempt < attempts:
+                await asyncio.sleep(_retry_after(resp))
+                continue
+            if resp.status_code >= 400:
+                logger.warning(
+                    "telegram send failed status=%s body=%s",
+                    resp.status_code,
+                    resp.text[:256],
+                )
+            return
+
+
+def _retry_after(resp: httpx.Response) -> float:
+    try:
+        params = (resp.json() or {}).get("parameters") or {}
+        return max(0.0, float(params.get("retry_after")))
+    except Exception:
+        pass
+    try:
+        return max(0.0, float(resp.headers.get("retry-after")))
+    except Exception:
+        return 1.0
+
+
+UpdateHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class TelegramUpdateInbox:
+    """Durable, deduplicated hand-off from the webhook to a bounded worker pool."""
+
+    def __init__(self, handler: UpdateHandler, workers: Optional[int] = None) -> None:
+        self._handler = handler
+        self._workers_wanted = workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._queued: Set[int] = set()
+
+    @staticmethod
+    def _dirs() -> Tuple[str, str]:
+        base = getattr(config, "TELEGRAM_UPDATES_DIR", None) or os.path.join(config.STORAGE_DIR, "telegram", "updates")
+        return os.path.join(base, "pending"), os.path.join(base, "done")
+
+    def _paths(self, update_id: int) -> Tuple[str, str]:
+        pending_dir, done_dir = self._dirs()
+        name = f"{update_id}.json"
+        return os.path.join(pending_dir, name), os.path.join(done_dir, name)
+
+    def seen(self, update_id: int) -> bool:
+        pending, done = self._paths(update_id)
+        return update_id in self._queued or os.path.exists(pending) or os.path.exists(done)
+
+    def start(self) -> None:
+        """Start the workers on the running loop and re-queue leftover updates."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._queued = set()
+        count = int(self._workers_wanted or getattr(config, "TELEGRAM_WEBHOOK_WORKERS", 4) or 4)
+        self._workers = [loop.create_task(self._worker()) for _ in range(max(1, count))]
+        pending_dir, _ = self._dirs()
+        try:
+            names = sorted(
+                (n for n in os.listdir(pending_dir) if n.endswith(".json")),
+                key=lambda n: int(n[:-5]) if n[:-5].lstrip("-").isdigit() else 0,
+            )
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            try:
+                with open(os.path.join(pending_dir, name), "r", encoding="utf-8") as f:
+                    update = json.load(f)
+                update_id = int(update["update_id"])
+            except Exception:
+                logger.warning("Skipping unreadable Telegram update %s", name, exc_info=True)
+                continue
+            self._queued.add(update_id)
+            self._queue.put_nowait(update)
+        if names:
+            logger.info("Re-queued %s pending Telegram updates", len(self._queued))
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        """Persist and queue an update; returns False for duplicates."""
+        update_id = update.get("update_id")
+        if not isinstance(update_id, int):
+            raise ValueError("update_id is required")
+        self.start()
+        if self.seen(update_id):
+            return False
+        pending, _ = self._paths(update_id)
+        os.makedirs(os.path.dirname(pending), exist_ok=True)
+        tmp_path = pending + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(update, f, ensure_ascii=False)
+        os.replace(tmp_path, pending)
+        self._queued.add(update_id)
+        assert self._queue is not None
+        self._queue.put_nowait(update)
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        for task in workers:
+            try:
+                await task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+        self._loop = None
+        self._queue = None
+        self._queued = set()
+
+    def _mark_done(self, update_id: int) -> None:
+        pending, done = self._paths(update_id)
+        try:
+            os.makedirs(os.path.dirname(done), exist_ok=True)
+            os.replace(pending, done)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.warning("Failed to mark Telegram update %s done", update_id, exc_info=True)
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            update = await queue.get()
+            update_id = update.get("update_id")
+            try:
+                await self._handler(update)
+            except Exception:
+                logger.exception("Unhandled error processing Telegram update %s", update_id)
+            finally:
+                # Processed (or failed for good): never replay it on redelivery
+                self._mark_done(update_id)
+                self._queued.discard(update_id)
+                queue.task_done()
+
+    def prune_done(self, max_age_seconds: float = 7 * 24 * 3600) -> int:
+        """Drop dedupe records older than `max_age_seconds`."""
+        _, done_dir = self._dirs()
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        try:
+            entries = list(os.scandir(done_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+class TelegramPoller:
+    """Long-poll `getUpdates` and hand each batch to a `TelegramUpdateInbox`."""
+
+    def __init__(
+        self,
+        bot: TelegramBot,
+        inbox: TelegramUpdateInbox,
+        poll_timeout: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> None:
+        self._bot = bot
+        self._inbox = inbox
+        self._poll_timeout = poll_timeout
+        self._limit = limit
+        self._task: Optional[asyncio.Task] = None
+        self._offset: Optional[int] = None
+        self._webhook_cleared = False
+
+    @staticmethod
+    def _offset_path() -> str:
+        base = getattr(config, "TELEGRAM_UPDATES_DIR", None) or os.path.join(config.STORAGE_DIR, "telegram", "updates")
+        return os.path.join(base, "offset.json")
+
+    @property
+    def offset(self) -> int:
+        if self._offset is None:
+            try:
+                with open(self._offset_path(), "r", encoding="utf-8") as f:
+                    self._offset = int(json.load(f).get("offset") or 0)
+            except (FileNotFoundError, ValueError, TypeError, AttributeError):
+                self._offset = 0
+        return self._offset
+
+    def _save_offset(self, offset: int) -> None:
+        self._offset = offset
+        path = self._offset_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"offset": offset}, f)
+        os.replace(tmp_path, path)
+
+    async def poll_once(self) -> int:
+        """Fetch one batch of updates; returns how many were newly queued."""
+        poll_timeout = int(self._poll_timeout if self._poll_timeout is not None else getattr(config, "TELEGRAM_POLL_TIMEOUT", 25))
+        limit = int(self._limit or getattr(config, "TELEGRAM_POLL_LIMIT", 100) or 100)
+        payload: Dict[str, Any] = {"timeout": poll_timeout, "limit": limit}
+        if self.offset:
+            payload["offset"] = self.offset
+        resp = await self._bot.call("getUpdates", payload, timeout=poll_timeout + 15)
+        if resp.status_code == 429:
+            await asyncio.sleep(_retry_after(resp))
+            return 0
+        if resp.status_code == 409:
+            # A webhook was set (or another poller runs); clear it before the next poll
+            self._webhook_cleared = False
+            logger.error("Telegram getUpdates conflict: %s", resp.text)
+            raise RuntimeError("telegram getUpdates conflict: webhook set or another poller running")
+        resp.raise_for_status()
+        body = resp.json()
+        if not body.get("ok"):
+            raise RuntimeError(f"telegram getUpdates failed: {body}")
+        updates = [u for u in (body.get("result") or []) if isinstance(u, dict) and isinstance(u.get("update_id"), int)]
+        queued = 0
+        for update in updates:
+            if self._inbox.submit(update):
+                queued += 1
+        if updates:
+            # Updates are persisted by the inbox first, so confirming them
+            # with the next offset cannot lose any
+            self._save_offset(max(u["update_id"] for u in updates) + 1)
+        return queued
+
+    async def delete_webhook(self) -> None:
+        """Remove any webhook so `getUpdates` is allowed; pending updates are kept."""
+        resp = await self._bot.call("deleteWebhook", {"drop_pending_updates": False})
+        resp.raise_for_status()
+        body = resp.json()
+        if not body.get("ok"):
+            raise RuntimeError(f"telegram deleteWebhook failed: {body}")
+        self._webhook_cleared = True
+        logger.info("Telegram webhook deleted; polling getUpdates")
+
+    async def run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                if not self._webhook_cleared:
+                    await self.delete_webhook()
+                await self.poll_once()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Telegram getUpdates failed; retrying in %.0fs", backoff, exc_info=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def start(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        self._inbox.start()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, RuntimeError):
+            pass
+
+
+TELEGRAM_BOT = TelegramBot()
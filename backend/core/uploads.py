@@ -0,0 +1,236 @@
+"""
+Resumable chunked uploads for large recordings.
+
+A client creates a session with the total size (and optionally the file's
+sha256), then PUTs the bytes in chunks at explicit offsets. Each chunk is
+streamed straight into a staging file, so server memory does not depend on
+the file size. The staging file's length *is* the session offset. After a
+dropped connection the client asks for the offset and continues from there,
+even across backend restarts. Finalize checks the size and sha256 and then
+hands the file to `note_logic.process_audio_path` like a normal upload.
+
+Sessions live under `incoming_dir()/sessions/<id>/` (`meta.json` +
+`data.part`) on the same filesystem as the voice notes, so the final move is
+a rename. Idle sessions are pruned after `UPLOAD_SESSION_TTL_SECONDS`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import BackgroundTasks
+
+import config
+from core import note_logic
+
+logger = logging.getLogger(__name__)
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+_LOCKS: Dict[str, asyncio.Lock] = {}
+
+
+class UploadConflict(ValueError):
+    """The request doesn't match the session state; `offset` is where it is."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(message)
+        self.offset = offset
+
+
+def sessions_dir() -> str:
+    return os.path.join(note_logic.incoming_dir(), "sessions")
+
+
+def _session_dir(upload_id: str) -> str:
+    if not _ID_RE.match(upload_id or ""):
+        raise KeyError(upload_id)
+    return os.path.join(sessions_dir(), upload_id)
+
+
+def _data_path(upload_id: str) -> str:
+    return os.path.join(_session_dir(upload_id), "data.part")
+
+
+def _load_meta(upload_id: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(_session_dir(upload_id), "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise KeyError(upload_id)
+
+
+def _offset(upload_id: str) -> int:
+    try:
+        return os.path.getsize(_data_path(upload_id))
+    except OSError:
+        return 0
+
+
+def _lock(upload_id: str) -> asyncio.Lock:
+    lock = _LOCKS.get(upload_id)
+    if lock is None:
+        lock = _LOCKS[upload_id] = asyncio.Lock()
+    return lock
+
+
+def create_upload(
+    filename: str,
+    size: int,
+    content_type: Optional[str] = None,
+    sha256: Optional[str] = None,
+    folder: Optional[str] = None,
+    date: Optional[str] = None,
+    place: Optional[str] = None,
+) -> Dict[str, Any]:
+    if size <= 0:
+        raise ValueError("size must be positive")
+    if size > config.UPLOAD_MAX_BYTES:
+        raise ValueError(f"upload exceeds {config.UPLOAD_MAX_BYTES} bytes")
+    sha256 = (sha256 or "").strip().lower() or None
+    if sha256 and not _SHA256_RE.match(sha256):
+        raise ValueError("sha256 must be a hex digest")
+    prune_stale_uploads()
+
+    upload_id = uuid.uuid4().hex
+    directory = _session_dir(upload_id)
+    os.makedirs(directory)
+    meta = {
+        "id": upload_id,
+        "filename": os.path.basename(filename or ""),
+        "size": size,
+        "content_type": content_type or "",
+        "sha256": sha256,
+        "folder": folder,
+        "date": date,
+        "place": place,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    open(_data_path(upload_id), "wb").close()
+    return {"upload_id": upload_id, "offset": 0, "size": size}
+
+
+def upload_status(upload_id: str) -> Dict[str, Any]:
+    meta = _load_meta(upload_id)
+    return {"upload_id": upload_id, "offset": _offset(upload_id), "size": meta["size"]}
+
+
+async def append_chunk(upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """Append a streamed chunk written at `offset`; returns the new offset.
+
+    Bytes received before a dropped connection are kept, so the client can
+    resume from whatever `upload_status` reports.
+    """
+    meta = _load_meta(upload_id)
+    lock = _lock(upload_id)
+    if lock.locked():
+        raise UploadConflict("another request is writing to this upload", _offset(upload_id))
+    async with lock:
+        current = _offset(upload_id)
+        if offset != current:
+            raise UploadConflict(f"expected offset {current}", current)
+        with open(_data_path(upload_id), "ab") as out:
+            try:
+                async for chunk in chunks:
+                    if current + len(chunk) > meta["size"]:
+                        raise UploadConflict("chunk runs past the declared size", current)
+                    out.write(chunk)
+                    current += len(chunk)
+            finally:
+                out.flush()
+        os.utime(_session_dir(upload_id), None)
+        return current
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(note_logic.UPLOAD_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def finalize_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    sha256: Optional[str] = None,
+) -> Dict[str, str]:
+    """Verify the staged file and turn it into a note (transcode + transcription)."""
+    _load_meta(upload_id)
+    async with _lock(upload_id):
+        # A finalize queued behind another one finds the session gone: 404
+        meta = _load_meta(upload_id)
+        current = _offset(upload_id)
+        if current != meta["size"]:
+            raise UploadConflict(f"upload incomplete: {current} of {meta['size']} bytes", current)
+        actual = await asyncio.to_thread(_file_sha256, _data_path(upload_id))
+        expected = (sha256 or "").strip().lower() or meta.get("sha256")
+        if expected and actual != expected:
+            # The bytes on disk are wrong somewhere; resuming can't fix that
+            abort_upload(upload_id)
+            raise ValueError("sha256 mismatch; upload discarded")
+        try:
+            result = await note_logic.process_audio_path(
+                _data_path(upload_id),
+                background_tasks,
+                original_name=meta.get("filename") or "",
+                content_type=meta.get("content_type") or "",
+                date=meta.get("date"),
+                place=meta.get("place"),
+                folder=meta.get("folder"),
+                sha256=actual,
+                size_bytes=current,
+            )
+        except Exception:
+            # Keep the verified bytes so finalize can be retried, unless they
+            # were already moved into the notes before the failure
+            if not os.path.exists(_data_path(upload_id)):
+                abort_upload(upload_id)
+            raise
+        abort_upload(upload_id)
+        return result
+
+
+def abort_upload(upload_id: str) -> bool:
+    directory = _session_dir(upload_id)
+    _LOCKS.pop(upload_id, None)
+    if not os.path.isdir(directory):
+        return False
+    shutil.rmtree(directory, ignore_errors=True)
+    return True
+
+
+def prune_stale_uploads(max_age: Optional[float] = None) -> int:
+    """Remove sessions idle for longer than `max_age` seconds."""
+    max_age = config.UPLOAD_SESSION_TTL_SECONDS if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(sessions_dir()))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not _ID_RE.match(entry.name) or entry.name in _LOCKS and _LOCKS[entry.name].locked():
+            continue
+        try:
+            idle = max(entry.stat().st_mtime, os.path.getmtime(os.path.join(entry.path, "data.part")))
+        except OSError:
+            idle = 0
+        if idle < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            _LOCKS.pop(entry.name, None)
+            removed += 1
+    if removed:
+        logger.info("[uploads] pruned %s stale sessions", removed)
+    return removed
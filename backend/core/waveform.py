@@ -0,0 +1,253 @@
+"""
+Precomputed waveform peaks for audio notes.
+
+Audio is decoded once to mono 16-bit PCM (WAV directly, anything else
+through ffmpeg). It is reduced to `PEAKS_BINS` (min, max) pairs quantized
+to int8 and stored as a small JSON sidecar under `PEAKS_DIR`. Note cards
+draw their waveform and read the duration from it instead of downloading
+the audio.
+
+Peaks are built on a small worker pool: right after upload, on first
+request, or by the backfill job. Concurrent requests for the same file
+share one build. NumPy does the reduction when it is installed; otherwise
+a slower pure-Python loop is used.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import wave
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional, Tuple
+
+import config
+from store import get_notes_store
+from store.media import cached_audio_path
+
+try:
+    import numpy as np
+except ImportError:  # optional speedup
+    np = None
+
+logger = logging.getLogger(__name__)
+NOTES_STORE = get_notes_store()
+
+PEAKS_VERSION = 1
+# ffmpeg decode rate; plenty for ~1k bins and keeps PCM small (16 KB/s)
+DECODE_RATE = 8000
+# Frames read per block when decoding WAV files directly
+WAV_BLOCK_FRAMES = 1 << 16
+AUDIO_EXTENSIONS = (".wav", ".m4a", ".mp3", ".ogg", ".webm")
+
+_POOL = ThreadPoolExecutor(max_workers=config.PEAKS_WORKERS, thread_name_prefix="peaks")
+_PENDING: Dict[str, Future] = {}
+_PENDING_LOCK = threading.Lock()
+
+
+def peaks_path(filename: str) -> str:
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(config.PEAKS_DIR, f"{base}.json")
+
+
+def load_peaks(filename: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(peaks_path(filename), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != PEAKS_VERSION:
+        return None
+    return data
+
+
+def delete_peaks(filename: str) -> None:
+    try:
+        os.remove(peaks_path(filename))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.warning("Failed to delete peaks for %s", filename, exc_info=True)
+
+
+def _downmix(frames: bytes, channels: int) -> bytes:
+    """Average interleaved s16le channels into mono."""
+    if np is not None:
+        samples = np.frombuffer(frames, dtype="<i2").reshape(-1, channels)
+        return samples.mean(axis=1).astype("<i2").tobytes()
+    samples = array("h")
+    samples.frombytes(frames)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    # int() truncates toward zero like numpy's astype
+    mono = array("h", (
+        int(sum(frame) / channels)
+        for frame in zip(*(samples[c::channels] for c in range(channels)))
+    ))
+    if sys.byteorder == "big":
+        mono.byteswap()
+    return mono.tobytes()
+
+
+def _wav_pcm(path: str) -> Optional[Tuple[bytes, int]]:
+    """Mono 16-bit PCM of a WAV file, or None if it needs ffmpeg."""
+    pcm = bytearray()
+    try:
+        with wave.open(path, "rb") as wf:
+            if wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
+                return None
+            channels = wf.getnchannels()
+            rate = wf.getframerate()
+            # Downmix block by block so only the mono PCM is held in memory
+            while True:
+                frames = wf.readframes(WAV_BLOCK_FRAMES)
+                if not frames:
+                    break
+                frames = frames[: len(frames) - len(frames) % (2 * channels)]
+                pcm += _downmix(frames, channels) if channels > 1 else frames
+    except (wave.Error, EOFError):
+        return None
+    return bytes(pcm), rate
+
+
+def _ffmpeg_pcm(path: str) -> Tuple[bytes, int]:
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", path,
+        "-vn", "-ac", "1", "-ar", str(DECODE_RATE), "-f", "s16le", "-",
+    ]
+    proc = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return proc.stdout, DECODE_RATE
+
+
+def decode_pcm(path: str) -> Tuple[bytes, int]:
+    """(mono s16le PCM, sample rate) for an audio file."""
+    if path.lower().endswith(".wav"):
+        decoded = _wav_pcm(path)
+        if decoded is not None:
+            return decoded
+    return _ffmpeg_pcm(path)
+
+
+def compute_peaks(pcm: bytes, rate: int, bins: int) -> Dict[str, Any]:
+    """Reduce PCM to interleaved int8 [min0, max0, min1, max1, ...] pairs."""
+    pcm = pcm[: len(pcm) - len(pcm) % 2]
+    n = len(pcm) // 2
+    bins = max(0, min(bins, n))
+    if np is not None and bins:
+        samples = np.frombuffer(pcm, dtype="<i2")
+        edges = (np.arange(bins, dtype=np.int64) * n) // bins
+        pairs = np.empty(bins * 2, dtype=np.int8)
+        pairs[0::2] = np.minimum.reduceat(samples, edges) >> 8
+        pairs[1::2] = np.maximum.reduceat(samples, edges) >> 8
+        peaks = pairs.tolist()
+    else:
+        samples = array("h")
+        samples.frombytes(pcm)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        peaks = []
+        for i in range(bins):
+            chunk = samples[(i * n) // bins:((i + 1) * n) // bins]
+            peaks.append(min(chunk) >> 8)
+            peaks.append(max(chunk) >> 8)
+    return {
+        "version": PEAKS_VERSION,
+        "bins": bins,
+        "duration_seconds": round(n / rate, 2) if rate else None,
+        "peaks": peaks,
+    }
+
+
+def _audio_source(filename: str) -> Optional[str]:
+    local = os.path.join(config.VOICE_NOTES_DIR, filename)
+    if os.path.isfile(local):
+        return local
+    try:
+        data, _, _ = NOTES_STORE.load_note(os.path.splitext(filename)[0])
+    except Exception:
+        data = None
+    if not data or not data.get("appwrite_file_id"):
+        return None
+    return cached_audio_path(data["appwrite_file_id"], data.get("upload_sha256"))
+
+
+def build_peaks(filename: str, force: bool = False) -> Optional[Dict[str, Any]]:
+    """Compute and store peaks for `filename`; returns them, or None on failure."""
+    if not force:
+        existing = load_peaks(filename)
+        if existing is not None:
+            return existing
+    source = _audio_source(filename)
+    if not source:
+        return None
+    try:
+        pcm, rate = decode_pcm(source)
+    except Exception as exc:
+        logger.warning("Failed to decode %s for peaks: %s", filename, exc)
+        return None
+    data = compute_peaks(pcm, rate, config.PEAKS_BINS)
+    path = peaks_path(filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return data
+
+
+def _run_build(filename: str, force: bool) -> Optional[Dict[str, Any]]:
+    try:
+        return build_peaks(filename, force)
+    except Exception:
+        logger.warning("Peaks build failed for %s", filename, exc_info=True)
+        return None
+    finally:
+        with _PENDING_LOCK:
+            _PENDING.pop(filename, None)
+
+
+def schedule_peaks(filename: str, force: bool = False) -> Future:
+    """Queue a peaks build; callers for the same file share one future."""
+    with _PENDING_LOCK:
+        pending = _PENDING.get(filename)
+        if pending is None:
+            pending = _PENDING[filename] = _POOL.submit(_run_build, filename, force)
+        return pending
+
+
+def backfill_peaks(job, force: bool = False) -> Dict[str, Any]:
+    """Build missing peaks for every audio note (a `core.jobs` job)."""
+    built = skipped = failed = 0
+    filenames = []
+    for note in NOTES_STORE.list_notes():
+        filename = str(note.get("filename") or "")
+        if filename.lower().endswith(AUDIO_EXTENSIONS):
+            filenames.append(filename)
+    job.update(total=len(filenames), built=0, skipped=0, failed=0)
+
+    # Keep a bounded window queued so cancellation takes effect promptly
+    window = max(1, config.PEAKS_WORKERS * 4)
+    for start in range(0, len(filenames), window):
+        if job.cancelled:
+            break
+        futures = {}
+        for filename in filenames[start:start + window]:
+            if not force and os.path.exists(peaks_path(filename)):
+                skipped += 1
+                continue
+            futures[schedule_peaks(filename, force)] = filename
+        wait(futures)
+        for future in futures:
+            if future.result() is not None:
+                built += 1
+            else:
+                failed += 1
+        job.update(built=built, skipped=skipped, failed=failed)
+
+    logger.info("[peaks] built=%s skipped=%s failed=%s", built, skipped, failed)
+    return {"total": len(filenames), "built": built, "skipped": skipped, "failed": failed}
@@ -0,0 +1,256 @@
+"""
+Folder/program suggestions learned from the user's own corrections.
+
+Whenever a note's folder (or program) is set by hand through
+`PATCH /api/notes/{filename}/folder`, its tokens are added as a training
+example to a multinomial Naive Bayes model. Training is incremental (adding or
+relabelling an example only touches that note's counts) and prediction is a
+dictionary walk over the note's tokens, so it is cheap enough to run on every
+note. Examples are persisted to `MODELS_DIR/corrections.json`.
+
+NumPy is only an optional speed-up elsewhere in the backend, and with sparse
+token counts over a few labels plain dicts are as fast, so the model is pure
+Python.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import config
+from categorizer import _tokenize
+
+logger = logging.getLogger(__name__)
+
+LABEL_KINDS = ("folder", "program")
+# A label needs this many examples before it is ever suggested
+MIN_LABEL_EXAMPLES = 2
+# Ignore very short/common tokens that carry no signal
+STOPWORDS = frozenset(
+    "the and for that this with from have has was were are but not you your our out "
+    "about into just then them they their there what when where which will would "
+    "could should need needs".split()
+)
+
+
+def note_tokens(transcription: str, title: Optional[str] = None) -> List[str]:
+    return [t for t in _tokenize(f"{title or ''} {transcription or ''}") if len(t) > 2 and t not in STOPWORDS]
+
+
+class NaiveBayes:
+    """Multinomial Naive Bayes over token counts with Laplace smoothing."""
+
+    def __init__(self, alpha: float = 1.0) -> None:
+        self.alpha = alpha
+        self.doc_counts: Counter = Counter()
+        self.token_totals: Counter = Counter()
+        self.token_counts: Dict[str, Counter] = {}
+        self.vocab: Counter = Counter()
+
+    def add(self, label: str, counts: Dict[str, int], sign: int = 1) -> None:
+        self.doc_counts[label] += sign
+        per_label = self.token_counts.setdefault(label, Counter())
+        for token, n in counts.items():
+            per_label[token] += sign * n
+            self.token_totals[label] += sign * n
+            self.vocab[token] += sign
+            if per_label[token] <= 0:
+                del per_label[token]
+            if self.vocab[token] <= 0:
+                del self.vocab[token]
+        if self.doc_counts[label] <= 0:
+            self.doc_counts.pop(label, None)
+            self.token_counts.pop(label, None)
+            self.token_totals.pop(label, None)
+
+    def predict(self, tokens: Iterable[str]) -> Optional[Tuple[str, float]]:
+        """Return (label, score) or None when there is nothing to go on.
+
+        The score is the top label's share after damping (see below). It ranks
+        labels and is thresholded on its own scale, but it is not a calibrated
+        probability, so it must not be compared with keyword confidences.
+        """
+        labels = [label for label, n in self.doc_counts.items() if n >= MIN_LABEL_EXAMPLES]
+        known = [t for t in tokens if t in self.vocab]
+        if len(labels) < 2 or not known:
+            return None
+        total_docs = sum(self.doc_counts[label] for label in labels)
+        vocab_size = len(self.vocab)
+        # Naive Bayes treats every token as independent evidence, which makes
+        # raw posteriors collapse to ~0/1 on longer notes. Scaling the
+        # likelihood by 1/sqrt(n) keeps scores usable as a ranking signal.
+        damping = 1.0 / math.sqrt(len(known))
+        scores: Dict[str, float] = {}
+        for label in labels:
+            counts = self.token_counts.get(label) or {}
+            denom = math.log(self.token_totals[label] + self.alpha * vocab_size)
+            loglik = 0.0
+            for token in known:
+                loglik += math.log(counts.get(token, 0) + self.alpha) - denom
+            scores[label] = math.log(self.doc_counts[label] / total_docs) + damping * loglik
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        norm = sum(math.exp(score - top) for score in scores.values())
+        return best, round(1.0 / norm, 2)
+
+
+class CorrectionModel:
+    """Per-note training examples plus one Naive Bayes model per label kind."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._examples: Dict[str, Dict[str, object]] = {}
+        self._models: Dict[str, NaiveBayes] = {kind: NaiveBayes() for kind in LABEL_KINDS}
+
+    @staticmethod
+    def _corrections_path() -> str:
+        base = getattr(config, "MODELS_DIR", None) or os.path.join(config.STORAGE_DIR, "models")
+        return os.path.join(base, "corrections.json")
+
+    def _ensure_loaded(self) -> None:
+        path = self._corrections_path()
+        if self._path == path:
+            return
+        self._path = path
+        self._examples = {}
+        self._models = {kind: NaiveBayes() for kind in LABEL_KINDS}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.warning("Ignoring unreadable corrections file %s", path, exc_info=True)
+            return
+        for note_id, example in (data.get("examples") or {}).items():
+            if isinstance(example, dict):
+                self._apply(note_id, example, 1)
+                self._examples[note_id] = example
+
+    def _apply(self, note_id: str, example: Dict[str, object], sign: int) -> None:
+        counts = example.get("tokens") or {}
+        for kind in LABEL_KINDS:
+            label = example.get(kind)
+            if label:
+                self._models[kind].add(str(label), counts, sign)
+
+    def _persist(self) -> None:
+        path = self._corrections_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"examples": self._examples}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _record_locked(
+        self,
+        note_id: str,
+        transcription: str,
+        title: Optional[str],
+        folder: Optional[str],
+        program: Optional[str],
+    ) -> None:
+        previous = self._examples.get(note_id)
+        example: Dict[str, object] = dict(previous or {})
+        if folder is not None:
+            example["folder"] = folder.strip() or None
+        if program is not None:
+            example["program"] = program.strip() or None
+        example["tokens"] = dict(Counter(note_tokens(transcription, title)))
+        if previous:
+            self._apply(note_id, previous, -1)
+        if not example["tokens"] or not any(example.get(kind) for kind in LABEL_KINDS):
+            self._examples.pop(note_id, None)
+        else:
+            self._apply(note_id, example, 1)
+            self._examples[note_id] = example
+
+    def _persist_quietly(self) -> None:
+        try:
+            self._persist()
+        except Exception:
+            logger.warning("Failed to persist classifier corrections", exc_info=True)
+
+    def record(
+        self,
+        note_id: str,
+        transcription: str,
+        title: Optional[str] = None,
+        folder: Optional[str] = None,
+        program: Optional[str] = None,
+    ) -> None:
+        """Add or relabel the training example for `note_id`.
+
+        `None` keeps the note's previous label for that kind; an empty string
+        clears it.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            self._record_locked(note_id, transcription, title, folder, program)
+            self._persist_quietly()
+
+    def record_many(self, corrections: Iterable[Dict[str, Any]]) -> int:
+        """`record` for a batch of corrections, writing corrections.json once.
+
+        Each item takes `record`'s arguments as keys (`note_id`,
+        `transcription`, optional `title`/`folder`/`program`). Returns the
+        number of corrections applied.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            applied = 0
+            for item in corrections:
+                self._record_locked(
+                    str(item["note_id"]),
+                    str(item.get("transcription") or ""),
+                    item.get("title"),
+                    item.get("folder"),
+                    item.get("program"),
+                )
+                applied += 1
+            if applied:
+                self._persist_quietly()
+            return applied
+
+    def forget(self, note_id: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            previous = self._examples.pop(note_id, None)
+            if previous is None:
+                return
+            self._apply(note_id, previous, -1)
+            self._persist_quietly()
+
+    def predict(self, tokens: List[str]) -> Dict[str, Tuple[str, float]]:
+        """Return {kind: (label, score)} for kinds with a usable model."""
+        with self._lock:
+            self._ensure_loaded()
+            out: Dict[str, Tuple[str, float]] = {}
+            for kind in LABEL_KINDS:
+                guess = self._models[kind].predict(tokens)
+                if guess is not None:
+                    out[kind] = guess
+            return out
+
+    def example_count(self, kind: Optional[str] = None) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            if kind is None:
+                return len(self._examples)
+            return sum(1 for e in self._examples.values() if e.get(kind))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._path = None
+            self._examples = {}
+            self._models = {kind: NaiveBayes() for kind in LABEL_KINDS}
+
+
+CORRECTIONS = CorrectionModel()
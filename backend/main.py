@@ -2,10 +2,14 @@ import logging
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 
 import config
-from routes import integrations, models, narratives, notes, programs, folders
+import usage_log as usage
+from core.fast_json import FastJSONResponse
+from core.telegram import TELEGRAM_BOT
+from core.uploads import prune_stale_uploads
+from routes import analytics, events, integrations, jobs, media, models, narratives, notes, programs, folders, uploads
 from utils import on_startup
 
 LOG_LEVEL_NAME = getattr(config, "LOG_LEVEL", "INFO") or "INFO"
@@ -29,8 +33,10 @@ for noisy in (
 ):
     logging.getLogger(noisy).setLevel(LOG_LEVEL)
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
+# Starlette skips SSE, audio and partial responses; brotli is left to the reverse proxy
+app.add_middleware(GZipMiddleware, minimum_size=config.GZIP_MIN_SIZE, compresslevel=5)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=getattr(
@@ -46,17 +52,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Notes-Seq", "Upload-Offset"],
 )
 
-app.mount(
-    "/voice_notes",
-    StaticFiles(directory=config.VOICE_NOTES_DIR, check_dir=False),
-    name="voice_notes",
-)
 
 @app.on_event("startup")
 async def startup_event():
     await on_startup()
+    integrations.TELEGRAM_UPDATES.prune_done()
+    integrations.TELEGRAM_UPDATES.start()
+    folders.resume_folder_deletes()
+    prune_stale_uploads()
+    if config.TELEGRAM_MODE == "polling" and config.TELEGRAM_BOT_TOKEN:
+        integrations.TELEGRAM_POLLER.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await integrations.TELEGRAM_POLLER.stop()
+    await integrations.TELEGRAM_UPDATES.stop()
+    await TELEGRAM_BOT.close()
+    usage.stop_flusher()
 
 app.include_router(notes.router)
 app.include_router(integrations.router)
@@ -64,6 +80,11 @@ app.include_router(models.router)
 app.include_router(programs.router)
 app.include_router(narratives.router)
 app.include_router(folders.router)
+app.include_router(analytics.router)
+app.include_router(jobs.router)
+app.include_router(events.router)
+app.include_router(media.router)
+app.include_router(uploads.router)
 
 if __name__ == "__main__":
     import uvicorn
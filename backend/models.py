@@ -15,3 +15,23 @@ class TagsUpdate(BaseModel):
 
 class FolderUpdate(BaseModel):
     folder: Optional[str] = None
+    program: Optional[str] = None  # manual program assignment; also trains suggestions
+
+class BulkNotesRequest(BaseModel):
+    ids: List[str]
+    op: str  # move | set_tags | add_tag | remove_tag | delete
+    folder: Optional[str] = None  # move
+    tags: Optional[List[Tag]] = None  # set_tags
+    tag: Optional[Tag] = None  # add_tag / remove_tag (matched by label)
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int  # total bytes the client will send
+    content_type: Optional[str] = None
+    sha256: Optional[str] = None  # hex digest of the whole file, checked on finalize
+    folder: Optional[str] = None
+    date: Optional[str] = None
+    place: Optional[str] = None
+
+class UploadFinalize(BaseModel):
+    sha256: Optional[str] = None
@@ -14,6 +14,7 @@ from datetime import datetime
 from typing import Any, Dict, Tuple, Optional, List
 
 import config
+from store.index import NOTE_INDEX
 
 
 def _require_filesystem_backend() -> None:
@@ -293,8 +294,10 @@ def ensure_metadata_in_json(base_filename: str, data: dict) -> dict:
 def save_note_json(base_filename: str, payload: dict) -> None:
     _require_filesystem_backend()
     os.makedirs(config.TRANSCRIPTS_DIR, exist_ok=True)
-    with open(note_json_path(base_filename), 'w') as jf:
-        json.dump(payload, jf, ensure_ascii=False)
+    with NOTE_INDEX.write_lock():
+        with open(note_json_path(base_filename), 'w') as jf:
+            json.dump(payload, jf, ensure_ascii=False)
+        NOTE_INDEX.put(base_filename, payload)
 
 
 def ensure_placeholder_note(audio_filename: str, base_payload: Optional[dict] = None) -> dict:
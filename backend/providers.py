@@ -9,12 +9,14 @@ are created lazily inside function bodies rather than at module import time.
 from __future__ import annotations
 
 import io
-from typing import List, Optional, Tuple, Dict
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import logging
 from langchain_core.messages import HumanMessage
 
 import config
+import usage_log as usage
 
 # Initialize module logger early (before any usage)
 logger = logging.getLogger("narrative.providers")
@@ -74,24 +76,152 @@ def key_label_from_index(index: int) -> str:
     return f"gemini_key_{index}_{key[-4:] if key else '????'}"
 
 
+def token_usage(resp: Any) -> Tuple[Optional[int], Optional[int]]:
+    """Return (prompt_tokens, completion_tokens) when the SDK response reports them."""
+    meta = getattr(resp, "usage_metadata", None)
+    if isinstance(meta, dict) and (meta.get("input_tokens") is not None or meta.get("output_tokens") is not None):
+        return meta.get("input_tokens"), meta.get("output_tokens")
+    resp_meta = getattr(resp, "response_metadata", None) or {}
+    if isinstance(resp_meta, dict):
+        openai_usage = resp_meta.get("token_usage")
+        if isinstance(openai_usage, dict):
+            return openai_usage.get("prompt_tokens"), openai_usage.get("completion_tokens")
+        gemini_usage = resp_meta.get("usage_metadata")
+        if isinstance(gemini_usage, dict):
+            return gemini_usage.get("prompt_token_count"), gemini_usage.get("candidates_token_count")
+    return None, None
+
+
+def _message_bytes(messages: Any) -> int:
+    """Approximate request payload size (text plus inline base64 data)."""
+    if isinstance(messages, str):
+        return len(messages.encode("utf-8"))
+    total = 0
+    for msg in messages or []:
+        content = getattr(msg, "content", msg)
+        if isinstance(content, str):
+            total += len(content.encode("utf-8"))
+            continue
+        for part in content or []:
+            if isinstance(part, dict):
+                for field in ("text", "data"):
+                    value = part.get(field)
+                    if isinstance(value, str):
+                        total += len(value)
+            elif isinstance(part, str):
+                total += len(part.encode("utf-8"))
+    return total
+
+
+def _record_call(
+    provider: str,
+    model: str,
+    key_label: str,
+    started: float,
+    ok: bool,
+    resp: Any = None,
+    bytes_sent: Optional[int] = None,
+) -> None:
+    """Log one provider invocation with wall time, attribution and token counts."""
+    try:
+        ctx = usage.current_call_context()
+        prompt_tokens, completion_tokens = token_usage(resp) if ok else (None, None)
+        if ok:
+            status = "fallback" if ctx.get("fallback") else "success"
+        else:
+            status = "error"
+        usage.log_usage(
+            event=str(ctx.get("event") or "llm"),
+            provider=provider,
+            model=model,
+            key_label=key_label,
+            status=status,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            attempt=ctx.get("attempt"),
+            bytes_sent=ctx.get("bytes_sent", bytes_sent),
+            audio_seconds=ctx.get("audio_seconds"),
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+    except Exception:
+        logger.debug("usage logging failed for %s call", provider, exc_info=True)
+
+
 def invoke_google(messages: List[HumanMessage], model: Optional[str] = None) -> Tuple[object, int]:
     """Try Gemini clients in order (no internal retries). Returns (response, key_index).
 
     If `model` is provided, use a transient set of clients for that model.
+    Every key attempt is recorded in the usage log with its latency.
     """
     last_err: Optional[Exception] = None
     # Build or fetch LLM rotation lazily
     llms = _get_google_llms(model)
+    use_model = model or config.GOOGLE_MODEL
+    payload_bytes = _message_bytes(messages)
     for idx, llm in enumerate(llms):
+        started = time.perf_counter()
         try:
             # Disable internal retries by overriding keyword
-            return llm.invoke(messages, max_retries=0), idx
+            resp = llm.invoke(messages, max_retries=0)
         except Exception as e:
+            _record_call("gemini", use_model, key_label_from_index(idx), started, False, bytes_sent=payload_bytes)
             last_err = e
             logger.warning(
                 "Gemini invoke failed on key_index=%s: %s", idx, str(e)
             )
             continue
+        _record_call("gemini", use_model, key_label_from_index(idx), started, True, resp, bytes_sent=payload_bytes)
+        return resp, idx
+    if last_err:
+        raise last_err
+    raise RuntimeError("No Google Gemini API keys configured.")
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed message chunk (Gemini may send a list of parts)."""
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    out = []
+    for part in content or []:
+        if isinstance(part, str):
+            out.append(part)
+        elif isinstance(part, dict) and isinstance(part.get("text"), str):
+            out.append(part["text"])
+    return "".join(out)
+
+
+def stream_google(messages: List[HumanMessage], model: Optional[str] = None) -> Iterator[str]:
+    """Stream Gemini text chunks, rotating keys like `invoke_google`.
+
+    A key that fails before producing any text falls through to the next
+    one; after text has been yielded the error propagates, since the caller
+    already holds partial output.
+    """
+    last_err: Optional[Exception] = None
+    llms = _get_google_llms(model)
+    use_model = model or config.GOOGLE_MODEL
+    payload_bytes = _message_bytes(messages)
+    for idx, llm in enumerate(llms):
+        started = time.perf_counter()
+        aggregate: Any = None
+        produced = False
+        try:
+            for chunk in llm.stream(messages, max_retries=0):
+                aggregate = chunk if aggregate is None else aggregate + chunk
+                text = chunk_text(chunk)
+                if text:
+                    produced = True
+                    yield text
+        except Exception as e:
+            _record_call("gemini", use_model, key_label_from_index(idx), started, False, bytes_sent=payload_bytes)
+            if produced:
+                raise
+            last_err = e
+            logger.warning("Gemini stream failed on key_index=%s: %s", idx, str(e))
+            continue
+        _record_call("gemini", use_model, key_label_from_index(idx), started, True, aggregate, bytes_sent=payload_bytes)
+        return
     if last_err:
         raise last_err
     raise RuntimeError("No Google Gemini API keys configured.")
@@ -108,7 +238,13 @@ def title_with_openai(text: str) -> str:
         "Use the same language as the transcription. Do not include quotes, bullets, markdown, or any extra text. "
         "Output only the title on a single line.\n\n" + text
     )
-    resp = llm.invoke(prompt)
+    started = time.perf_counter()
+    try:
+        resp = llm.invoke(prompt)
+    except Exception:
+        _record_call("openai", config.OPENAI_TITLE_MODEL, usage.OPENAI_LABEL, started, False, bytes_sent=_message_bytes(prompt))
+        raise
+    _record_call("openai", config.OPENAI_TITLE_MODEL, usage.OPENAI_LABEL, started, True, resp, bytes_sent=_message_bytes(prompt))
     raw = str(getattr(resp, "content", resp))
     return normalize_title_output(raw)
 
@@ -120,10 +256,37 @@ def openai_chat(messages: List[HumanMessage], model: Optional[str] = None, tempe
     from langchain_openai import ChatOpenAI  # local import
     use_model = model or config.OPENAI_NARRATIVE_MODEL
     llm = ChatOpenAI(model=use_model, api_key=config.OPENAI_API_KEY, temperature=temperature)
-    resp = llm.invoke(messages)
+    started = time.perf_counter()
+    try:
+        resp = llm.invoke(messages)
+    except Exception:
+        _record_call("openai", use_model, usage.OPENAI_LABEL, started, False, bytes_sent=_message_bytes(messages))
+        raise
+    _record_call("openai", use_model, usage.OPENAI_LABEL, started, True, resp, bytes_sent=_message_bytes(messages))
     return str(getattr(resp, "content", resp))
 
 
+def stream_openai_chat(messages: List[HumanMessage], model: Optional[str] = None, temperature: float = 0.2) -> Iterator[str]:
+    """Streaming counterpart of `openai_chat`; yields text chunks as they arrive."""
+    if not config.OPENAI_API_KEY:
+        raise RuntimeError("OpenAI fallback not configured.")
+    from langchain_openai import ChatOpenAI  # local import
+    use_model = model or config.OPENAI_NARRATIVE_MODEL
+    llm = ChatOpenAI(model=use_model, api_key=config.OPENAI_API_KEY, temperature=temperature)
+    started = time.perf_counter()
+    aggregate: Any = None
+    try:
+        for chunk in llm.stream(messages):
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            text = chunk_text(chunk)
+            if text:
+                yield text
+    except Exception:
+        _record_call("openai", use_model, usage.OPENAI_LABEL, started, False, bytes_sent=_message_bytes(messages))
+        raise
+    _record_call("openai", use_model, usage.OPENAI_LABEL, started, True, aggregate, bytes_sent=_message_bytes(messages))
+
+
 def normalize_title_output(raw: str) -> str:
     """Coerce LLM output into a single, clean title line.
 
@@ -194,9 +357,15 @@ def transcribe_with_openai(audio_bytes: bytes, file_ext: str = "wav") -> str:
     client = OpenAI(api_key=config.OPENAI_API_KEY)
     bio = io.BytesIO(audio_bytes)
     bio.name = f"audio.{file_ext}"
-    resp = client.audio.transcriptions.create(
-        model=config.OPENAI_TRANSCRIBE_MODEL,
-        file=bio,
-        response_format="text",
-    )
+    started = time.perf_counter()
+    try:
+        resp = client.audio.transcriptions.create(
+            model=config.OPENAI_TRANSCRIBE_MODEL,
+            file=bio,
+            response_format="text",
+        )
+    except Exception:
+        _record_call("openai", config.OPENAI_TRANSCRIBE_MODEL, usage.OPENAI_LABEL, started, False, bytes_sent=len(audio_bytes))
+        raise
+    _record_call("openai", config.OPENAI_TRANSCRIBE_MODEL, usage.OPENAI_LABEL, started, True, bytes_sent=len(audio_bytes))
     return resp if isinstance(resp, str) else getattr(resp, "text", "")
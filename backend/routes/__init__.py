@@ -1,4 +1,4 @@
-from . import notes, integrations, models, narratives, programs, folders
+from . import notes, integrations, models, narratives, programs, folders, analytics, jobs, events, media, uploads
 
 __all__ = [
     "notes",
@@ -7,4 +7,9 @@ __all__ = [
     "narratives",
     "programs",
     "folders",
+    "analytics",
+    "jobs",
+    "events",
+    "media",
+    "uploads",
 ]
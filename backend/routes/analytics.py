@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Response
+
+import usage_log as usage
+import usage_rollups
+
+router = APIRouter()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}") from None
+    if parsed.tzinfo is not None:
+        # Usage events are stamped in naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+@router.get("/api/usage")
+async def query_usage(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    bucket: str = "day",
+    group_by: str = "",
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    key: Optional[str] = None,
+    event: Optional[str] = None,
+    status: Optional[str] = None,
+):
+    try:
+        default_start, default_end = usage_rollups.default_window()
+        start_dt = _parse_time(start) or default_start
+        end_dt = _parse_time(end) or default_end
+        dims = [g.strip() for g in (group_by or "").split(",") if g.strip()]
+        rows = usage_rollups.query(
+            usage.USAGE_DIR,
+            start_dt,
+            end_dt,
+            bucket=(bucket or "day").strip().lower(),
+            group_by=dims,
+            filters={
+                "provider": provider,
+                "model": model,
+                "key": key,
+                "event": event,
+                "status": status,
+            },
+        )
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+    return {
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "bucket": bucket,
+        "group_by": dims,
+        "rows": rows,
+    }
+
+
+@router.get("/api/usage/latency")
+async def query_latency(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    group_by: str = "event,provider,model,key",
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    key: Optional[str] = None,
+    event: Optional[str] = None,
+):
+    try:
+        default_start, default_end = usage_rollups.default_window()
+        start_dt = _parse_time(start) or default_start
+        end_dt = _parse_time(end) or default_end
+        dims = [g.strip() for g in (group_by or "").split(",") if g.strip()]
+        rows = usage_rollups.latency(
+            usage.USAGE_DIR,
+            start_dt,
+            end_dt,
+            group_by=dims,
+            filters={"provider": provider, "model": model, "key": key, "event": event},
+        )
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+    return {
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "group_by": dims,
+        "bounds_ms": list(usage_rollups.LATENCY_BOUNDS_MS),
+        "rows": rows,
+    }
+
+
+@router.get("/api/usage/stages")
+async def query_stage_latency(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    group_by: str = "stage",
+    stage: Optional[str] = None,
+):
+    try:
+        default_start, default_end = usage_rollups.default_window()
+        start_dt = _parse_time(start) or default_start
+        end_dt = _parse_time(end) or default_end
+        dims = [g.strip() for g in (group_by or "").split(",") if g.strip()]
+        rows = usage_rollups.stage_latency(usage.USAGE_DIR, start_dt, end_dt, group_by=dims, stage=stage)
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+    return {
+        "start": start_dt.isoformat(),
+        "end": end_dt.isoformat(),
+        "group_by": dims,
+        "bounds_ms": list(usage_rollups.LATENCY_BOUNDS_MS),
+        "rows": rows,
+    }
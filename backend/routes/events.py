@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+import config
+from core.events import NOTE_EVENTS
+
+router = APIRouter()
+
+
+def _format_event(event_id: str, event: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(request: Request, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Yield SSE frames: missed events first, then live ones until the client leaves."""
+    queue, backlog = NOTE_EVENTS.subscribe(last_event_id)
+    heartbeat = float(getattr(config, "EVENTS_HEARTBEAT_SECONDS", 15) or 15)
+    try:
+        yield "retry: 3000\n\n"
+        if backlog is None:
+            yield _format_event(NOTE_EVENTS.last_event_id, "reset", {})
+        for seq, event, data in backlog or ():
+            yield _format_event(NOTE_EVENTS.event_id(seq), event, data)
+        while not await request.is_disconnected():
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is None:
+                yield _format_event(NOTE_EVENTS.last_event_id, "reset", {})
+                continue
+            seq, event, data = item
+            yield _format_event(NOTE_EVENTS.event_id(seq), event, data)
+    finally:
+        NOTE_EVENTS.unsubscribe(queue)
+
+
+@router.get("/api/events")
+async def stream_events(request: Request, last_event_id: Optional[str] = None):
+    """Server-Sent Events for note changes; resumes from `Last-Event-ID`."""
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        event_stream(request, resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,37 +1,53 @@
 from __future__ import annotations
 
-import json
 import logging
-import os
 
 from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
 
-import config
-from core.folders import load_folders_registry, save_folders_registry
-from store.media import delete_audio_file
-from store import get_notes_store
+from core import note_logic
+from core.folders import (
+    add_folder_tombstone,
+    folders_version,
+    load_folder_tombstones,
+    load_folders_registry,
+    remove_folder_tombstone,
+    save_folders_registry,
+)
+from core.http_cache import conditional_json
+from core.jobs import ACTIVE_STATUSES, JOBS
+from store.index import NOTE_INDEX
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-NOTES_STORE = get_notes_store()
 
 
-@router.get("/api/folders")
-async def list_folders():
-    counts: dict[str, int] = {}
+def _folder_listing():
     try:
-        for note in NOTES_STORE.list_notes():
-            folder = (note.get("folder") or "").strip()
-            if folder:
-                counts[folder] = counts.get(folder, 0) + 1
+        counts = NOTE_INDEX.counts("folder")
     except Exception:
-        pass
+        logger.warning("Folder counts unavailable", exc_info=True)
+        counts = {}
+    for name in load_folder_tombstones():
+        counts.pop(name, None)
     registry = load_folders_registry()
     for name in registry:
         counts.setdefault(name, 0)
     return [{"name": k, "count": v} for k, v in sorted(counts.items(), key=lambda kv: kv[0].lower())]
 
 
+@router.get("/api/folders")
+async def list_folders(request: Request):
+    version = folders_version()
+    if version is None:
+        return _folder_listing()
+    try:
+        seq = NOTE_INDEX.seq()
+    except Exception:
+        return _folder_listing()
+    return conditional_json(request, "folders", (seq, version), _folder_listing)
+
+
 @router.post("/api/folders")
 async def create_folder(request: Request):
     try:
@@ -45,47 +61,45 @@ async def create_folder(request: Request):
         if name not in registry:
             registry.append(name)
             save_folders_registry(registry)
+        # Re-creating a folder that is still being deleted keeps new notes safe
+        remove_folder_tombstone(name)
         return {"name": name}
     except Exception as e:
         return {"error": str(e)}
 
 
+def start_folder_delete(name: str, resume: bool = False):
+    """Start (or return the running) background delete for a folder's notes.
+
+    The notes in the folder right now are recorded in its tombstone; a
+    running delete picks up ids added by a repeated request. With `resume`
+    only the ids already recorded are deleted.
+    """
+    if not resume:
+        add_folder_tombstone(name, NOTE_INDEX.members("folder", name))
+    for job in JOBS.list("folder_delete"):
+        if job.params.get("folder") == name and job.status in ACTIVE_STATUSES:
+            return job
+    return JOBS.submit("folder_delete", note_logic.delete_folder_notes, folder=name)
+
+
+def resume_folder_deletes() -> None:
+    """Restart deletes that were interrupted by a shutdown."""
+    for name in load_folder_tombstones():
+        logger.info("Resuming delete of folder %s", name)
+        start_folder_delete(name, resume=True)
+
+
 @router.delete("/api/folders/{name}")
 async def delete_folder(name: str):
+    """Drop the folder now; its notes are deleted by a background job."""
     clean = (name or "").strip()
-    registry = load_folders_registry()
-    deleted_notes = 0
+    if not clean:
+        return Response(status_code=400)
     try:
-        for note in list(NOTES_STORE.list_notes()):
-            folder = (note.get("folder") or "").strip()
-            if folder != clean:
-                continue
-            filename = note.get("filename")
-            file_id = note.get("appwrite_file_id")
-            note_id = os.path.splitext(filename)[0] if filename else None
-            if not note_id:
-                logger.warning("Skipping note without valid filename during folder delete: %s", note)
-                continue
-            if filename:
-                audio_path = os.path.join(config.VOICE_NOTES_DIR, filename)
-                if os.path.exists(audio_path):
-                    try:
-                        os.remove(audio_path)
-                    except OSError as exc:
-                        logger.error("Failed to remove audio file %s: %s", audio_path, exc, exc_info=True)
-            if file_id:
-                try:
-                    delete_audio_file(file_id)
-                except Exception as exc:
-                    logger.error("Failed to delete remote audio %s: %s", file_id, exc, exc_info=True)
-            try:
-                NOTES_STORE.delete_note(note_id)
-            except Exception as exc:
-                logger.error("Failed to delete note %s from store: %s", note_id, exc, exc_info=True)
-                continue
-            deleted_notes += 1
-    except Exception as exc:
-        logger.error("Failed to delete notes in folder %s: %s", clean, exc, exc_info=True)
-    normalized = [n for n in registry if n != clean]
-    save_folders_registry(normalized)
-    return {"deleted": clean, "notes_deleted": deleted_notes}
+        job = start_folder_delete(clean)
+        registry = load_folders_registry()
+        save_folders_registry([n for n in registry if n != clean])
+    except Exception as e:
+        return {"error": str(e)}
+    return JSONResponse(status_code=202, content={"deleted": clean, "job": job.as_dict()})
@@ -1,23 +1,34 @@
 from __future__ import annotations
 
 import asyncio
-import io
 import json
 import logging
 import os
-import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
-import httpx
 from fastapi import APIRouter, BackgroundTasks, File, Form, Request, Response, UploadFile
-from starlette.datastructures import Headers
+from starlette.background import BackgroundTask
 
 import config
 from core import note_logic
+from core.events import COMPLETION_BUS, publish_note_event
+from core.integration_logging import log_event, telegram_update_fields
+from core.telegram import TELEGRAM_BOT, TelegramPoller, TelegramUpdateInbox
+from store import get_notes_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
+NOTES_STORE = get_notes_store()
+
+# How long the Telegram paths wait for a transcription to finish. Only the
+# synchronous ingest endpoint waits inline; webhook/poll updates reply through
+# a follow-up task so the update workers are never held up.
+INLINE_WAIT_SECONDS = 30
+FOLLOWUP_WAIT_SECONDS = 300
+
+# Follow-up tasks are referenced here so they can't be collected mid-flight
+_FOLLOWUPS: set = set()
 
 
 def _parse_tags(value: object) -> list[dict]:
@@ -186,6 +197,46 @@ def _build_feedback(
     return " | ".join(pieces)
 
 
+def _load_note_data(base_name: str) -> Optional[Dict[str, Any]]:
+    try:
+        data, _, _ = NOTES_STORE.load_note(base_name)
+    except Exception:
+        logger.warning("Failed to load note %s", base_name, exc_info=True)
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _save_note_data(base_name: str, note_data: Dict[str, Any]) -> None:
+    try:
+        NOTES_STORE.save_note(base_name, note_data)
+    except Exception:
+        logger.warning("Failed to save note %s", base_name, exc_info=True)
+
+
+async def _finalize_transcribed_note(
+    base_name: str,
+    note_data: Dict[str, Any],
+    title: str,
+    transcription_text: str,
+) -> Optional[str]:
+    """Add the Telegram summary and auto-classification to a transcribed note."""
+    summary = note_data.get("telegram_summary") or note_data.get("summary")
+    updated = False
+    if not summary:
+        summary = await note_logic.summarize_text_snippet(transcription_text)
+        if summary:
+            note_data["telegram_summary"] = summary
+            updated = True
+    classification = note_logic.apply_classification(note_data, title, transcription_text)
+    if classification is not None:
+        updated = True
+    if updated:
+        _save_note_data(base_name, note_data)
+    if classification is not None:
+        publish_note_event("note.classified", base_name, note_data)
+    return summary
+
+
 async def _send_followup_when_ready(
     chat_id: int,
     message_id: Optional[int],
@@ -197,50 +248,18 @@ async def _send_followup_when_ready(
         return
 
     base_name = os.path.splitext(filename)[0]
-    json_path = os.path.join(config.TRANSCRIPTS_DIR, f"{base_name}.json")
-    deadline = time.time() + 300  # wait up to 5 minutes
 
     try:
-        while time.time() < deadline:
-            try:
-                if not os.path.exists(json_path):
-                    await asyncio.sleep(4)
-                    continue
-                with open(json_path, "r") as jf:
-                    note_data = json.load(jf)
-            except Exception:
-                await asyncio.sleep(4)
-                continue
-
+        result = await COMPLETION_BUS.wait(base_name, timeout=FOLLOWUP_WAIT_SECONDS)
+        if result is not None:
+            note_data = dict(result.get("note") or {})
             transcription_text = str(note_data.get("transcription") or "").strip()
-            if transcription_text and transcription_text != "Transcription failed.":
-                title_final = str(note_data.get("title") or "").strip() or os.path.splitext(filename)[0]
-                folder_final = str(note_data.get("folder") or "").strip()
+            if result.get("status") == "complete" and transcription_text:
+                title_final = str(note_data.get("title") or "").strip() or base_name
                 visible_tags = _visible_tag_labels(note_data.get("tags"))
                 if not visible_tags and fallback_tags:
                     visible_tags = _visible_tag_labels(fallback_tags)
-
-                summary = note_data.get("telegram_summary") or note_data.get("summary")
-                updated = False
-                if not summary:
-                    summary = await note_logic.summarize_text_snippet(transcription_text)
-                    if summary:
-                        note_data["telegram_summary"] = summary
-                        updated = True
-
-                classification = note_logic.apply_classification(
-                    note_data, title_final, transcription_text
-                )
-                if classification is not None:
-                    updated = True
-
-                if updated:
-                    try:
-                        with open(json_path, "w") as jf:
-                            json.dump(note_data, jf, ensure_ascii=False)
-                    except Exception:
-                        pass
-
+                await _finalize_transcribed_note(base_name, note_data, title_final, transcription_text)
                 status_message = _build_status_message(
                     note_data,
                     filename,
@@ -251,15 +270,12 @@ async def _send_followup_when_ready(
                 await _telegram_send_message(chat_id, status_message, reply_to=message_id)
                 return
 
-            if transcription_text == "Transcription failed.":
-                await _telegram_send_message(
-                    chat_id,
-                    "Transcription failed for that note — you can retry from the app or send it again.",
-                    reply_to=message_id,
-                )
-                return
-
-            await asyncio.sleep(5)
+            await _telegram_send_message(
+                chat_id,
+                "Transcription failed for that note — you can retry from the app or send it again.",
+                reply_to=message_id,
+            )
+            return
     except Exception:
         logger.exception("Error sending Telegram follow-up for filename=%s", filename)
         await _telegram_send_message(
@@ -293,29 +309,56 @@ async def _handle_audio_note(
         )
     except RuntimeError as exc:
         return {"error": f"Upload failed: {exc}"}
+    return await _finish_audio_note(upload_result, folder_value, tags)
+
+
+async def _handle_downloaded_audio(
+    source_path: str,
+    original_name: str,
+    content_type: str,
+    background_tasks: BackgroundTasks,
+    folder_value: str,
+    tags: list[dict],
+    date_value: str | None = None,
+    sha256: Optional[str] = None,
+    size_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    try:
+        upload_result = await note_logic.process_audio_path(
+            source_path,
+            background_tasks,
+            original_name=original_name,
+            content_type=content_type,
+            date=date_value or None,
+            place=None,
+            folder=folder_value or None,
+            sha256=sha256,
+            size_bytes=size_bytes,
+        )
+    except RuntimeError as exc:
+        return {"error": f"Upload failed: {exc}"}
+    finally:
+        # Only left behind when processing failed
+        note_logic.discard_file(source_path)
+    return await _finish_audio_note(upload_result, folder_value, tags, wait_seconds=0)
+
+
+async def _finish_audio_note(
+    upload_result: Any,
+    folder_value: str,
+    tags: list[dict],
+    wait_seconds: float = INLINE_WAIT_SECONDS,
+) -> Dict[str, Any]:
     filename = upload_result.get("filename") if isinstance(upload_result, dict) else None
     if not filename:
         return {"error": "Upload failed"}
 
     base_name = os.path.splitext(filename)[0]
-    json_path = os.path.join(config.TRANSCRIPTS_DIR, f"{base_name}.json")
-    note_data: Dict[str, Any]
-    try:
-        if os.path.exists(json_path):
-            with open(json_path, "r") as jf:
-                note_data = json.load(jf)
-        else:
-            note_data = {
-                "filename": filename,
-                "title": os.path.splitext(filename)[0],
-                "transcription": "",
-            }
-    except Exception:
-        note_data = {
-            "filename": filename,
-            "title": os.path.splitext(filename)[0],
-            "transcription": "",
-        }
+    note_data = _load_note_data(base_name) or {
+        "filename": filename,
+        "title": base_name,
+        "transcription": "",
+    }
 
     if folder_value:
         note_data["folder"] = folder_value
@@ -323,55 +366,28 @@ async def _handle_audio_note(
         note_data["tags"] = tags
     else:
         note_data.setdefault("tags", [{"label": "telegram"}])
-    try:
-        with open(json_path, "w") as jf:
-            json.dump(note_data, jf, ensure_ascii=False)
-    except Exception:
-        pass
+    _save_note_data(base_name, note_data)
+    publish_note_event("note.updated", base_name, note_data)
 
     summary = None
     transcription_status = "pending"
-    title_final = note_data.get("title") or os.path.splitext(filename)[0]
+    transcription_text = str(note_data.get("transcription") or "").strip()
+    if not transcription_text and wait_seconds > 0:
+        result = await COMPLETION_BUS.wait(base_name, timeout=wait_seconds)
+        if result is not None:
+            note_data = dict(result.get("note") or note_data)
+            transcription_text = str(note_data.get("transcription") or "").strip()
+            if result.get("status") == "failed":
+                transcription_status = "failed"
+    title_final = str(note_data.get("title") or "").strip() or base_name
     created_at = note_data.get("created_at")
     created_ts = note_data.get("created_ts")
-    deadline = time.time() + 30
-
-    while True:
-        try:
-            if os.path.exists(json_path):
-                with open(json_path, "r") as jf:
-                    note_data = json.load(jf)
-        except Exception:
-            continue
-        transcription_text = str(note_data.get("transcription") or "").strip()
-        title_candidate = str(note_data.get("title") or "").strip()
-        if title_candidate:
-            title_final = title_candidate
-        created_at = note_data.get("created_at", created_at)
-        created_ts = note_data.get("created_ts", created_ts)
-        if transcription_text and transcription_text != "Transcription failed.":
-            summary = await note_logic.summarize_text_snippet(transcription_text)
-            updated = False
-            if summary:
-                note_data["telegram_summary"] = summary
-                updated = True
-            classification = note_logic.apply_classification(note_data, title_final, transcription_text)
-            if classification is not None:
-                updated = True
-            if updated:
-                try:
-                    with open(json_path, "w") as jf:
-                        json.dump(note_data, jf, ensure_ascii=False)
-                except Exception:
-                    pass
-            transcription_status = "complete"
-            break
+    if transcription_status != "failed":
         if transcription_text == "Transcription failed.":
             transcription_status = "failed"
-            break
-        if time.time() >= deadline:
-            break
-        await asyncio.sleep(3)
+        elif transcription_text:
+            summary = await _finalize_transcribed_note(base_name, note_data, title_final, transcription_text)
+            transcription_status = "complete"
 
     summary = note_data.get("telegram_summary") or summary
     folder_final = folder_value or str(note_data.get("folder") or "").strip()
@@ -463,109 +479,50 @@ async def _handle_text_note(
     return response
 
 
-def _telegram_bot_base() -> str:
-    token = config.TELEGRAM_BOT_TOKEN
-    if not token:
-        raise RuntimeError("Telegram bot token is not configured")
-    return f"https://api.telegram.org/bot{token}"
-
-
-def _telegram_file_base() -> str:
-    token = config.TELEGRAM_BOT_TOKEN
-    if not token:
-        raise RuntimeError("Telegram bot token is not configured")
-    return f"https://api.telegram.org/file/bot{token}"
-
-
 async def _telegram_send_message(
     chat_id: int,
     text: str,
     reply_to: Optional[int] = None,
 ) -> None:
-    if not text:
-        return
-    try:
-        base = _telegram_bot_base()
-    except RuntimeError as exc:
-        logger.warning("telegram send skipped: %s", exc)
-        return
-    payload: Dict[str, Any] = {
-        "chat_id": chat_id,
-        "text": text,
-    }
-    if reply_to is not None:
-        payload["reply_to_message_id"] = reply_to
-        payload["allow_sending_without_reply"] = True
-    try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            resp = await client.post(f"{base}/sendMessage", json=payload)
-            if resp.status_code >= 400:
-                logger.warning(
-                    "telegram send failed status=%s body=%s",
-                    resp.status_code,
-                    resp.text[:256],
-                )
-    except Exception:
-        logger.exception("Error sending Telegram message")
-
-
-async def _telegram_download_file(file_id: str) -> Tuple[bytes, str]:
-    base = _telegram_bot_base()
-    file_base = _telegram_file_base()
-    async with httpx.AsyncClient(timeout=30) as client:
-        meta_resp = await client.get(f"{base}/getFile", params={"file_id": file_id})
-        meta_resp.raise_for_status()
-        meta_data = meta_resp.json()
-        if not meta_data.get("ok"):
-            raise RuntimeError(f"telegram getFile failed: {meta_data}")
-        result = meta_data.get("result") or {}
-        file_path = result.get("file_path")
-        if not file_path:
-            raise RuntimeError("telegram getFile missing file_path")
-        download_resp = await client.get(f"{file_base}/{file_path}")
-        download_resp.raise_for_status()
-        return download_resp.content, os.path.basename(file_path)
+    # Queued; delivery is paced and retried by the shared bot client
+    TELEGRAM_BOT.enqueue_message(chat_id, text, reply_to=reply_to)
 
 
-@router.post("/api/integrations/telegram/webhook")
-async def telegram_webhook(
-    request: Request,
-    background_tasks: BackgroundTasks,
-):
-    if not config.TELEGRAM_BOT_TOKEN:
-        logger.warning("Telegram webhook received but TELEGRAM_BOT_TOKEN is not configured")
-        return Response(status_code=503, content="Telegram bot not configured")
+async def _telegram_download_file(file_id: str) -> Tuple[str, str, str, int]:
+    # Streams into the voice-notes staging dir; process_audio_path consumes it on success
+    return await TELEGRAM_BOT.download_to_file(file_id, note_logic.incoming_dir())
 
-    secret = config.TELEGRAM_WEBHOOK_SECRET
-    header_secret = request.headers.get("x-telegram-bot-api-secret-token")
-    if secret and header_secret != secret:
-        logger.warning(
-            "Telegram webhook secret mismatch; header_present=%s",
-            bool(header_secret),
-        )
-        return Response(status_code=401)
 
-    try:
-        update = await request.json()
-    except Exception:
-        return Response(status_code=400)
-    else:
-        try:
-            logger.info(
-                "[telegram-webhook] update=%s",
-                json.dumps(update, ensure_ascii=False)[:4000],
-            )
-        except Exception:
-            logger.info("[telegram-webhook] received update (unable to serialize)")
+class _ScheduledTasks(BackgroundTasks):
+    """BackgroundTasks that start as soon as they are added.
+
+    Webhook updates are processed after the HTTP response has been sent, so
+    there is no response to attach background work to; transcription starts
+    right away and the inline completion wait can observe it.
+    """
 
+    def __init__(self) -> None:
+        super().__init__()
+        self.running: set[asyncio.Task] = set()
+
+    def add_task(self, func, *args, **kwargs) -> None:
+        task = BackgroundTask(func, *args, **kwargs)
+        self.tasks.append(task)
+        running = asyncio.get_running_loop().create_task(task())
+        self.running.add(running)
+        running.add_done_callback(self.running.discard)
+
+
+async def _process_update(update: Dict[str, Any]) -> None:
+    background_tasks = _ScheduledTasks()
     message = (update.get("message") or update.get("edited_message") or {})
     if not message:
-        return {"ok": True}
+        return
 
     chat = message.get("chat") or {}
     chat_id = chat.get("id")
     if chat_id is None:
-        return {"ok": True}
+        return
 
     message_id = message.get("message_id")
     text = str(message.get("text") or "").strip()
@@ -581,7 +538,7 @@ async def telegram_webhook(
             ),
             reply_to=message_id,
         )
-        return {"ok": True}
+        return
 
     folder_value = ""
     date_value = ""
@@ -593,13 +550,10 @@ async def telegram_webhook(
             media_key_used = key
             break
 
-    logger.info(
-        "[telegram-webhook] chat_id=%s message_id=%s payload=%s media_key=%s has_document=%s",
-        chat_id,
-        message_id,
-        payload_kind,
-        media_key_used,
-        bool(message.get("document")),
+    log_event(
+        logger,
+        "telegram-webhook",
+        {**telegram_update_fields(update), "payload": payload_kind, "stage": "processing"},
     )
 
     try:
@@ -625,7 +579,7 @@ async def telegram_webhook(
                     text="I can only process text messages or voice/audio notes right now.",
                     reply_to=message_id,
                 )
-                return {"ok": True}
+                return
             file_id = file_info.get("file_id")
             if not file_id:
                 await _telegram_send_message(
@@ -633,10 +587,10 @@ async def telegram_webhook(
                     text="I couldn't find the audio file to download.",
                     reply_to=message_id,
                 )
-                return {"ok": True}
+                return
 
             try:
-                file_bytes, downloaded_name = await _telegram_download_file(file_id)
+                source_path, downloaded_name, sha256, size_bytes = await _telegram_download_file(file_id)
             except Exception as exc:
                 logger.exception("Error downloading Telegram file")
                 await _telegram_send_message(
@@ -644,39 +598,37 @@ async def telegram_webhook(
                     text="Downloading the audio from Telegram failed. Please try again.",
                     reply_to=message_id,
                 )
-                return {"ok": True}
+                return
 
             filename = file_info.get("file_name") or downloaded_name or f"{file_id}.ogg"
             mime_type = file_info.get("mime_type") or "application/octet-stream"
-            buffer = io.BytesIO(file_bytes)
-            buffer.seek(0)
-            headers = Headers({"content-type": mime_type}) if mime_type else None
-            upload = UploadFile(file=buffer, filename=filename, headers=headers)
             logger.info(
-                "[telegram-webhook] downloading media chat_id=%s message_id=%s filename=%s mime=%s size_bytes=%s",
+                "[telegram-webhook] downloaded media chat_id=%s message_id=%s filename=%s mime=%s size_bytes=%s sha256=%s",
                 chat_id,
                 message_id,
                 filename,
                 mime_type,
-                len(file_bytes),
+                size_bytes,
+                sha256,
+            )
+            result = await _handle_downloaded_audio(
+                source_path,
+                filename,
+                mime_type,
+                background_tasks=background_tasks,
+                folder_value=folder_value,
+                tags=tags,
+                date_value=date_value or None,
+                sha256=sha256,
+                size_bytes=size_bytes,
             )
-            try:
-                result = await _handle_audio_note(
-                    file=upload,
-                    background_tasks=background_tasks,
-                    folder_value=folder_value,
-                    tags=tags,
-                    date_value=date_value or None,
-                )
-            finally:
-                await upload.close()
         if result.get("error"):
             await _telegram_send_message(
                 chat_id,
                 text=f"That didn’t work: {result['error']}",
                 reply_to=message_id,
             )
-            return {"ok": True}
+            return
 
         logger.info(
             "[telegram-webhook] processed chat_id=%s message_id=%s filename=%s input_type=%s transcription_status=%s",
@@ -689,7 +641,7 @@ async def telegram_webhook(
 
         transcription_status = result.get("transcription_status") or "complete"
         if transcription_status == "pending":
-            asyncio.create_task(
+            followup = asyncio.create_task(
                 _send_followup_when_ready(
                     chat_id,
                     message_id,
@@ -697,6 +649,8 @@ async def telegram_webhook(
                     tags if isinstance(tags, list) else None,
                 )
             )
+            _FOLLOWUPS.add(followup)
+            followup.add_done_callback(_FOLLOWUPS.discard)
         else:
             status = result.get("status")
             if status:
@@ -712,6 +666,46 @@ async def telegram_webhook(
             text="Something broke while saving that note. I’ll keep an eye on it.",
             reply_to=message_id,
         )
+
+
+TELEGRAM_UPDATES = TelegramUpdateInbox(_process_update)
+TELEGRAM_POLLER = TelegramPoller(TELEGRAM_BOT, TELEGRAM_UPDATES)
+
+
+@router.post("/api/integrations/telegram/webhook")
+async def telegram_webhook(request: Request):
+    if not config.TELEGRAM_BOT_TOKEN:
+        logger.warning("Telegram webhook received but TELEGRAM_BOT_TOKEN is not configured")
+        return Response(status_code=503, content="Telegram bot not configured")
+
+    secret = config.TELEGRAM_WEBHOOK_SECRET
+    header_secret = request.headers.get("x-telegram-bot-api-secret-token")
+    if secret and header_secret != secret:
+        logger.warning(
+            "Telegram webhook secret mismatch; header_present=%s",
+            bool(header_secret),
+        )
+        return Response(status_code=401)
+
+    try:
+        update = await request.json()
+    except Exception:
+        return Response(status_code=400)
+    if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+        return Response(status_code=400)
+
+    try:
+        accepted = TELEGRAM_UPDATES.submit(update)
+    except Exception:
+        # Not persisted: let Telegram redeliver it later
+        logger.exception("Failed to persist Telegram update %s", update.get("update_id"))
+        return Response(status_code=500)
+    log_event(
+        logger,
+        "telegram-webhook",
+        {**telegram_update_fields(update), "stage": "queued" if accepted else "duplicate"},
+        payload=update,
+    )
     return {"ok": True}
 
 
@@ -739,29 +733,25 @@ async def ingest_telegram_message(
         if not provided_token or provided_token != shared_token:
             return Response(status_code=401)
 
+    json_body = True
     try:
         body = await request.json()
     except Exception:
         body = {}
-        logger.info(
-            "[telegram-ingest] non-JSON body received; query=%s has_file=%s",
-            dict(request.query_params),
-            file is not None,
-        )
-    else:
-        try:
-            logger.info(
-                "[telegram-ingest] json body=%s query=%s has_file=%s",
-                json.dumps(body, ensure_ascii=False)[:4000],
-                dict(request.query_params),
-                file is not None,
-            )
-        except Exception:
-            logger.info(
-                "[telegram-ingest] received request (unable to serialize body); query=%s has_file=%s",
-                dict(request.query_params),
-                file is not None,
-            )
+        json_body = False
+    log_event(
+        logger,
+        "telegram-ingest",
+        {
+            "json": json_body,
+            "fields": ",".join(sorted(body)) if isinstance(body, dict) and body else None,
+            "query": ",".join(sorted(request.query_params.keys())) or None,
+            "file": file.filename if file is not None else None,
+            "size": file.size if file is not None else None,
+            "mime": file.content_type if file is not None else None,
+        },
+        payload=body or None,
+    )
 
     query_params = request.query_params
     title_value = (
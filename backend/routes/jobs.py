@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Response
+
+from core.jobs import JOBS
+
+router = APIRouter()
+
+
+@router.get("/api/jobs")
+async def list_jobs(kind: Optional[str] = None):
+    return [job.as_dict() for job in JOBS.list(kind)]
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return Response(status_code=404, content="Job not found")
+    return job.as_dict()
+
+
+@router.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        return Response(status_code=404, content="Job not found")
+    job.cancel()
+    return job.as_dict()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import stat
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+import config
+from core.http_cache import etag_matches
+from store import get_notes_store
+from store.media import is_appwrite_storage_enabled, lookup_cached_audio, open_audio_stream, prefetch_audio
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+NOTES_STORE = get_notes_store()
+
+# Audio filenames are unique per upload and never rewritten
+AUDIO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Headers of an Appwrite download passed through to the client
+PROXY_HEADERS = ("content-length", "content-range", "accept-ranges")
+
+# filename -> (Appwrite file id, upload sha256)
+_FILE_IDS: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+_FILE_IDS_MAX = 4096
+
+
+def _audio_mime(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    return {
+        "m4a": "audio/mp4",
+        "mp3": "audio/mpeg",
+        "wav": "audio/wav",
+        "ogg": "audio/ogg",
+        "webm": "audio/webm",
+    }.get(ext, f"audio/{ext}" if ext else "application/octet-stream")
+
+
+def _local_etag(filename: str, st: os.stat_result) -> str:
+    digest = hashlib.sha1(f"{filename}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def _appwrite_file_id(filename: str) -> Optional[Tuple[str, Optional[str]]]:
+    known = _FILE_IDS.get(filename)
+    if known:
+        _FILE_IDS.move_to_end(filename)
+        return known
+    try:
+        data, _, _ = NOTES_STORE.load_note(os.path.splitext(filename)[0])
+    except Exception:
+        logger.warning("Failed to look up audio %s", filename, exc_info=True)
+        return None
+    file_id = (data or {}).get("appwrite_file_id")
+    if not file_id:
+        return None
+    known = (file_id, (data or {}).get("upload_sha256"))
+    _FILE_IDS[filename] = known
+    while len(_FILE_IDS) > _FILE_IDS_MAX:
+        _FILE_IDS.popitem(last=False)
+    return known
+
+
+def forget_audio(filename: str) -> None:
+    _FILE_IDS.pop(filename, None)
+
+
+@router.api_route("/voice_notes/{filename}", methods=["GET", "HEAD"])
+async def serve_audio(request: Request, filename: str):
+    """Audio with Range/206 support and immutable caching.
+
+    Local files go through `FileResponse`, which handles Range/If-Range and
+    hands the path to the server for zero-copy sends where supported. Notes
+    whose audio only lives in Appwrite are served from the local audio cache
+    when present. Otherwise they are proxied with the Range forwarded, so
+    seeking only fetches the requested bytes, while the cache is filled in
+    the background for the next request.
+    """
+    if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+        return Response(status_code=404)
+    path = os.path.join(config.VOICE_NOTES_DIR, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        st = None
+    if st is not None and stat.S_ISREG(st.st_mode):
+        etag = _local_etag(filename, st)
+        headers = {"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=_audio_mime(filename), headers=headers, stat_result=st)
+
+    if not is_appwrite_storage_enabled():
+        return Response(status_code=404)
+    known = await asyncio.to_thread(_appwrite_file_id, filename)
+    if not known:
+        return Response(status_code=404)
+    file_id, sha256 = known
+    # Appwrite file ids are unique per upload, so they make a strong validator
+    etag = f'"aw-{file_id}"'
+    headers = {"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    cached = await asyncio.to_thread(lookup_cached_audio, file_id, sha256)
+    if cached:
+        return FileResponse(cached, media_type=_audio_mime(filename), headers=headers)
+    prefetch_audio(file_id, sha256)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag:
+        range_header = None
+    try:
+        upstream, close = await open_audio_stream(file_id, range_header)
+    except Exception:
+        logger.warning("Failed to open Appwrite audio %s", file_id, exc_info=True)
+        return Response(status_code=502)
+    if upstream.status_code not in (200, 206):
+        await close()
+        if upstream.status_code == 404:
+            forget_audio(filename)
+        if upstream.status_code == 416:
+            return Response(status_code=416, headers={"Content-Range": upstream.headers.get("content-range", "")})
+        return Response(status_code=404 if upstream.status_code == 404 else 502)
+    for name in PROXY_HEADERS:
+        if name in upstream.headers:
+            headers[name] = upstream.headers[name]
+    headers.setdefault("accept-ranges", "bytes")
+    return StreamingResponse(
+        upstream.aiter_raw(),
+        status_code=upstream.status_code,
+        media_type=_audio_mime(filename),
+        headers=headers,
+        background=BackgroundTask(close),
+    )
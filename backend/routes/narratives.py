@@ -4,14 +4,16 @@ import json
 import os
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
-from fastapi import APIRouter, Request, Response
+from fastapi import APIRouter, BackgroundTasks, Request, Response
+from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage
 
 import config
 import providers
 import usage_log as usage
+from core.http_cache import conditional_json, dir_stamp
 from core.note_logic import summarize_text_snippet, apply_classification
 
 router = APIRouter()
@@ -65,6 +67,49 @@ async def list_narratives():
     return [f for f in sorted(os.listdir(NARRATIVES_DIR)) if f.endswith(".txt")]
 
 
+# Declared before /api/narratives/{filename}, which would otherwise match them
+@router.get("/api/narratives/list")
+async def list_narratives_meta(request: Request):
+    os.makedirs(NARRATIVES_DIR, exist_ok=True)
+    stamps = (dir_stamp(NARRATIVES_DIR, (".txt",)), dir_stamp(NARRATIVE_META_DIR, (".json",)))
+    return conditional_json(
+        request,
+        "narratives-list",
+        (NARRATIVES_DIR, stamps),
+        _narrative_listing,
+        last_modified=max(max(stamp[0], stamp[2]) for stamp in stamps) / 1e9,
+    )
+
+
+def _narrative_listing() -> List[Dict[str, Any]]:
+    files = [f for f in sorted(os.listdir(NARRATIVES_DIR)) if f.endswith(".txt")]
+    out = []
+    for fn in files:
+        meta = _read_narrative_meta(fn)
+        out.append({
+            "filename": fn,
+            "title": meta.get("title"),
+            "folder": (meta.get("folder") or "").strip(),
+        })
+    return out
+
+
+@router.get("/api/narratives/folders")
+async def list_narrative_folders():
+    os.makedirs(NARRATIVES_DIR, exist_ok=True)
+    files = [f for f in sorted(os.listdir(NARRATIVES_DIR)) if f.endswith(".txt")]
+    counts: Dict[str, int] = {}
+    for fn in files:
+        try:
+            meta = _read_narrative_meta(fn)
+            folder = (meta.get("folder") or "").strip()
+            if folder:
+                counts[folder] = counts.get(folder, 0) + 1
+        except Exception:
+            continue
+    return [{"name": k, "count": v} for k, v in sorted(counts.items(), key=lambda kv: kv[0].lower())]
+
+
 @router.get("/api/narratives/{filename}")
 async def get_narrative(filename: str):
     path = os.path.join(NARRATIVES_DIR, filename)
@@ -136,13 +181,15 @@ async def create_narrative_from_notes(request: Request):
                         "Do not include quotes, bullets, markdown, or extra text. Output only the title on one line.\n\n"
                         + content[:4000]
                     )}])
-                    resp, _ = await asyncio.to_thread(providers.invoke_google, [msg])
+                    with usage.call_context(event="narrative_title"):
+                        resp, _ = await asyncio.to_thread(providers.invoke_google, [msg])
                     title_llm = providers.normalize_title_output(getattr(resp, "content", ""))
                     if title_llm:
                         title = title_llm
                 except Exception:
                     try:
-                        title = providers.title_with_openai(content[:4000]) or title
+                        with usage.call_context(event="narrative_title", fallback=True):
+                            title = providers.title_with_openai(content[:4000]) or title
                     except Exception:
                         pass
             if not title:
@@ -156,72 +203,104 @@ async def create_narrative_from_notes(request: Request):
         return {"error": str(e)}
 
 
+def _generation_prompt(body: dict) -> str:
+    """Build the narrative prompt from the request; ValueError when there is nothing to use."""
+    items = (body or {}).get("items", [])
+    extra_text = (body or {}).get("extra_text", "")
+    system = (body or {}).get("system")
+
+    if not isinstance(items, list) or not items:
+        raise ValueError("Missing items")
+
+    sources: List[Dict[str, Any]] = []
+    for obj in items:
+        fn = str((obj or {}).get("filename") or "").strip()
+        if not fn:
+            continue
+        base = os.path.splitext(fn)[0]
+        data = _load_transcription(base)
+        if not data:
+            continue
+        transcription = data.get("transcription") or ""
+        title = data.get("title") or base
+        sources.append({
+            "type": "note",
+            "filename": fn,
+            "title": title,
+            "transcription": transcription,
+            "language": data.get("language"),
+        })
+
+    if not sources:
+        raise ValueError("No valid notes to generate from")
+
+    parts = ["You are an expert editor. Synthesize a cohesive, structured narrative from the provided notes and context. Focus on clarity, key insights, and concrete action items. Keep it concise and readable.\n\n"]
+    parts.append("Context Notes:\n")
+    dbg_sources: List[Dict[str, Any]] = []
+    for idx, src in enumerate(sources, start=1):
+        title = src.get("title") or src.get("filename")
+        transcription = src.get("transcription") or ""
+        date = (src.get("date") or "").strip()
+        header = f"[{idx}] {date} — {title}" if date else f"[{idx}] {title}"
+        parts.append(f"{header}\n{transcription}\n\n")
+        dbg_sources.append({
+            "kind": "note",
+            "filename": src.get("filename"),
+            "title": title,
+            "date": date,
+            "text_len": len(transcription),
+            "text_preview": transcription[:40],
+        })
+
+    if extra_text:
+        parts.append("\nAdditional Context:\n" + extra_text + "\n")
+    if system:
+        parts.append("\nSystem Instructions:\n" + system + "\n")
+    parts.append("\nWrite the narrative now.")
+    prompt_text = "\n".join(parts)
+
+    try:
+        logging.info("[gen] items=%s sources=%s", len(items), json.dumps(dbg_sources)[:2000])
+        logging.info("[gen] prompt_head=%s", (prompt_text[:800] + ('…' if len(prompt_text) > 800 else '')))
+    except Exception:
+        pass
+    return prompt_text
+
+
+def _generation_options(body: dict) -> tuple[str, Optional[str], float]:
+    provider_choice = ((body or {}).get("provider") or "auto").lower()
+    model_override = (body or {}).get("model")
+    temperature = float((body or {}).get("temperature") or 0.2)
+    return provider_choice, model_override, temperature
+
+
+def _new_narrative_path() -> tuple[str, str]:
+    if not os.path.exists(NARRATIVES_DIR):
+        os.makedirs(NARRATIVES_DIR)
+    name = f"narrative-{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    return name, os.path.join(NARRATIVES_DIR, name)
+
+
+async def _finish_narrative(name: str, content: str) -> None:
+    """Summary and classification for a saved narrative; runs after the response."""
+    try:
+        summary = await summarize_text_snippet(content)
+        meta = {"title": None, "summary": summary}
+        apply_classification(meta, meta.get("title"), content)
+        _write_narrative_meta(name, meta)
+    except Exception:
+        logging.warning("Failed to summarize narrative %s", name, exc_info=True)
+
+
 @router.post("/api/narratives/generate")
-async def generate_narrative(request: Request):
+async def generate_narrative(request: Request, background_tasks: BackgroundTasks):
     try:
         body = await request.json()
-        items = (body or {}).get("items", [])
-        extra_text = (body or {}).get("extra_text", "")
-        provider_choice = ((body or {}).get("provider") or "auto").lower()
-        model_override = (body or {}).get("model")
-        temperature = float((body or {}).get("temperature") or 0.2)
-        system = (body or {}).get("system")
-
-        if not isinstance(items, list) or not items:
-            return Response(status_code=400, content="Missing items")
-
-        sources: List[Dict[str, Any]] = []
-        for obj in items:
-            fn = str((obj or {}).get("filename") or "").strip()
-            if not fn:
-                continue
-            base = os.path.splitext(fn)[0]
-            data = _load_transcription(base)
-            if not data:
-                continue
-            transcription = data.get("transcription") or ""
-            title = data.get("title") or base
-            sources.append({
-                "type": "note",
-                "filename": fn,
-                "title": title,
-                "transcription": transcription,
-                "language": data.get("language"),
-            })
-
-        if not sources:
-            return Response(status_code=400, content="No valid notes to generate from")
-
-        parts = ["You are an expert editor. Synthesize a cohesive, structured narrative from the provided notes and context. Focus on clarity, key insights, and concrete action items. Keep it concise and readable.\n\n"]
-        parts.append("Context Notes:\n")
-        dbg_sources: List[Dict[str, Any]] = []
-        for idx, src in enumerate(sources, start=1):
-            title = src.get("title") or src.get("filename")
-            transcription = src.get("transcription") or ""
-            date = (src.get("date") or "").strip()
-            header = f"[{idx}] {date} — {title}" if date else f"[{idx}] {title}"
-            parts.append(f"{header}\n{transcription}\n\n")
-            dbg_sources.append({
-                "kind": "note",
-                "filename": src.get("filename"),
-                "title": title,
-                "date": date,
-                "text_len": len(transcription),
-                "text_preview": transcription[:40],
-            })
-
-        if extra_text:
-            parts.append("\nAdditional Context:\n" + extra_text + "\n")
-        if system:
-            parts.append("\nSystem Instructions:\n" + system + "\n")
-        parts.append("\nWrite the narrative now.")
-        prompt_text = "\n".join(parts)
-
         try:
-            logging.info("[gen] items=%s sources=%s", len(items), json.dumps(dbg_sources)[:2000])
-            logging.info("[gen] prompt_head=%s", (prompt_text[:800] + ('…' if len(prompt_text) > 800 else '')))
-        except Exception:
-            pass
+            prompt_text = _generation_prompt(body)
+        except ValueError as exc:
+            return Response(status_code=400, content=str(exc))
+        provider_choice, model_override, temperature = _generation_options(body)
 
         provider_used = provider_choice
         model_used = model_override or (config.GOOGLE_MODEL if provider_choice != "openai" else config.OPENAI_NARRATIVE_MODEL)
@@ -231,11 +310,12 @@ async def generate_narrative(request: Request):
         if provider_choice in ("auto", "gemini"):
             try:
                 message = HumanMessage(content=[{"type": "text", "text": prompt_text}])
-                resp, key_index = await asyncio.to_thread(
-                    providers.invoke_google,
-                    [message],
-                    model_override if provider_choice == "gemini" and model_override else None,
-                )
+                with usage.call_context(event="narrative"):
+                    resp, key_index = await asyncio.to_thread(
+                        providers.invoke_google,
+                        [message],
+                        model_override if provider_choice == "gemini" and model_override else None,
+                    )
                 content = str(getattr(resp, "content", resp))
                 provider_used = "gemini"
                 model_used = model_override or config.GOOGLE_MODEL
@@ -244,46 +324,128 @@ async def generate_narrative(request: Request):
                     raise
                 provider_used = "openai"
                 model_used = model_override or config.OPENAI_NARRATIVE_MODEL
-                content = providers.openai_chat([HumanMessage(content=prompt_text)], model=model_override, temperature=temperature)
+                with usage.call_context(event="narrative", fallback=True):
+                    content = providers.openai_chat([HumanMessage(content=prompt_text)], model=model_override, temperature=temperature)
         else:
             provider_used = "openai"
             model_used = model_override or config.OPENAI_NARRATIVE_MODEL
-            content = providers.openai_chat([HumanMessage(content=prompt_text)], model=model_override, temperature=temperature)
+            with usage.call_context(event="narrative"):
+                content = providers.openai_chat([HumanMessage(content=prompt_text)], model=model_override, temperature=temperature)
 
-        if not os.path.exists(NARRATIVES_DIR):
-            os.makedirs(NARRATIVES_DIR)
-        name = f"narrative-{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        out = os.path.join(NARRATIVES_DIR, name)
+        name, out = _new_narrative_path()
         with open(out, "w") as f:
             f.write(content or "")
 
-        transcription = content or ""
-        summary = await summarize_text_snippet(transcription)
-        meta = {"title": None, "summary": summary}
-        apply_classification(meta, meta.get("title"), transcription)
+        background_tasks.add_task(_finish_narrative, name, content or "")
+        return {"filename": name}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# Generations outlive their stream: a client that disconnects still gets a saved narrative
+_GENERATIONS: set = set()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_to_file(
+    path: str,
+    prompt_text: str,
+    provider_choice: str,
+    model_override: Optional[str],
+    temperature: float,
+    on_text: Callable[[str], None],
+) -> tuple[str, str, str]:
+    """Write provider chunks to `path` as they arrive; returns (content, provider, model).
+
+    Gemini falls back to OpenAI in "auto" mode only if it fails before
+    producing any text.
+    """
+    parts: List[str] = []
+    with open(path, "w") as out:
+        def consume(chunks) -> None:
+            for text in chunks:
+                parts.append(text)
+                out.write(text)
+                out.flush()
+                on_text(text)
+
+        if provider_choice in ("auto", "gemini"):
+            message = HumanMessage(content=[{"type": "text", "text": prompt_text}])
+            try:
+                with usage.call_context(event="narrative"):
+                    consume(providers.stream_google(
+                        [message],
+                        model_override if provider_choice == "gemini" and model_override else None,
+                    ))
+                return "".join(parts), "gemini", model_override or config.GOOGLE_MODEL
+            except Exception:
+                if provider_choice == "gemini" or parts:
+                    raise
+        with usage.call_context(event="narrative", fallback=provider_choice != "openai"):
+            consume(providers.stream_openai_chat([HumanMessage(content=prompt_text)], model=model_override, temperature=temperature))
+        return "".join(parts), "openai", model_override or config.OPENAI_NARRATIVE_MODEL
+
+
+async def _run_generation(name: str, path: str, prompt_text: str, options: tuple, queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+
+    def on_text(text: str) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, ("token", {"text": text}))
+
+    try:
+        content, provider_used, model_used = await asyncio.to_thread(_stream_to_file, path, prompt_text, *options, on_text)
+    except Exception as exc:
+        logging.warning("Narrative stream %s failed: %s", name, exc)
         try:
-            _write_narrative_meta(name, meta)
-        except Exception:
+            os.remove(path)
+        except OSError:
             pass
+        queue.put_nowait(("error", {"error": str(exc)}))
+        return
+    queue.put_nowait(("done", {"filename": name, "provider": provider_used, "model": model_used, "chars": len(content)}))
+    await _finish_narrative(name, content)
+
 
+async def _generation_events(name: str, queue: asyncio.Queue) -> AsyncIterator[str]:
+    heartbeat = float(getattr(config, "EVENTS_HEARTBEAT_SECONDS", 15) or 15)
+    yield _sse("start", {"filename": name})
+    while True:
         try:
-            usage.log_usage(
-                event="narrative",
-                provider=provider_used,
-                model=model_used,
-                key_label=(
-                    providers.key_label_from_index(key_index or 0)
-                    if provider_used == "gemini"
-                    else usage.OPENAI_LABEL
-                ),
-                status="success",
-            )
-        except Exception:
-            pass
+            event, data = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+        except asyncio.TimeoutError:
+            yield ": ping\n\n"
+            continue
+        yield _sse(event, data)
+        if event in ("done", "error"):
+            return
 
-        return {"filename": name}
-    except Exception as e:
-        return {"error": str(e)}
+
+@router.post("/api/narratives/generate/stream")
+async def generate_narrative_stream(request: Request):
+    """Like /api/narratives/generate, but streams the narrative as Server-Sent Events.
+
+    Events: `start` {filename}, then `token` {text} per provider chunk, then
+    `done` {filename, provider, model, chars} or `error` {error}. The file
+    is written as chunks arrive. Summary and classification run after `done`.
+    """
+    try:
+        body = await request.json()
+        prompt_text = _generation_prompt(body)
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+    name, path = _new_narrative_path()
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_run_generation(name, path, prompt_text, _generation_options(body), queue))
+    _GENERATIONS.add(task)
+    task.add_done_callback(_GENERATIONS.discard)
+    return StreamingResponse(
+        _generation_events(name, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/api/narratives/thread/{filename}")
@@ -312,8 +474,13 @@ async def get_thread(filename: str):
 
 
 @router.get("/api/formats")
-async def list_formats():
+async def list_formats(request: Request):
     os.makedirs(config.FORMATS_DIR, exist_ok=True)
+    stamp = dir_stamp(config.FORMATS_DIR, (".json",))
+    return conditional_json(request, "formats", stamp, _read_formats, last_modified=max(stamp[0], stamp[2]) / 1e9)
+
+
+def _read_formats() -> List[Dict[str, Any]]:
     out = []
     for fn in sorted(os.listdir(config.FORMATS_DIR)):
         if fn.endswith(".json"):
@@ -363,21 +530,6 @@ async def delete_format(fid: str):
         return {"error": str(e)}
 
 
-@router.get("/api/narratives/list")
-async def list_narratives_meta():
-    os.makedirs(NARRATIVES_DIR, exist_ok=True)
-    files = [f for f in sorted(os.listdir(NARRATIVES_DIR)) if f.endswith(".txt")]
-    out = []
-    for fn in files:
-        meta = _read_narrative_meta(fn)
-        out.append({
-            "filename": fn,
-            "title": meta.get("title"),
-            "folder": (meta.get("folder") or "").strip(),
-        })
-    return out
-
-
 @router.patch("/api/narratives/{filename}/folder")
 async def set_narrative_folder(filename: str, request: Request):
     try:
@@ -389,19 +541,3 @@ async def set_narrative_folder(filename: str, request: Request):
         return {"status": "ok"}
     except Exception as e:
         return {"error": str(e)}
-
-
-@router.get("/api/narratives/folders")
-async def list_narrative_folders():
-    os.makedirs(NARRATIVES_DIR, exist_ok=True)
-    files = [f for f in sorted(os.listdir(NARRATIVES_DIR)) if f.endswith(".txt")]
-    counts: Dict[str, int] = {}
-    for fn in files:
-        try:
-            meta = _read_narrative_meta(fn)
-            folder = (meta.get("folder") or "").strip()
-            if folder:
-                counts[folder] = counts.get(folder, 0) + 1
-        except Exception:
-            continue
-    return [{"name": k, "count": v} for k, v in sorted(counts.items(), key=lambda kv: kv[0].lower())]
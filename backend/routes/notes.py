@@ -1,25 +1,91 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, File, Form, Request, Response, UploadFile
+from fastapi.responses import JSONResponse
 
 import config
 from core import note_logic
-from models import FolderUpdate, TagsUpdate
+from core.events import publish_note_event
+from core.folders import load_folder_tombstones
+from core.fast_json import FastJSONResponse, ndjson_response, wants_ndjson
+from core.http_cache import conditional_json, path_mtime_ns, revalidate
+from core.jobs import JOBS
+from core.waveform import backfill_peaks, load_peaks, peaks_path, schedule_peaks
+from models import BulkNotesRequest, FolderUpdate, TagsUpdate
 from services import get_notes, transcribe_and_save
 from store import get_notes_store
-from store.media import delete_audio_file
+from store.index import NOTE_INDEX
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 NOTES_STORE = get_notes_store()
 
 
+def _note_listing(tombstones: set) -> list:
+    notes = get_notes()
+    # Notes of a folder being deleted in the background are already gone
+    if tombstones:
+        notes = [n for n in notes if (n.get("folder") or "") not in tombstones]
+    return notes
+
+
 @router.get("/api/notes")
-async def read_notes():
-    return get_notes()
+async def read_notes(request: Request, format: Optional[str] = None):
+    """All notes as JSON, or as NDJSON with `?format=ndjson` / `Accept: application/x-ndjson`."""
+    ndjson = wants_ndjson(request, format)
+    tombstones = set(load_folder_tombstones())
+    # Read the cursor first: changes made while listing are replayed, not lost
+    try:
+        seq = NOTE_INDEX.seq()
+    except Exception:
+        logger.warning("Note change sequence unavailable", exc_info=True)
+        notes = _note_listing(tombstones)
+        return ndjson_response(notes) if ndjson else FastJSONResponse(notes)
+    headers = {"X-Notes-Seq": str(seq)}
+    if getattr(config, "STORE_BACKEND", "filesystem") != "filesystem":
+        # Other instances change a remote store without touching this
+        # process's sequence or directories, so nothing here can validate it
+        notes = _note_listing(tombstones)
+        if ndjson:
+            return ndjson_response(notes, headers=headers)
+        return FastJSONResponse(notes, headers=headers)
+    validator = (seq, sorted(tombstones), path_mtime_ns(config.VOICE_NOTES_DIR))
+    if ndjson:
+        _, cache_headers, fresh = revalidate(request, "notes-ndjson", validator)
+        headers.update(cache_headers)
+        if fresh:
+            return Response(status_code=304, headers=headers)
+        return ndjson_response(_note_listing(tombstones), headers=headers)
+    return conditional_json(
+        request,
+        "notes",
+        validator,
+        lambda: _note_listing(tombstones),
+        headers=headers,
+    )
+
+
+@router.get("/api/notes/facets")
+async def list_facets():
+    """Note counts per folder, tag, language, category and program."""
+    try:
+        return NOTE_INDEX.all_counts()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/api/notes/changes")
+async def list_changes(since: int = 0, limit: int = note_logic.CHANGES_PAGE_SIZE):
+    """Notes saved/deleted after change sequence `since` (delta sync)."""
+    try:
+        return await note_logic.note_changes(since, limit)
+    except Exception as e:
+        return {"error": str(e)}
 
 
 @router.post("/api/notes")
@@ -45,57 +111,66 @@ async def retry_note(background_tasks: BackgroundTasks, filename: str):
     return {"status": "queued"}
 
 
+# Peaks are derived from audio that is never rewritten under the same name
+PEAKS_CACHE_CONTROL = "private, max-age=86400"
+
+
+@router.get("/api/notes/{filename}/peaks")
+async def read_peaks(request: Request, filename: str, build: bool = True):
+    """Waveform peaks for an audio note, built on first request if missing.
+
+    With `build=0` a missing sidecar is a 404 instead of a full decode.
+    """
+    if not filename or os.path.basename(filename) != filename or filename.startswith("."):
+        return Response(status_code=404)
+    data = load_peaks(filename)
+    if data is None and build:
+        data = await asyncio.wrap_future(schedule_peaks(filename))
+    if data is None:
+        return Response(status_code=404)
+    # One file per note: revalidate, but don't keep serialized bodies around
+    _, headers, fresh = revalidate(
+        request, "peaks", (filename, path_mtime_ns(peaks_path(filename))), PEAKS_CACHE_CONTROL
+    )
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(data, headers=headers)
+
+
+@router.post("/api/notes/peaks/backfill")
+async def backfill_note_peaks(force: bool = False):
+    """Compute missing waveform peaks for all audio notes as a background job."""
+    job = JOBS.active("peaks_backfill") or JOBS.submit("peaks_backfill", backfill_peaks, force=force)
+    return JSONResponse(status_code=202, content=job.as_dict())
+
+
 @router.delete("/api/notes/{filename}")
 async def delete_note(filename: str):
-    base_filename = os.path.splitext(filename)[0]
-    data = None
-    try:
-        data, _, _ = NOTES_STORE.load_note(base_filename)
-    except Exception as exc:
-        logger.error("Failed to load note %s: %s", base_filename, exc, exc_info=True)
-        data = None
-    file_id = data.get('appwrite_file_id') if data else None
-    audio_path = os.path.join(config.VOICE_NOTES_DIR, filename)
-    note_existed = bool(data) or os.path.exists(audio_path) or bool(file_id)
-
-    local_deleted = True
-    remote_deleted = True
-    store_deleted = True
-    errors: list[str] = []
-
-    if os.path.exists(audio_path):
-        try:
-            os.remove(audio_path)
-        except OSError as exc:
-            local_deleted = False
-            errors.append(f"Failed to delete audio file: {exc}")
-            logger.error("Failed to delete audio file %s: %s", audio_path, exc, exc_info=True)
-
-    if file_id:
-        try:
-            delete_audio_file(file_id)
-        except Exception as exc:
-            remote_deleted = False
-            errors.append(f"Failed to delete remote audio: {exc}")
-            logger.error("Failed to delete Appwrite file %s: %s", file_id, exc, exc_info=True)
-
-    try:
-        NOTES_STORE.delete_note(base_filename)
-    except Exception as exc:
-        store_deleted = False
-        errors.append(f"Failed to delete note metadata: {exc}")
-        logger.error("Failed to delete note metadata for %s: %s", base_filename, exc, exc_info=True)
+    note_existed, errors = note_logic.delete_note_everywhere(filename)
 
     if not note_existed:
         return Response(status_code=404)
 
-    if not (local_deleted and remote_deleted and store_deleted):
-        message = "; ".join(errors) if errors else "Failed to delete note completely."
-        return Response(status_code=500, content=message)
+    if errors:
+        return Response(status_code=500, content="; ".join(errors))
 
     return Response(status_code=200)
 
 
+@router.post("/api/notes/bulk")
+async def bulk_notes(payload: BulkNotesRequest):
+    """Move, retag or delete many notes in one request; reports per-item results."""
+    tags = None
+    if payload.tags is not None:
+        tags = [{"label": t.label, "color": t.color} for t in payload.tags]
+    elif payload.tag is not None:
+        tags = [{"label": payload.tag.label, "color": payload.tag.color}]
+    try:
+        return await note_logic.bulk_update_notes(payload.ids, payload.op, folder=payload.folder, tags=tags)
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+
+
 @router.post("/api/notes/text")
 async def create_text_note(request: Request):
     try:
@@ -120,6 +195,7 @@ async def update_tags(filename: str, payload: TagsUpdate):
         tags = [{"label": t.label, "color": t.color} for t in payload.tags]
         data["tags"] = tags
         NOTES_STORE.save_note(base_filename, data)
+        publish_note_event("note.updated", base_filename, data)
         return {"status": "ok", "tags": tags}
     except Exception as e:
         return {"error": str(e)}
@@ -128,13 +204,29 @@ async def update_tags(filename: str, payload: TagsUpdate):
 @router.patch("/api/notes/{filename}/folder")
 async def update_folder(filename: str, payload: FolderUpdate):
     base_filename = os.path.splitext(filename)[0]
+    # A program-only update leaves the folder alone
+    set_folder = payload.folder is not None or payload.program is None
     desired_folder = str(payload.folder or "").strip()
     try:
         data, _, _ = NOTES_STORE.load_note(base_filename)
         if not data:
             return Response(status_code=404)
-        data["folder"] = desired_folder
+        if set_folder:
+            data["folder"] = desired_folder
+            note_logic.reclaim_folder(desired_folder)
+        if payload.program is not None:
+            data["program"] = payload.program.strip()
         NOTES_STORE.save_note(base_filename, data)
-        return {"status": "ok", "folder": data["folder"]}
+        note_logic.record_correction(
+            base_filename,
+            data,
+            folder=desired_folder if set_folder else None,
+            program=payload.program,
+        )
+        publish_note_event("note.moved", base_filename, data)
+        response = {"status": "ok", "folder": data.get("folder", "")}
+        if payload.program is not None:
+            response["program"] = data["program"]
+        return response
     except Exception as e:
         return {"error": str(e)}
@@ -3,19 +3,29 @@ from __future__ import annotations
 from typing import Any, Dict, List
 
 from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
 
-from core.programs import load_programs_registry, normalize_program_entry, save_programs_registry
+from core import note_logic
+from core.jobs import JOBS
+from core.http_cache import conditional_json
+from core.programs import (
+    normalize_program_entry,
+    programs_registry_snapshot,
+    save_programs_registry,
+)
 
 router = APIRouter()
 
 
 @router.get("/api/programs")
-async def list_programs():
-    return load_programs_registry()
+async def list_programs(request: Request):
+    # Always compares the file stamp so API reads see out-of-band edits
+    programs, version = programs_registry_snapshot(recheck_after=0)
+    return conditional_json(request, "programs", version, lambda: programs)
 
 
 @router.put("/api/programs")
-async def replace_programs(request: Request):
+async def replace_programs(request: Request, reclassify: bool = False):
     try:
         body = await request.json()
     except Exception:
@@ -37,4 +47,22 @@ async def replace_programs(request: Request):
     except ValueError as exc:
         return Response(status_code=400, content=str(exc))
     save_programs_registry(normalized)
-    return {"programs": normalized, "count": len(normalized)}
+    response: Dict[str, Any] = {"programs": normalized, "count": len(normalized)}
+    if reclassify:
+        response["job"] = _start_reclassify(dry_run=False).as_dict()
+    return response
+
+
+def _start_reclassify(dry_run: bool):
+    # One writing pass at a time; a dry run can overlap with it
+    if not dry_run:
+        running = JOBS.active("reclassify")
+        if running is not None and not running.params.get("dry_run"):
+            return running
+    return JOBS.submit("reclassify", note_logic.reclassify_notes, dry_run=dry_run)
+
+
+@router.post("/api/programs/reclassify")
+async def reclassify_notes(dry_run: bool = False):
+    job = _start_reclassify(dry_run=dry_run)
+    return JSONResponse(status_code=202, content=job.as_dict())
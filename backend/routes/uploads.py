@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+
+from core import uploads
+from models import UploadFinalize, UploadInit
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _offset_headers(offset: int) -> dict:
+    return {"Upload-Offset": str(offset), "Cache-Control": "no-store"}
+
+
+def _conflict(exc: uploads.UploadConflict) -> JSONResponse:
+    return JSONResponse(
+        status_code=409,
+        content={"error": str(exc), "offset": exc.offset},
+        headers=_offset_headers(exc.offset),
+    )
+
+
+@router.post("/api/uploads")
+async def create_upload(payload: UploadInit):
+    """Start a resumable upload; send the bytes with PUT, then finalize."""
+    try:
+        session = uploads.create_upload(
+            payload.filename,
+            payload.size,
+            content_type=payload.content_type,
+            sha256=payload.sha256,
+            folder=payload.folder,
+            date=payload.date,
+            place=payload.place,
+        )
+    except ValueError as exc:
+        return Response(status_code=400, content=str(exc))
+    return JSONResponse(status_code=201, content=session, headers=_offset_headers(0))
+
+
+@router.api_route("/api/uploads/{upload_id}", methods=["GET", "HEAD"])
+async def upload_status(upload_id: str):
+    """Where to resume: `offset` is the number of bytes already stored."""
+    try:
+        status = uploads.upload_status(upload_id)
+    except KeyError:
+        return Response(status_code=404)
+    return JSONResponse(content=status, headers=_offset_headers(status["offset"]))
+
+
+@router.put("/api/uploads/{upload_id}")
+async def put_chunk(request: Request, upload_id: str, offset: Optional[int] = None):
+    """Append the raw request body at `offset` (query param or Upload-Offset header)."""
+    if offset is None:
+        try:
+            offset = int(request.headers.get("upload-offset", ""))
+        except ValueError:
+            return Response(status_code=400, content="offset is required")
+    try:
+        new_offset = await uploads.append_chunk(upload_id, offset, request.stream())
+    except KeyError:
+        return Response(status_code=404)
+    except uploads.UploadConflict as exc:
+        return _conflict(exc)
+    except ClientDisconnect:
+        # Whatever arrived is kept; the client resumes from GET /api/uploads/{id}
+        logger.info("Upload %s interrupted at offset %s", upload_id, uploads.upload_status(upload_id)["offset"])
+        return Response(status_code=400)
+    return JSONResponse(content={"offset": new_offset}, headers=_offset_headers(new_offset))
+
+
+@router.post("/api/uploads/{upload_id}/finalize")
+async def finalize_upload(background_tasks: BackgroundTasks, upload_id: str, payload: Optional[UploadFinalize] = None):
+    """Verify size and sha256, then create the note and start transcription."""
+    try:
+        return await uploads.finalize_upload(upload_id, background_tasks, sha256=payload.sha256 if payload else None)
+    except KeyError:
+        return Response(status_code=404)
+    except uploads.UploadConflict as exc:
+        return _conflict(exc)
+    except (ValueError, RuntimeError) as exc:
+        return Response(status_code=400, content=str(exc))
+
+
+@router.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    try:
+        removed = uploads.abort_upload(upload_id)
+    except KeyError:
+        return Response(status_code=404)
+    return Response(status_code=204 if removed else 404)
@@ -2,6 +2,7 @@ import os
 import json
 import io
 import asyncio
+import time
 from datetime import datetime
 from typing import Optional
 from dotenv import load_dotenv
@@ -11,7 +12,8 @@ import config
 import providers
 from note_store import audio_length_seconds, ensure_metadata_in_json, ensure_placeholder_note, build_note_payload
 from store import get_notes_store
-from store.media import delete_audio_file, download_audio_to_temp
+from store.media import delete_audio_file, cached_audio_path
+from core.events import COMPLETION_BUS, publish_note_event
 import usage_log as usage
 
 # Load environment variables from .env file
@@ -80,8 +82,12 @@ async def transcribe_and_save(wav_path):
     base_name = os.path.splitext(base_filename)[0]
     ext = os.path.splitext(base_filename)[1].lower().lstrip('.') or 'wav'
     print(f"Starting transcription process for {base_filename}...")
+    COMPLETION_BUS.forget(base_name)
 
-    temp_download: Optional[str] = None
+    started = time.perf_counter()
+    status = "success"
+    bytes_sent: Optional[int] = None
+    audio_seconds: Optional[float] = None
     existing: Optional[dict] = None
     appwrite_file_id: Optional[str] = None
 
@@ -94,15 +100,19 @@ async def transcribe_and_save(wav_path):
 
     try:
         if not os.path.exists(wav_path) and appwrite_file_id:
-            temp = download_audio_to_temp(appwrite_file_id)
-            if temp:
-                wav_path = temp
-                temp_download = temp
+            cached = cached_audio_path(appwrite_file_id, existing.get("upload_sha256"))
+            if cached:
+                wav_path = cached
         if not os.path.exists(wav_path):
             raise FileNotFoundError(f"Audio file {base_filename} missing for transcription.")
 
         with open(wav_path, "rb") as af:
             audio_bytes = af.read()
+        bytes_sent = len(audio_bytes)
+        if isinstance(existing, dict) and isinstance(existing.get("length_seconds"), (int, float)) and existing.get("length_seconds"):
+            audio_seconds = float(existing["length_seconds"])
+        elif wav_path.lower().endswith(".wav"):
+            audio_seconds = audio_length_seconds(wav_path)
 
         # Transcribe with provider rotation & fallback
         print(f"Transcribing {base_filename} from local file bytes...")
@@ -131,13 +141,19 @@ async def transcribe_and_save(wav_path):
         try:
             # Try Gemini quickly (up to 2 attempts across rotated keys), then fallback
             gemini_ok = False
-            last_key_index = None
+            gemini_attempts = 0
             for attempt in range(2):
+                gemini_attempts = attempt + 1
                 try:
-                    transcription_response, key_index = await asyncio.to_thread(
-                        providers.invoke_google, [transcription_message]
-                    )
-                    last_key_index = key_index
+                    with usage.call_context(
+                        event="transcribe",
+                        attempt=attempt + 1,
+                        bytes_sent=bytes_sent,
+                        audio_seconds=audio_seconds,
+                    ):
+                        transcription_response, _ = await asyncio.to_thread(
+                            providers.invoke_google, [transcription_message]
+                        )
                     transcribed_text = transcription_response.content
                     gemini_ok = True
                     break
@@ -147,27 +163,19 @@ async def transcribe_and_save(wav_path):
                         break
                     # non-rate-limit error: try once more, then fallback
                     continue
-            if gemini_ok:
-                usage.log_usage(
-                    event="transcribe",
-                    provider="gemini",
-                    model=config.GOOGLE_MODEL,
-                    key_label=providers.key_label_from_index(last_key_index or 0),
-                    status="success",
-                )
-            else:
+            if not gemini_ok:
                 raise RuntimeError("Gemini unavailable, falling back")
         except Exception as e:
-            # Fallback to OpenAI Whisper
+            # Fallback to OpenAI Whisper; its attempt follows the Gemini ones
             print(f"Falling back to Whisper for {base_filename}: {e}")
-            transcribed_text = providers.transcribe_with_openai(audio_bytes, file_ext=ext)
-            usage.log_usage(
+            with usage.call_context(
                 event="transcribe",
-                provider="openai",
-                model=config.OPENAI_TRANSCRIBE_MODEL,
-                key_label=usage.OPENAI_LABEL,
-                status="success",
-            )
+                attempt=gemini_attempts + 1,
+                fallback=True,
+                bytes_sent=bytes_sent,
+                audio_seconds=audio_seconds,
+            ):
+                transcribed_text = providers.transcribe_with_openai(audio_bytes, file_ext=ext)
         print(f"Successfully transcribed {base_filename}.")
 
         # Generate title
@@ -187,13 +195,14 @@ async def transcribe_and_save(wav_path):
             )
             # Try Gemini briefly, else fallback to OpenAI title
             gemini_ok = False
-            last_key_index = None
+            gemini_attempts = 0
             for attempt in range(2):
+                gemini_attempts = attempt + 1
                 try:
-                    title_response, key_index = await asyncio.to_thread(
-                        providers.invoke_google, [title_message]
-                    )
-                    last_key_index = key_index
+                    with usage.call_context(event="title", attempt=attempt + 1):
+                        title_response, _ = await asyncio.to_thread(
+                            providers.invoke_google, [title_message]
+                        )
                     title_text = providers.normalize_title_output(title_response.content)
                     gemini_ok = True
                     break
@@ -202,27 +211,13 @@ async def transcribe_and_save(wav_path):
                     if providers.should_google_fallback(ge):
                         break
                     continue
-            if gemini_ok:
-                usage.log_usage(
-                    event="title",
-                    provider="gemini",
-                    model=config.GOOGLE_MODEL,
-                    key_label=providers.key_label_from_index(last_key_index or 0),
-                    status="success",
-                )
-            else:
+            if not gemini_ok:
                 raise RuntimeError("Gemini unavailable for title")
         except Exception as e:
             try:
                 print(f"Falling back to OpenAI title for {base_filename}: {e}")
-                title_text = providers.title_with_openai(transcribed_text)
-                usage.log_usage(
-                    event="title",
-                    provider="openai",
-                    model=config.OPENAI_TITLE_MODEL,
-                    key_label=usage.OPENAI_LABEL,
-                    status="success",
-                )
+                with usage.call_context(event="title", attempt=gemini_attempts + 1, fallback=True):
+                    title_text = providers.title_with_openai(transcribed_text)
             except Exception:
                 title_text = "Title generation failed."
         print(f"Successfully generated title for {base_filename}.")
@@ -240,8 +235,11 @@ async def transcribe_and_save(wav_path):
                 payload['tags'] = existing.get('tags')
         NOTES_STORE.save_note(base_name, payload)
         print(f"Successfully saved transcription and title for {base_filename}.")
+        COMPLETION_BUS.publish(base_name, {"status": "complete", "note": payload})
+        publish_note_event("note.transcribed", base_name, payload)
 
     except Exception as e:
+        status = "error"
         print(f"Error during transcription/titling for {wav_path}: {e}")
         metadata = _build_metadata_from_filename_and_existing(base_filename, existing)
         payload = build_note_payload(base_filename, "Title generation failed.", "Transcription failed.", metadata)
@@ -256,9 +254,19 @@ async def transcribe_and_save(wav_path):
             NOTES_STORE.save_note(base_name, payload)
         except Exception:
             pass
+        COMPLETION_BUS.publish(base_name, {"status": "failed", "note": payload})
+        publish_note_event("note.failed", base_name, payload)
     finally:
-        if temp_download and os.path.exists(temp_download):
-            os.remove(temp_download)
+        try:
+            usage.log_stage(
+                "transcribe_and_save",
+                status=status,
+                duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                bytes_sent=bytes_sent,
+                audio_seconds=audio_seconds,
+            )
+        except Exception:
+            pass
 
 # Removed unused helpers and scenario-related functions to reduce complexity
 
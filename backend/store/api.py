@@ -8,7 +8,7 @@ need for NotesStore operations.
 
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
 
 import httpx
 
@@ -85,7 +85,8 @@ class AppwriteClient:
             if resp.status_code not in (200, 204, 404):
                 resp.raise_for_status()
 
-    def upload_file(self, bucket_id: str, filename: str, data: bytes, mime: str) -> str:
+    def upload_file(self, bucket_id: str, filename: str, data: Union[bytes, BinaryIO], mime: str) -> str:
+        # `data` may be an open file; httpx streams it instead of buffering
         url = f"{self._base}/storage/buckets/{bucket_id}/files"
         with httpx.Client(timeout=60) as client:
             resp = client.post(
@@ -105,9 +106,23 @@ class AppwriteClient:
             if resp.status_code not in (200, 204, 404):
                 resp.raise_for_status()
 
+    def download_request(self, bucket_id: str, file_id: str) -> Tuple[str, Dict[str, str]]:
+        """URL and auth headers for streaming a file download yourself."""
+        url = f"{self._base}/storage/buckets/{bucket_id}/files/{file_id}/download"
+        return url, self._headers(content_type=None)
+
     def download_file(self, bucket_id: str, file_id: str) -> bytes:
         url = f"{self._base}/storage/buckets/{bucket_id}/files/{file_id}/download"
         with httpx.Client(timeout=60) as client:
             resp = client.get(url, headers=self._headers(content_type=None))
             resp.raise_for_status()
             return resp.content
+
+    def download_file_to(self, bucket_id: str, file_id: str, out: BinaryIO, chunk_size: int = 256 * 1024) -> None:
+        """Stream a file download into `out` without holding it in memory."""
+        url, headers = self.download_request(bucket_id, file_id)
+        with httpx.Client(timeout=httpx.Timeout(30.0, read=60.0)) as client:
+            with client.stream("GET", url, headers=headers) as resp:
+                resp.raise_for_status()
+                for chunk in resp.iter_bytes(chunk_size):
+                    out.write(chunk)
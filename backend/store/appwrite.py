@@ -13,6 +13,7 @@ from typing import Any, Dict, Iterable, Optional, Tuple
 import config
 from store.base import NotesStore
 from store.api import AppwriteClient
+from store.index import NOTE_INDEX
 
 NOTE_ALLOWED_FIELDS = {
     "filename",
@@ -86,6 +87,7 @@ class AppwriteNotesStore(NotesStore):
             self._client.update_document(config.APPWRITE_NOTES_COLLECTION_ID, base_id, prepared)
         else:
             self._client.create_document(config.APPWRITE_NOTES_COLLECTION_ID, base_id, prepared)
+        NOTE_INDEX.put(base_id, payload)
 
     def load_note(self, base_id: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str]]:
         doc = self._client.get_document(config.APPWRITE_NOTES_COLLECTION_ID, base_id)
@@ -119,3 +121,4 @@ class AppwriteNotesStore(NotesStore):
 
     def delete_note(self, base_id: str) -> None:
         self._client.delete_document(config.APPWRITE_NOTES_COLLECTION_ID, base_id)
+        NOTE_INDEX.remove(base_id)
@@ -0,0 +1,220 @@
+"""
+Size-bounded local cache for audio stored in Appwrite.
+
+Blobs are content-addressed (`blobs/<sha256[:2]>/<sha256>`), with a small
+ref file per Appwrite file id pointing at its blob. Identical uploads share
+one copy, and a note that recorded `upload_sha256` can hit the cache
+without a ref. Downloads stream straight into the cache while hashing.
+Concurrent requests for the same file id share one download: the first
+caller fetches and the others wait for its result.
+
+Eviction is least-recently-used by blob mtime, which is refreshed on every
+hit. Blobs used within the last `PIN_SECONDS` are never evicted, so a path
+just handed to a reader stays valid while it is being served.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Never evict a blob touched this recently (it may be mid-read)
+PIN_SECONDS = 300
+# How long a coalesced reader waits for another request's download
+WAIT_SECONDS = 600
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+Downloader = Callable[[str, BinaryIO], None]
+
+
+class _HashingWriter:
+    def __init__(self, f: BinaryIO) -> None:
+        self._f = f
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> int:
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        return self._f.write(chunk)
+
+
+class _Inflight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.path: Optional[str] = None
+
+
+class AudioCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Inflight] = {}
+        self._tally_root: Optional[str] = None
+        self._sizes: Dict[str, int] = {}
+        self._total = 0
+
+    # -- paths ---------------------------------------------------------
+
+    @staticmethod
+    def _root() -> str:
+        return getattr(config, "AUDIO_CACHE_DIR", None) or os.path.join(config.STORAGE_DIR, "cache", "audio")
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._root(), "blobs", sha256[:2], sha256)
+
+    def _ref_path(self, file_id: str) -> str:
+        safe = file_id if re.fullmatch(r"[A-Za-z0-9._-]{1,128}", file_id) else hashlib.sha1(file_id.encode()).hexdigest()
+        return os.path.join(self._root(), "refs", safe)
+
+    def _read_ref(self, file_id: str) -> Optional[str]:
+        try:
+            with open(self._ref_path(file_id), "r", encoding="utf-8") as f:
+                sha = f.read().strip()
+        except OSError:
+            return None
+        return sha if _SHA256_RE.match(sha) else None
+
+    def _write_ref(self, file_id: str, sha256: str) -> None:
+        path = self._ref_path(file_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(sha256)
+        os.replace(tmp, path)
+
+    # -- size accounting -----------------------------------------------
+
+    def _ensure_tally(self) -> None:
+        root = self._root()
+        if self._tally_root == root:
+            return
+        self._sizes = {}
+        blobs = os.path.join(root, "blobs")
+        for dirpath, _, names in os.walk(blobs):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    self._sizes[path] = os.stat(path).st_size
+                except OSError:
+                    continue
+        self._total = sum(self._sizes.values())
+        self._tally_root = root
+
+    def _evict(self, keep: str) -> None:
+        limit = int(getattr(config, "AUDIO_CACHE_MAX_BYTES", 0) or 0)
+        if limit <= 0 or self._total <= limit:
+            return
+        now = time.time()
+        entries = []
+        for path in self._sizes:
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                entries.append((0.0, path))
+        for mtime, path in sorted(entries):
+            if self._total <= limit:
+                break
+            if path == keep or now - mtime < PIN_SECONDS:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning("Failed to evict cached audio %s", path, exc_info=True)
+                continue
+            self._total -= self._sizes.pop(path, 0)
+
+    # -- public API ----------------------------------------------------
+
+    def lookup(self, file_id: str, sha256: Optional[str] = None) -> Optional[str]:
+        """Path of the cached blob for `file_id` (or content `sha256`), else None."""
+        for sha in (sha256, self._read_ref(file_id)):
+            if not sha or not _SHA256_RE.match(sha):
+                continue
+            path = self._blob_path(sha)
+            try:
+                os.utime(path, None)  # LRU: mark as recently used
+            except OSError:
+                continue
+            return path
+        return None
+
+    def fetch(self, file_id: str, download: Downloader, sha256: Optional[str] = None) -> Optional[str]:
+        """Return a local path for `file_id`, downloading it once if needed."""
+        hit = self.lookup(file_id, sha256)
+        if hit:
+            return hit
+        with self._lock:
+            inflight = self._inflight.get(file_id)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[file_id] = _Inflight()
+        if not owner:
+            inflight.done.wait(WAIT_SECONDS)
+            return inflight.path
+        try:
+            inflight.path = self._download(file_id, download)
+        except Exception:
+            logger.error("Failed to cache audio %s", file_id, exc_info=True)
+        finally:
+            inflight.done.set()
+            with self._lock:
+                self._inflight.pop(file_id, None)
+        return inflight.path
+
+    def _download(self, file_id: str, download: Downloader) -> str:
+        tmp_dir = os.path.join(self._root(), "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                writer = _HashingWriter(f)
+                download(file_id, writer)  # type: ignore[arg-type]
+            sha = writer.hash.hexdigest()
+            path = self._blob_path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._lock:
+                self._ensure_tally()
+                if path in self._sizes and os.path.exists(path):
+                    os.remove(tmp_path)
+                    os.utime(path, None)
+                else:
+                    os.replace(tmp_path, path)
+                    self._sizes[path] = writer.size
+                    self._total += writer.size
+                self._write_ref(file_id, sha)
+                self._evict(keep=path)
+            return path
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def stats(self) -> Tuple[int, int]:
+        """(blob count, total bytes)."""
+        with self._lock:
+            self._ensure_tally()
+            return len(self._sizes), self._total
+
+    def reset(self) -> None:
+        with self._lock:
+            self._tally_root = None
+            self._sizes = {}
+            self._total = 0
+
+
+AUDIO_CACHE = AudioCache()
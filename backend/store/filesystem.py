@@ -14,6 +14,7 @@ from typing import Any, Dict, Iterable
 import config
 import note_store
 from store.base import NotesStore
+from store.index import NOTE_INDEX
 
 
 class FilesystemNotesStore(NotesStore):
@@ -36,5 +37,7 @@ class FilesystemNotesStore(NotesStore):
 
     def delete_note(self, base_id: str) -> None:
         path = note_store.note_json_path(base_id)
-        if os.path.exists(path):
-            os.remove(path)
+        with NOTE_INDEX.write_lock():
+            if os.path.exists(path):
+                os.remove(path)
+            NOTE_INDEX.remove(base_id)
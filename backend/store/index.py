@@ -0,0 +1,435 @@
+"""
+Incrementally maintained facet index over the notes store.
+
+For every note the index keeps the few fields the UI aggregates on (folder,
+tag labels, language, auto category/program) and per-facet counts derived
+from them, so `GET /api/folders` and friends answer from memory instead of
+listing the whole corpus (dozens of HTTP pages in Appwrite mode).
+
+The store hooks call `NOTE_INDEX.put(...)`/`NOTE_INDEX.remove(...)` on every
+save/delete. Changes are appended to `INDEX_DIR/journal.jsonl` and folded into
+`INDEX_DIR/snapshot.json` when the journal grows, so a restart replays a short
+journal instead of rescanning the store. The index is rebuilt from the store
+when it has no snapshot yet, or (filesystem backend) when the transcripts
+directory changed behind its back, e.g. JSON files copied in by hand. Writes
+made through the store hold `write_lock()` so their own mtime change is never
+mistaken for such an edit. A remote store offers no such stamp, so other
+instances' writes are picked up by rescanning it once the last scan is older
+than `INDEX_REMOTE_REFRESH_SECONDS` (0 disables this for a single instance).
+
+Every save and delete also bumps a monotonically increasing change sequence;
+the index remembers the last sequence per note and a bounded set of
+tombstones so `changes_since(seq)` can answer delta syncs. A rebuild cannot
+tell what changed, so it moves `reset_seq` forward and older cursors must
+resync from the full list.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+FACETS = ("folder", "tag", "language", "category", "program")
+# Fold the journal into the snapshot after this many appended changes
+COMPACT_AFTER = 2000
+# Deleted ids remembered for delta syncs; older cursors get a reset
+MAX_TOMBSTONES = 10000
+
+Facets = Dict[str, List[str]]
+
+
+def note_facets(payload: Dict[str, Any]) -> Facets:
+    """Extract the indexed facet values of a note payload."""
+
+    def one(value: Any) -> List[str]:
+        text = str(value or "").strip()
+        return [text] if text else []
+
+    tags: List[str] = []
+    for tag in payload.get("tags") or []:
+        label = tag.get("label") if isinstance(tag, dict) else tag
+        label = str(label or "").strip()
+        if label and label not in tags:
+            tags.append(label)
+    return {
+        "folder": one(payload.get("folder")),
+        "tag": tags,
+        "language": one(payload.get("language")),
+        "category": one(payload.get("auto_category")),
+        "program": one(payload.get("auto_program")),
+    }
+
+
+def note_id_for(payload: Dict[str, Any]) -> Optional[str]:
+    filename = str(payload.get("filename") or "").strip()
+    if filename:
+        return os.path.splitext(filename)[0]
+    doc_id = payload.get("$id")
+    return str(doc_id) if doc_id else None
+
+
+class NoteIndex:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._loaded_for: Optional[Tuple[str, str]] = None
+        self._notes: Dict[str, Facets] = {}
+        self._counts: Dict[str, Counter] = {facet: Counter() for facet in FACETS}
+        self._members: Dict[str, Dict[str, set]] = {facet: {} for facet in FACETS}
+        self._journal_len = 0
+        self._dir_stamp: Optional[int] = None
+        self._rebuilding = False
+        self._seq = 0
+        self._reset_seq = 0
+        self._changed: Dict[str, int] = {}
+        self._deleted: Dict[str, int] = {}
+        # Wall-clock time of the last full scan (persisted with the snapshot)
+        self._built_at = 0.0
+
+    # -- paths / source ------------------------------------------------
+
+    @staticmethod
+    def _index_dir() -> str:
+        return getattr(config, "INDEX_DIR", None) or os.path.join(config.STORAGE_DIR, "index")
+
+    @staticmethod
+    def _source() -> Tuple[str, str]:
+        backend = getattr(config, "STORE_BACKEND", "filesystem")
+        if backend == "filesystem":
+            return (backend, config.TRANSCRIPTS_DIR)
+        return (backend, getattr(config, "APPWRITE_NOTES_COLLECTION_ID", "") or "")
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self._index_dir(), "snapshot.json")
+
+    def _journal_path(self) -> str:
+        return os.path.join(self._index_dir(), "journal.jsonl")
+
+    @staticmethod
+    def _transcripts_stamp() -> Optional[int]:
+        try:
+            return os.stat(config.TRANSCRIPTS_DIR).st_mtime_ns
+        except OSError:
+            return None
+
+    # -- in-memory updates ---------------------------------------------
+
+    def _apply_put(self, note_id: str, facets: Facets) -> bool:
+        previous = self._notes.get(note_id)
+        if previous == facets:
+            return False
+        if previous is not None:
+            self._apply_remove(note_id)
+        self._notes[note_id] = facets
+        for facet, values in facets.items():
+            counts = self._counts.setdefault(facet, Counter())
+            members = self._members.setdefault(facet, {})
+            for value in values:
+                counts[value] += 1
+                members.setdefault(value, set()).add(note_id)
+        return True
+
+    def _apply_remove(self, note_id: str) -> bool:
+        previous = self._notes.pop(note_id, None)
+        if previous is None:
+            return False
+        for facet, values in previous.items():
+            counts = self._counts.get(facet)
+            members = self._members.get(facet)
+            for value in values:
+                if counts is not None:
+                    counts[value] -= 1
+                    if counts[value] <= 0:
+                        del counts[value]
+                if members is not None and value in members:
+                    members[value].discard(note_id)
+                    if not members[value]:
+                        del members[value]
+        return True
+
+    def _clear(self) -> None:
+        self._notes = {}
+        self._counts = {facet: Counter() for facet in FACETS}
+        self._members = {facet: {} for facet in FACETS}
+        self._changed = {}
+        self._deleted = {}
+
+    def _mark_changed(self, note_id: str, seq: int) -> None:
+        self._seq = max(self._seq, seq)
+        self._changed[note_id] = seq
+        self._deleted.pop(note_id, None)
+
+    def _mark_deleted(self, note_id: str, seq: int) -> None:
+        self._seq = max(self._seq, seq)
+        self._changed.pop(note_id, None)
+        self._deleted[note_id] = seq
+        if len(self._deleted) > MAX_TOMBSTONES:
+            # Forgetting a tombstone means cursors before it can no longer sync
+            oldest = min(self._deleted, key=self._deleted.get)
+            self._reset_seq = max(self._reset_seq, self._deleted.pop(oldest))
+
+    # -- persistence ---------------------------------------------------
+
+    def _append_journal(self, entry: Dict[str, Any]) -> None:
+        try:
+            os.makedirs(self._index_dir(), exist_ok=True)
+            with open(self._journal_path(), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._journal_len += 1
+            if self._journal_len >= COMPACT_AFTER:
+                self._write_snapshot()
+        except Exception:
+            logger.warning("Failed to append to note index journal", exc_info=True)
+
+    def _write_snapshot(self) -> None:
+        os.makedirs(self._index_dir(), exist_ok=True)
+        path = self._snapshot_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "source": list(self._source()),
+                    "notes": self._notes,
+                    "seq": self._seq,
+                    "reset_seq": self._reset_seq,
+                    "changed": self._changed,
+                    "deleted": self._deleted,
+                    "built_at": self._built_at,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+        try:
+            os.remove(self._journal_path())
+        except FileNotFoundError:
+            pass
+        self._journal_len = 0
+
+    def _load_persisted(self) -> bool:
+        try:
+            with open(self._snapshot_path(), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            logger.warning("Ignoring unreadable note index snapshot", exc_info=True)
+            return False
+        if tuple(snapshot.get("source") or ()) != self._source():
+            return False
+        self._clear()
+        for note_id, facets in (snapshot.get("notes") or {}).items():
+            self._apply_put(note_id, facets)
+        self._seq = int(snapshot.get("seq") or 0)
+        self._reset_seq = int(snapshot.get("reset_seq") or 0)
+        self._changed = {k: int(v) for k, v in (snapshot.get("changed") or {}).items()}
+        self._deleted = {k: int(v) for k, v in (snapshot.get("deleted") or {}).items()}
+        self._built_at = float(snapshot.get("built_at") or 0)
+        self._journal_len = 0
+        try:
+            with open(self._journal_path(), "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        self._replay(json.loads(line))
+                    except Exception:
+                        continue
+                    self._journal_len += 1
+        except FileNotFoundError:
+            pass
+        return True
+
+    def _replay(self, entry: Dict[str, Any]) -> None:
+        seq = int(entry.get("seq") or self._seq + 1)
+        if entry.get("op") == "put":
+            self._apply_put(entry["id"], entry.get("facets") or {})
+            self._mark_changed(entry["id"], seq)
+        elif entry.get("op") == "del":
+            self._apply_remove(entry["id"])
+            self._mark_deleted(entry["id"], seq)
+
+    def rebuild(self) -> int:
+        """Rescan the whole store and rewrite the snapshot. Returns the note count."""
+        from store import get_notes_store
+
+        with self._lock:
+            self._rebuilding = True
+            try:
+                stamp = self._transcripts_stamp()
+                self._clear()
+                # Everything before this point is stale. Jumping to the clock
+                # keeps the sequence increasing even if the snapshot was lost.
+                self._seq = max(self._seq + 1, int(time.time() * 1000))
+                self._reset_seq = self._seq
+                for payload in get_notes_store().list_notes():
+                    note_id = note_id_for(payload)
+                    if note_id:
+                        self._apply_put(note_id, note_facets(payload))
+                        self._changed[note_id] = self._seq
+                self._loaded_for = self._source()
+                self._dir_stamp = stamp
+                self._built_at = time.time()
+                try:
+                    self._write_snapshot()
+                except Exception:
+                    logger.warning("Failed to write note index snapshot", exc_info=True)
+                return len(self._notes)
+            finally:
+                self._rebuilding = False
+
+    def _ensure_loaded(self) -> None:
+        source = self._source()
+        if self._loaded_for == source:
+            if source[0] != "filesystem":
+                if self._remote_scan_due():
+                    logger.info("Note index older than INDEX_REMOTE_REFRESH_SECONDS; rescanning store")
+                    self.rebuild()
+                return
+            if self._transcripts_stamp() == self._dir_stamp:
+                return
+            logger.info("Transcripts dir changed outside the index; rebuilding")
+            self.rebuild()
+            return
+        if (
+            self._load_persisted()
+            and self._matches_transcripts_dir(source)
+            and not (source[0] != "filesystem" and self._remote_scan_due())
+        ):
+            self._loaded_for = source
+            self._dir_stamp = self._transcripts_stamp()
+            return
+        self.rebuild()
+
+    def _remote_scan_due(self) -> bool:
+        # A rescan moves reset_seq, so delta-sync clients resync at this pace
+        interval = float(getattr(config, "INDEX_REMOTE_REFRESH_SECONDS", 300) or 0)
+        return interval > 0 and time.time() - self._built_at >= interval
+
+    def _matches_transcripts_dir(self, source: Tuple[str, str]) -> bool:
+        # Notes may have been added/removed while the process was down; a
+        # listdir is far cheaper than parsing every note to find out.
+        if source[0] != "filesystem":
+            return True
+        try:
+            names = os.listdir(config.TRANSCRIPTS_DIR)
+        except OSError:
+            names = []
+        ids = {name[:-5] for name in names if name.endswith(".json")}
+        return ids == set(self._notes)
+
+    # -- public API ----------------------------------------------------
+
+    def write_lock(self) -> threading.RLock:
+        """Hold around a store write plus its `put`/`remove`.
+
+        Readers compare the transcripts dir mtime with the stamp recorded by
+        the last write; without the lock, a reader running between the file
+        write and `put` would take our own write for an out-of-band edit and
+        rebuild (resetting every delta-sync cursor).
+        """
+        return self._lock
+
+    def put(self, note_id: str, payload: Dict[str, Any]) -> None:
+        """Record a saved note (called by the store after a successful write)."""
+        if not note_id:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            if self._loaded_for != self._source():
+                # Loading reads the snapshot/journal or rescans the store
+                self._ensure_loaded()
+            facets = note_facets(payload)
+            self._apply_put(note_id, facets)
+            # Content changes count too, even when no facet moved
+            self._mark_changed(note_id, self._seq + 1)
+            self._append_journal({"op": "put", "id": note_id, "facets": facets, "seq": self._seq})
+            self._dir_stamp = self._transcripts_stamp()
+
+    def remove(self, note_id: str) -> None:
+        if not note_id:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            if self._loaded_for != self._source():
+                self._ensure_loaded()
+            if self._apply_remove(note_id):
+                self._mark_deleted(note_id, self._seq + 1)
+                self._append_journal({"op": "del", "id": note_id, "seq": self._seq})
+            self._dir_stamp = self._transcripts_stamp()
+
+    def counts(self, facet: str) -> Dict[str, int]:
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._counts.get(facet) or {})
+
+    def all_counts(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            self._ensure_loaded()
+            return {facet: dict(self._counts.get(facet) or {}) for facet in FACETS}
+
+    def members(self, facet: str, value: str) -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return sorted((self._members.get(facet) or {}).get(value, ()))
+
+    def seq(self) -> int:
+        """Current change sequence (use as the `since` cursor of the next sync)."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._seq
+
+    def changes_since(self, since: int, limit: int = 1000) -> Dict[str, Any]:
+        """Ids saved and deleted after `since`, oldest first.
+
+        Returns `{seq, reset, upserts, deleted, more}`. `reset` means the
+        cursor predates what the index can replay and the caller must resync
+        from the full list. With `more`, call again with the returned `seq`.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if since < self._reset_seq or since > self._seq:
+                return {"seq": self._seq, "reset": True, "upserts": [], "deleted": [], "more": False}
+            changes = [(seq, note_id, False) for note_id, seq in self._changed.items() if seq > since]
+            changes += [(seq, note_id, True) for note_id, seq in self._deleted.items() if seq > since]
+            current = self._seq
+        changes.sort()
+        more = len(changes) > limit
+        if more:
+            changes = changes[:limit]
+        return {
+            "seq": changes[-1][0] if more else current,
+            "reset": False,
+            "upserts": [note_id for _, note_id, deleted in changes if not deleted],
+            "deleted": [note_id for _, note_id, deleted in changes if deleted],
+            "more": more,
+        }
+
+    def total(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._notes)
+
+    def reset(self) -> None:
+        """Forget the in-memory state; the next read reloads or rebuilds."""
+        with self._lock:
+            self._loaded_for = None
+            self._clear()
+            self._journal_len = 0
+            self._dir_stamp = None
+            self._seq = 0
+            self._reset_seq = 0
+            self._built_at = 0.0
+
+
+NOTE_INDEX = NoteIndex()
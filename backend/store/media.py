@@ -1,18 +1,22 @@
 from __future__ import annotations
 
 import logging
-import os
-import tempfile
 import threading
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, BinaryIO, Callable, Optional, Tuple, Union
+
+import httpx
 
 import config
 from store.api import AppwriteClient
+from store.audio_cache import AUDIO_CACHE
 
 logger = logging.getLogger(__name__)
 
 _APPWRITE_STORAGE: Optional[AppwriteClient] = None
 _APPWRITE_LOCK = threading.Lock()
+# Background cache fills; playback is proxied meanwhile
+_PREFETCH = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-prefetch")
 
 
 def _client() -> AppwriteClient:
@@ -32,7 +36,7 @@ def is_appwrite_storage_enabled() -> bool:
     )
 
 
-def upload_audio_file(filename: str, data: bytes, mime: str) -> Optional[str]:
+def upload_audio_file(filename: str, data: Union[bytes, BinaryIO], mime: str) -> Optional[str]:
     if not is_appwrite_storage_enabled():
         logger.debug("Appwrite storage disabled; skipping upload for %s", filename)
         return None
@@ -56,11 +60,45 @@ def delete_audio_file(file_id: Optional[str]) -> None:
         logger.error("Failed to delete Appwrite audio %s: %s", file_id, e, exc_info=True)
 
 
-def download_audio_to_temp(file_id: str) -> Optional[str]:
-    """Download an Appwrite audio file to a temp path.
+async def open_audio_stream(
+    file_id: str,
+    range_header: Optional[str] = None,
+) -> Tuple[httpx.Response, Callable[[], Awaitable[None]]]:
+    """Start a streamed (optionally ranged) download of an Appwrite audio file.
+
+    Returns the response (headers read, body not yet consumed) and an async
+    `close` callback the caller must run once it is done with the body.
+    """
+    if not is_appwrite_storage_enabled():
+        raise RuntimeError("Appwrite storage is not enabled")
+    url, headers = _client().download_request(config.APPWRITE_BUCKET_VOICE_NOTES, file_id)
+    # Bytes are relayed as-is, so they must not be content-encoded
+    headers["Accept-Encoding"] = "identity"
+    if range_header:
+        headers["Range"] = range_header
+    client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, read=60.0))
+    try:
+        resp = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+    except Exception:
+        await client.aclose()
+        raise
+
+    async def close() -> None:
+        await resp.aclose()
+        await client.aclose()
+
+    return resp, close
+
+
+def _download_to(file_id: str, out: BinaryIO) -> None:
+    _client().download_file_to(config.APPWRITE_BUCKET_VOICE_NOTES, file_id, out)
 
-    Returns the path to the temporary file, or None on failure.
-    Caller is responsible for deleting the returned file.
+
+def cached_audio_path(file_id: Optional[str], sha256: Optional[str] = None) -> Optional[str]:
+    """Local path of an Appwrite audio file, downloading it into the cache if needed.
+
+    Returns None on failure. The path belongs to the cache: read it, don't
+    delete it.
     """
     if not file_id:
         logger.debug("No file_id supplied for download; skipping.")
@@ -68,13 +106,17 @@ def download_audio_to_temp(file_id: str) -> Optional[str]:
     if not is_appwrite_storage_enabled():
         logger.debug("Appwrite storage disabled; cannot download %s", file_id)
         return None
-    try:
-        content = _client().download_file(config.APPWRITE_BUCKET_VOICE_NOTES, file_id)
-        fd, path = tempfile.mkstemp(prefix="appwrite-audio-", suffix=".tmp")
-        os.close(fd)
-        with open(path, "wb") as f:
-            f.write(content)
-        return path
-    except Exception as e:
-        logger.error("Failed to download Appwrite audio %s: %s", file_id, e, exc_info=True)
+    return AUDIO_CACHE.fetch(file_id, _download_to, sha256)
+
+
+def lookup_cached_audio(file_id: Optional[str], sha256: Optional[str] = None) -> Optional[str]:
+    """Cached path of an Appwrite audio file, without downloading."""
+    if not file_id:
         return None
+    return AUDIO_CACHE.lookup(file_id, sha256)
+
+
+def prefetch_audio(file_id: Optional[str], sha256: Optional[str] = None) -> None:
+    """Fill the cache for `file_id` in the background."""
+    if file_id and is_appwrite_storage_enabled():
+        _PREFETCH.submit(cached_audio_path, file_id, sha256)
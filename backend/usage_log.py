@@ -1,7 +1,40 @@
+"""
+Local usage telemetry: daily JSONL event logs plus weekly aggregate snapshots.
+
+`log_usage` sits on the transcription/narrative hot paths, so it only stamps
+the event and appends it to an in-memory queue (a deque append is atomic, so
+callers never take a lock). A daemon flusher thread drains the queue every
+`USAGE_FLUSH_INTERVAL_SECONDS`, appends the batch to the daily files in one
+write per day and folds the counts into the weekly snapshot, which is kept in
+memory and rewritten once per flush instead of once per event. The snapshot
+is re-read whenever its file changed since this process last wrote it, under
+an advisory file lock, so several worker processes add to the same totals
+instead of overwriting each other's. Each flushed batch is also folded into
+the hourly/daily rollups in `usage_rollups`. Pipeline stage timings
+(`log_stage`) are counted separately from provider calls. Call `flush()` on
+shutdown so buffered events are not lost.
+"""
+
 import os
 import json
+import atexit
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+import config
+import usage_rollups
+
+logger = logging.getLogger(__name__)
 
 # Usage directory within backend
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,6 +42,34 @@ USAGE_DIR = os.path.join(BASE_DIR, "usage")
 
 OPENAI_LABEL = "openai"
 
+# Pending events; appended by any thread, drained only under _FLUSH_LOCK
+_PENDING: deque = deque()
+# A failed flush puts its batch back for the next tick; beyond this many
+# buffered events the oldest are dropped so a dead disk can't exhaust memory
+MAX_PENDING_EVENTS = 50_000
+# Weekly snapshots keyed by path -> (file stamp when last read/written, data);
+# mutated only while flushing
+_WEEKLY_CACHE: dict[str, tuple] = {}
+_FLUSH_LOCK = threading.Lock()
+_FLUSHER: Optional[threading.Thread] = None
+_FLUSHER_STOP = threading.Event()
+_FLUSHER_LOCK = threading.Lock()
+
+# Numeric fields a usage record may carry in addition to its dimensions
+METRIC_FIELDS = (
+    "duration_ms",
+    "attempt",
+    "bytes_sent",
+    "audio_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+)
+
+# Per-call attribution (event name, attempt, payload size...) set by callers
+# around provider invocations; asyncio.to_thread copies it into worker threads.
+_CALL_CONTEXT: contextvars.ContextVar[dict] = contextvars.ContextVar("usage_call_context", default={})
+
+
 def ensure_usage_paths():
     if not os.path.exists(USAGE_DIR):
         os.makedirs(USAGE_DIR, exist_ok=True)
@@ -25,6 +86,18 @@ def _daily_path(dt: Optional[datetime] = None) -> str:
         open(path, "a").close()
     return path
 
+def _empty_weekly(dt: datetime) -> dict:
+    year, week, _ = dt.isocalendar()
+    return {
+        "year": year,
+        "iso_week": week,
+        "updated_at": dt.isoformat(),
+        "totals": {"events": 0},
+        "providers": {},
+        "events": {},
+        "models": {},
+    }
+
 def _weekly_path(dt: Optional[datetime] = None) -> str:
     dt = dt or datetime.utcnow()
     year, week, _ = dt.isocalendar()
@@ -32,15 +105,7 @@ def _weekly_path(dt: Optional[datetime] = None) -> str:
     path = os.path.join(USAGE_DIR, fname)
     if not os.path.exists(path):
         with open(path, "w") as f:
-            json.dump({
-                "year": year,
-                "iso_week": week,
-                "updated_at": dt.isoformat(),
-                "totals": {"events": 0},
-                "providers": {},
-                "events": {},
-                "models": {},
-            }, f)
+            json.dump(_empty_weekly(dt), f)
     return path
 
 def key_label_from_index(index: int, keys: list[str]) -> str:
@@ -52,56 +117,221 @@ def key_label_from_index(index: int, keys: list[str]) -> str:
     suffix = key[-4:] if key else "????"
     return f"gemini_key_{index}_{suffix}"
 
-def _append_daily(event: dict):
-    ensure_usage_paths()
-    path = _daily_path()
-    event_ts = event.get("timestamp") or datetime.utcnow().isoformat()
-    event["timestamp"] = event_ts
-    with open(path, "a") as f:
-        f.write(json.dumps(event) + "\n")
-
-def _update_weekly(event: dict):
-    ensure_usage_paths()
-    path = _weekly_path()
+def _event_datetime(event: dict) -> datetime:
+    try:
+        return datetime.fromisoformat(str(event.get("timestamp")))
+    except Exception:
+        return datetime.utcnow()
+
+def _append_daily(events: list[dict]):
+    by_path: dict[str, list[str]] = {}
+    for event in events:
+        path = _daily_path(_event_datetime(event))
+        by_path.setdefault(path, []).append(json.dumps(event) + "\n")
+    for path, lines in by_path.items():
+        with open(path, "a") as f:
+            f.write("".join(lines))
+
+def _file_stamp(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _load_weekly(path: str, dt: datetime) -> dict:
+    """The snapshot at `path`, re-read if another process rewrote it."""
+    stamp = _file_stamp(path)
+    cached = _WEEKLY_CACHE.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
     try:
         with open(path, "r") as f:
             data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("weekly snapshot is not an object")
     except Exception:
-        data = {
-            "year": datetime.utcnow().year,
-            "iso_week": datetime.utcnow().isocalendar()[1],
-            "updated_at": datetime.utcnow().isoformat(),
-            "totals": {"events": 0},
-            "providers": {},
-            "events": {},
-            "models": {},
-        }
+        data = _empty_weekly(dt)
+    _WEEKLY_CACHE[path] = (stamp, data)
+    return data
 
+@contextmanager
+def _weekly_file_lock(path: str) -> Iterator[None]:
+    """Serialize read-modify-write of a weekly snapshot across processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(os.path.dirname(path), ".weekly.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _update_weekly(events: list[dict]):
     def inc(obj: dict, key: str, amt: int = 1):
         obj[key] = int(obj.get(key, 0)) + amt
 
-    data["totals"]["events"] = int(data.get("totals", {}).get("events", 0)) + 1
-    provider = event.get("provider", "unknown")
-    model = event.get("model", "unknown")
-    etype = event.get("event", "unknown")
-    inc(data.setdefault("providers", {}), provider)
-    inc(data.setdefault("events", {}), etype)
-    inc(data.setdefault("models", {}), model)
-    data["updated_at"] = datetime.utcnow().isoformat()
-
-    tmp_path = path + ".tmp"
-    with open(tmp_path, "w") as f:
-        json.dump(data, f)
-    os.replace(tmp_path, path)
-
-def log_usage(event: str, provider: str, model: str, key_label: str, status: str = "success"):
-    record = {
+    by_path: dict[str, list[dict]] = {}
+    first_seen: dict[str, datetime] = {}
+    for event in events:
+        dt = _event_datetime(event)
+        path = _weekly_path(dt)
+        by_path.setdefault(path, []).append(event)
+        first_seen.setdefault(path, dt)
+
+    now = datetime.utcnow().isoformat()
+    for path, path_events in by_path.items():
+        with _weekly_file_lock(path):
+            data = _load_weekly(path, first_seen[path])
+            for event in path_events:
+                if usage_rollups.is_stage(event):
+                    inc(data.setdefault("stages", {}), event.get("event", "unknown"))
+                    continue
+                totals = data.setdefault("totals", {})
+                totals["events"] = int(totals.get("events", 0)) + 1
+                inc(data.setdefault("providers", {}), event.get("provider", "unknown"))
+                inc(data.setdefault("events", {}), event.get("event", "unknown"))
+                inc(data.setdefault("models", {}), event.get("model", "unknown"))
+            data["updated_at"] = now
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            _WEEKLY_CACHE[path] = (_file_stamp(path), data)
+    # Only the current week keeps receiving events; drop older snapshots
+    current = _weekly_path()
+    for path in [p for p in _WEEKLY_CACHE if p != current and p not in by_path]:
+        _WEEKLY_CACHE.pop(path, None)
+
+def _requeue(batch: list[dict]):
+    """Put a batch that failed to write back at the front of the queue."""
+    _PENDING.extendleft(reversed(batch))
+    overflow = len(_PENDING) - MAX_PENDING_EVENTS
+    if overflow > 0:
+        for _ in range(overflow):
+            _PENDING.popleft()
+        logger.warning("Usage buffer full; dropped %s oldest events", overflow)
+
+def flush() -> int:
+    """Write all buffered events to disk. Returns the number of events flushed."""
+    with _FLUSH_LOCK:
+        batch: list[dict] = []
+        while True:
+            try:
+                batch.append(_PENDING.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return 0
+        try:
+            os.makedirs(USAGE_DIR, exist_ok=True)
+            _append_daily(batch)
+        except Exception as e:
+            _requeue(batch)
+            logger.warning("Usage flush failed for %s events, will retry: %s", len(batch), e)
+            return 0
+        try:
+            _update_weekly(batch)
+        except Exception as e:
+            # The daily lines are written; retrying would duplicate them
+            logger.warning("Weekly usage snapshot update failed for %s events: %s", len(batch), e)
+        try:
+            usage_rollups.apply_events(USAGE_DIR, batch)
+        except Exception as e:
+            logger.warning("Usage rollup update failed for %s events: %s", len(batch), e)
+        return len(batch)
+
+def ensure_rollups() -> int:
+    """Build the SQLite rollups from the daily files unless already rebuilt."""
+    with _FLUSH_LOCK:
+        try:
+            return usage_rollups.rebuild_from_daily_files(USAGE_DIR)
+        except Exception as e:
+            logger.warning("Usage rollup rebuild failed: %s", e)
+            return 0
+
+def _flusher_loop():
+    interval = max(0.1, float(getattr(config, "USAGE_FLUSH_INTERVAL_SECONDS", 5.0)))
+    while not _FLUSHER_STOP.wait(interval):
+        flush()
+    flush()
+
+def start_flusher():
+    """Start the background flusher thread (idempotent)."""
+    global _FLUSHER
+    if _FLUSHER is not None and _FLUSHER.is_alive():
+        return
+    with _FLUSHER_LOCK:
+        if _FLUSHER is not None and _FLUSHER.is_alive():
+            return
+        _FLUSHER_STOP.clear()
+        _FLUSHER = threading.Thread(target=_flusher_loop, name="usage-flusher", daemon=True)
+        _FLUSHER.start()
+
+def stop_flusher(timeout: float = 5.0):
+    """Stop the flusher thread and write out anything still buffered."""
+    global _FLUSHER
+    _FLUSHER_STOP.set()
+    thread = _FLUSHER
+    if thread is not None and thread.is_alive():
+        thread.join(timeout)
+    _FLUSHER = None
+    flush()
+
+atexit.register(flush)
+
+@contextmanager
+def call_context(**fields: Any) -> Iterator[dict]:
+    """Attribute provider calls made inside the block (e.g. event="title", attempt=2).
+
+    Nested contexts inherit and override the outer fields.
+    """
+    merged = {**_CALL_CONTEXT.get(), **{k: v for k, v in fields.items() if v is not None}}
+    token = _CALL_CONTEXT.set(merged)
+    try:
+        yield merged
+    finally:
+        _CALL_CONTEXT.reset(token)
+
+def current_call_context() -> dict:
+    return dict(_CALL_CONTEXT.get())
+
+def _enqueue(record: dict, metrics: dict):
+    for name in METRIC_FIELDS:
+        value = metrics.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            record[name] = value
+    _PENDING.append(record)
+    start_flusher()
+
+def log_usage(
+    event: str,
+    provider: str,
+    model: str,
+    key_label: str,
+    status: str = "success",
+    **metrics: Any,
+):
+    _enqueue({
         "event": event,
         "provider": provider,
         "model": model,
         "key": key_label,
         "status": status,
-    }
-    _append_daily(record)
-    _update_weekly(record)
+        "timestamp": datetime.utcnow().isoformat(),
+    }, metrics)
 
+def log_stage(stage: str, status: str = "success", **metrics: Any):
+    """Record the end-to-end timing of an internal pipeline stage.
+
+    Stage records go to the daily files like provider calls but are kept out
+    of the provider counts and rollups; they feed their own latency histogram
+    (`usage_rollups.stage_latency`).
+    """
+    _enqueue({
+        "kind": usage_rollups.STAGE_KIND,
+        "event": stage,
+        "status": status,
+        "timestamp": datetime.utcnow().isoformat(),
+    }, metrics)
@@ -0,0 +1,473 @@
+"""
+Pre-aggregated usage rollups stored in SQLite.
+
+Every flushed usage event increments one row in the hourly table and one row
+in the daily table, keyed by (bucket, event, provider, model, key, status),
+and adds its metrics (wall time, tokens, bytes, audio seconds) to per-row
+sums. Events carrying `duration_ms` also land in a fixed-bound latency
+histogram per day, from which percentiles are estimated at query time.
+Pipeline stage records (`kind == "stage"`) are not provider calls: they skip
+the usage tables and only feed a per-stage latency histogram.
+Queries therefore scan at most one row per bucket and dimension combination,
+which keeps months of history answerable in milliseconds without touching the
+raw `daily-*.jsonl` files.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DB_FILENAME = "rollups.sqlite3"
+DIMENSIONS = ("event", "provider", "model", "key", "status")
+BUCKETS = ("hour", "day", "week", "month", "total")
+# Metric name -> SQL column holding its per-bucket sum
+SUM_COLUMNS = {
+    "duration_ms": "duration_ms_sum",
+    "prompt_tokens": "prompt_tokens_sum",
+    "completion_tokens": "completion_tokens_sum",
+    "bytes_sent": "bytes_sent_sum",
+    "audio_seconds": "audio_seconds_sum",
+}
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BOUNDS_MS = (
+    10, 25, 50, 100, 250, 500, 750, 1000, 1500, 2500, 5000, 7500,
+    10000, 15000, 30000, 60000, 120000, 300000,
+)
+
+STAGE_KIND = "stage"
+
+_TABLES = {"hour": "usage_hourly", "day": "usage_daily"}
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket TEXT NOT NULL,
+    event TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    duration_ms_sum REAL NOT NULL DEFAULT 0,
+    prompt_tokens_sum INTEGER NOT NULL DEFAULT 0,
+    completion_tokens_sum INTEGER NOT NULL DEFAULT 0,
+    bytes_sent_sum INTEGER NOT NULL DEFAULT 0,
+    audio_seconds_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, event, provider, model, key, status)
+) WITHOUT ROWID
+"""
+_LATENCY_TABLE = "usage_latency_daily"
+_LATENCY_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {_LATENCY_TABLE} (
+    bucket TEXT NOT NULL,
+    event TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    key TEXT NOT NULL,
+    le INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, event, provider, model, key, le)
+) WITHOUT ROWID
+"""
+_STAGE_LATENCY_TABLE = "usage_stage_latency_daily"
+_STAGE_LATENCY_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {_STAGE_LATENCY_TABLE} (
+    bucket TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    le INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, stage, status, le)
+) WITHOUT ROWID
+"""
+
+
+# Bookkeeping rows; "rebuilt" is set once the daily files have been replayed
+_META_TABLE = "rollup_meta"
+_META_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {_META_TABLE} (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID
+"""
+_REBUILT_MARKER = "rebuilt"
+# Events per replayed chunk while rebuilding from the daily files
+REBUILD_BATCH_EVENTS = 5000
+
+
+def db_path(usage_dir: str) -> str:
+    return os.path.join(usage_dir, DB_FILENAME)
+
+
+# Database paths whose schema has been created/migrated by this process
+_SCHEMA_READY: set = set()
+_SCHEMA_LOCK = threading.Lock()
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    # WAL mode is persistent in the database file, so it only needs setting once
+    conn.execute("PRAGMA journal_mode=WAL")
+    for table in _TABLES.values():
+        conn.execute(_SCHEMA.format(table=table))
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column in SUM_COLUMNS.values():
+            if column not in existing:
+                kind = "REAL" if column in ("duration_ms_sum", "audio_seconds_sum") else "INTEGER"
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind} NOT NULL DEFAULT 0")
+    conn.execute(_LATENCY_SCHEMA)
+    conn.execute(_STAGE_LATENCY_SCHEMA)
+    conn.execute(_META_SCHEMA)
+
+
+def _connect(usage_dir: str) -> sqlite3.Connection:
+    path = db_path(usage_dir)
+    # Re-run the setup if the file was removed since (e.g. to force a rebuild)
+    ready = path in _SCHEMA_READY and os.path.exists(path)
+    if not ready:
+        os.makedirs(usage_dir, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if not ready:
+        with _SCHEMA_LOCK:
+            _ensure_schema(conn)
+            _SCHEMA_READY.add(path)
+    return conn
+
+
+def _event_time(event: Dict[str, Any]) -> datetime:
+    try:
+        return datetime.fromisoformat(str(event.get("timestamp")))
+    except Exception:
+        return datetime.utcnow()
+
+
+def hour_bucket(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:00")
+
+
+def day_bucket(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%d")
+
+
+def is_stage(event: Dict[str, Any]) -> bool:
+    # Older daily files logged stages as provider "pipeline"
+    return event.get("kind") == STAGE_KIND or event.get("provider") == "pipeline"
+
+
+def _dims(event: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(event.get(d) or "unknown") for d in DIMENSIONS)
+
+
+def latency_bucket(duration_ms: float) -> int:
+    """Return the histogram upper bound for a duration; -1 means above the last bound."""
+    for bound in LATENCY_BOUNDS_MS:
+        if duration_ms <= bound:
+            return bound
+    return -1
+
+
+def _metric(event: Dict[str, Any], name: str) -> float:
+    value = event.get(name)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return 0
+
+
+def apply_events(usage_dir: str, events: Iterable[Dict[str, Any]]) -> None:
+    """Fold a batch of usage events into the hourly/daily rollups and histograms."""
+    with closing(_connect(usage_dir)) as conn, conn:
+        _apply_events(conn, events)
+
+
+def _apply_events(conn: sqlite3.Connection, events: Iterable[Dict[str, Any]]) -> None:
+    hourly: Dict[Tuple[str, ...], List[float]] = {}
+    daily: Dict[Tuple[str, ...], List[float]] = {}
+    latency: Dict[Tuple[Any, ...], int] = {}
+    stages: Dict[Tuple[str, str, str, int], int] = {}
+    metric_names = list(SUM_COLUMNS)
+    for event in events:
+        dt = _event_time(event)
+        if is_stage(event):
+            duration = event.get("duration_ms")
+            if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+                sk = (day_bucket(dt), str(event.get("event") or "unknown"),
+                      str(event.get("status") or "unknown"), latency_bucket(float(duration)))
+                stages[sk] = stages.get(sk, 0) + 1
+            continue
+        dims = _dims(event)
+        values = [1] + [_metric(event, name) for name in metric_names]
+        for rows, key in ((hourly, (hour_bucket(dt),) + dims), (daily, (day_bucket(dt),) + dims)):
+            acc = rows.get(key)
+            if acc is None:
+                rows[key] = list(values)
+            else:
+                for idx, value in enumerate(values):
+                    acc[idx] += value
+        duration = event.get("duration_ms")
+        if isinstance(duration, (int, float)) and not isinstance(duration, bool):
+            # Histograms are per call identity; status is kept out so errors and
+            # successes of the same key share one latency distribution.
+            lk = (day_bucket(dt),) + dims[:4] + (latency_bucket(float(duration)),)
+            latency[lk] = latency.get(lk, 0) + 1
+    if not hourly and not stages:
+        return
+    sum_cols = list(SUM_COLUMNS.values())
+    insert_cols = ", ".join(["bucket", *DIMENSIONS, "count", *sum_cols])
+    placeholders = ", ".join("?" for _ in range(1 + len(DIMENSIONS) + 1 + len(sum_cols)))
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in ["count", *sum_cols])
+    for table, rows in ((_TABLES["hour"], hourly), (_TABLES["day"], daily)):
+        conn.executemany(
+            f"INSERT INTO {table} ({insert_cols}) VALUES ({placeholders}) "
+            "ON CONFLICT (bucket, event, provider, model, key, status) "
+            f"DO UPDATE SET {updates}",
+            [k + tuple(v) for k, v in rows.items()],
+        )
+    if latency:
+        conn.executemany(
+            f"INSERT INTO {_LATENCY_TABLE} (bucket, event, provider, model, key, le, count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (bucket, event, provider, model, key, le) "
+            "DO UPDATE SET count = count + excluded.count",
+            [k + (v,) for k, v in latency.items()],
+        )
+    if stages:
+        conn.executemany(
+            f"INSERT INTO {_STAGE_LATENCY_TABLE} (bucket, stage, status, le, count) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (bucket, stage, status, le) "
+            "DO UPDATE SET count = count + excluded.count",
+            [k + (v,) for k, v in stages.items()],
+        )
+
+
+def rebuild_from_daily_files(usage_dir: str) -> int:
+    """Replay the daily JSONL files into the rollups unless that already happened.
+
+    Completion is recorded by a marker row written in the same transaction as
+    the replay, so a rebuild cut short (or a database created by an early
+    flush) is redone from scratch on the next start. The daily files hold
+    every flushed event, so clearing the tables first never loses counts.
+    Returns the number of events replayed (0 when already rebuilt).
+    """
+    with closing(_connect(usage_dir)) as conn, conn:
+        done = conn.execute(
+            f"SELECT 1 FROM {_META_TABLE} WHERE name = ?", (_REBUILT_MARKER,)
+        ).fetchone()
+        if done:
+            return 0
+        for table in (*_TABLES.values(), _LATENCY_TABLE, _STAGE_LATENCY_TABLE):
+            conn.execute(f"DELETE FROM {table}")
+        replayed = 0
+        batch: List[Dict[str, Any]] = []
+        for path in sorted(glob.glob(os.path.join(usage_dir, "daily-*.jsonl"))):
+            try:
+                with open(path, "r") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            batch.append(json.loads(line))
+                        except Exception:
+                            continue
+            except OSError:
+                continue
+            if len(batch) >= REBUILD_BATCH_EVENTS:
+                _apply_events(conn, batch)
+                replayed += len(batch)
+                batch = []
+        if batch:
+            _apply_events(conn, batch)
+            replayed += len(batch)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {_META_TABLE} (name, value) VALUES (?, ?)",
+            (_REBUILT_MARKER, datetime.utcnow().isoformat()),
+        )
+    return replayed
+
+
+def _bucket_expr(bucket: str) -> str:
+    if bucket in ("hour", "day"):
+        return "bucket"
+    if bucket == "week":
+        # ISO weeks start on Monday
+        return "date(bucket, '-6 days', 'weekday 1')"
+    if bucket == "month":
+        return "substr(bucket, 1, 7)"
+    return "'total'"
+
+
+def query(
+    usage_dir: str,
+    start: datetime,
+    end: datetime,
+    bucket: str = "day",
+    group_by: Sequence[str] = (),
+    filters: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Any]]:
+    """Return `{bucket, <group_by...>, count, <metric sums>}` rows for [start, end]."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+    unknown = [g for g in group_by if g not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unsupported group_by: {', '.join(unknown)}")
+    if not os.path.exists(db_path(usage_dir)):
+        return []
+
+    if bucket == "hour":
+        table = _TABLES["hour"]
+        lo, hi = hour_bucket(start), hour_bucket(end)
+    else:
+        table = _TABLES["day"]
+        lo, hi = day_bucket(start), day_bucket(end)
+
+    where = ["bucket >= ?", "bucket <= ?"]
+    params: List[Any] = [lo, hi]
+    for dim, value in (filters or {}).items():
+        if dim not in DIMENSIONS or value in (None, ""):
+            continue
+        where.append(f"{dim} = ?")
+        params.append(value)
+
+    bucket_sql = _bucket_expr(bucket)
+    cols = [f"{bucket_sql} AS b"] + list(group_by)
+    group_cols = ["b"] + list(group_by)
+    sql = (
+        f"SELECT {', '.join(cols)}, {', '.join(f'SUM({c})' for c in SUM_COLUMNS.values())}, SUM(count) FROM {table} "
+        f"WHERE {' AND '.join(where)} "
+        f"GROUP BY {', '.join(group_cols)} ORDER BY {', '.join(group_cols)}"
+    )
+    with closing(_connect(usage_dir)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    out: List[Dict[str, Any]] = []
+    for row in rows:
+        item: Dict[str, Any] = {"bucket": row[0]}
+        for idx, dim in enumerate(group_by, start=1):
+            item[dim] = row[idx]
+        item["count"] = int(row[-1] or 0)
+        sums = row[1 + len(group_by):-1]
+        for name, value in zip(SUM_COLUMNS, sums):
+            item[name] = round(value or 0, 2) if isinstance(value, float) else int(value or 0)
+        out.append(item)
+    return out
+
+
+def _percentile(histogram: Sequence[Tuple[int, int]], total: int, q: float) -> Optional[float]:
+    """Estimate a percentile by interpolating inside the matching histogram bucket."""
+    if total <= 0:
+        return None
+    rank = q * total
+    seen = 0
+    for le, count in histogram:
+        if count and seen + count >= rank:
+            if le < 0:
+                return float(LATENCY_BOUNDS_MS[-1])
+            idx = LATENCY_BOUNDS_MS.index(le)
+            lower = float(LATENCY_BOUNDS_MS[idx - 1]) if idx > 0 else 0.0
+            fraction = (rank - seen) / count
+            return round(lower + (le - lower) * fraction, 1)
+        seen += count
+    return float(LATENCY_BOUNDS_MS[-1])
+
+
+def latency(
+    usage_dir: str,
+    start: datetime,
+    end: datetime,
+    group_by: Sequence[str] = ("event", "provider", "model", "key"),
+    filters: Optional[Dict[str, str]] = None,
+) -> List[Dict[str, Any]]:
+    """Return latency histograms with p50/p90/p95/p99 estimates per group."""
+    allowed = DIMENSIONS[:4]
+    unknown = [g for g in group_by if g not in allowed]
+    if unknown:
+        raise ValueError(f"Unsupported group_by: {', '.join(unknown)}")
+    if not os.path.exists(db_path(usage_dir)):
+        return []
+    where = ["bucket >= ?", "bucket <= ?"]
+    params: List[Any] = [day_bucket(start), day_bucket(end)]
+    for dim, value in (filters or {}).items():
+        if dim not in allowed or value in (None, ""):
+            continue
+        where.append(f"{dim} = ?")
+        params.append(value)
+    group_cols = list(group_by)
+    select_cols = ", ".join(group_cols + ["le", "SUM(count)"])
+    sql = (
+        f"SELECT {select_cols} FROM {_LATENCY_TABLE} WHERE {' AND '.join(where)} "
+        f"GROUP BY {', '.join(group_cols + ['le'])}"
+    )
+    with closing(_connect(usage_dir)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    groups: Dict[Tuple[Any, ...], Dict[int, int]] = {}
+    for row in rows:
+        key = tuple(row[: len(group_cols)])
+        le, count = int(row[-2]), int(row[-1] or 0)
+        bucket_counts = groups.setdefault(key, {})
+        bucket_counts[le] = bucket_counts.get(le, 0) + count
+
+    return _summarize(group_cols, groups)
+
+
+def _summarize(group_cols: Sequence[str], groups: Dict[Tuple[Any, ...], Dict[int, int]]) -> List[Dict[str, Any]]:
+    def order(le: int) -> int:
+        return le if le >= 0 else LATENCY_BOUNDS_MS[-1] + 1
+
+    out: List[Dict[str, Any]] = []
+    for key, counts in sorted(groups.items(), key=lambda kv: tuple(str(x) for x in kv[0])):
+        histogram = sorted(counts.items(), key=lambda kv: order(kv[0]))
+        total = sum(c for _, c in histogram)
+        item: Dict[str, Any] = dict(zip(group_cols, key))
+        item["count"] = total
+        for label, q in (("p50_ms", 0.5), ("p90_ms", 0.9), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            item[label] = _percentile(histogram, total, q)
+        item["histogram"] = [
+            {"le": le if le >= 0 else None, "count": c} for le, c in histogram
+        ]
+        out.append(item)
+    return out
+
+
+def stage_latency(
+    usage_dir: str,
+    start: datetime,
+    end: datetime,
+    group_by: Sequence[str] = ("stage",),
+    stage: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Latency histograms for pipeline stages, grouped by stage and/or status."""
+    allowed = ("stage", "status")
+    unknown = [g for g in group_by if g not in allowed]
+    if unknown:
+        raise ValueError(f"Unsupported group_by: {', '.join(unknown)}")
+    if not os.path.exists(db_path(usage_dir)):
+        return []
+    where = ["bucket >= ?", "bucket <= ?"]
+    params: List[Any] = [day_bucket(start), day_bucket(end)]
+    if stage:
+        where.append("stage = ?")
+        params.append(stage)
+    group_cols = list(group_by)
+    sql = (
+        f"SELECT {', '.join(group_cols + ['le', 'SUM(count)'])} FROM {_STAGE_LATENCY_TABLE} "
+        f"WHERE {' AND '.join(where)} GROUP BY {', '.join(group_cols + ['le'])}"
+    )
+    with closing(_connect(usage_dir)) as conn:
+        rows = conn.execute(sql, params).fetchall()
+    groups: Dict[Tuple[Any, ...], Dict[int, int]] = {}
+    for row in rows:
+        key = tuple(row[: len(group_cols)])
+        le, count = int(row[-2]), int(row[-1] or 0)
+        bucket_counts = groups.setdefault(key, {})
+        bucket_counts[le] = bucket_counts.get(le, 0) + count
+    return _summarize(group_cols, groups)
+
+
+def default_window(days: int = 7) -> Tuple[datetime, datetime]:
+    end = datetime.utcnow()
+    return end - timedelta(days=days), end
@@ -52,6 +52,8 @@ async def on_startup():
     # titles directory is deprecated; we will migrate any leftover files below
     # Ensure usage logging directory/files exist
     usage.ensure_usage_paths()
+    usage.ensure_rollups()
+    usage.start_flusher()
     
     print("Checking for missing transcriptions...")
     # Legacy consolidation disabled: only JSON is considered
@@ -137,20 +139,18 @@ async def on_startup():
                         "Output only the title on a single line.\n\n" + text
                     )}])
                     try:
-                        resp, _ = await asyncio.to_thread(providers.invoke_google, [msg])
+                        with usage.call_context(event="title_backfill"):
+                            resp, _ = await asyncio.to_thread(providers.invoke_google, [msg])
                         title = providers.normalize_title_output(getattr(resp, 'content', ''))
                     except Exception:
                         try:
-                            title = providers.title_with_openai(text)
+                            with usage.call_context(event="title_backfill", fallback=True):
+                                title = providers.title_with_openai(text)
                         except Exception:
                             title = base
                     data['title'] = title or base
                 # persist update
                 save_note_json(base, data)
-                try:
-                    usage.log_usage(event="title_backfill", provider="auto", model="n/a", key_label="n/a", status="success")
-                except Exception:
-                    pass
             except Exception:
                 # ignore failures
                 return
@@ -7,23 +7,94 @@ async function j<T>(res: Response): Promise<T> {
   return (await res.json()) as T;
 }
 
+// Change sequence of the last full listing; the cursor for getNoteChanges()
+let notesSeq: number | null = null;
+
+export type NoteChanges = { seq: number; reset: boolean; upserts: Note[]; deleted: string[]; more: boolean };
+// Interleaved int8 [min0, max0, min1, max1, ...] waveform pairs
+export type NotePeaks = { version: number; bins: number; duration_seconds: number | null; peaks: number[] };
+
+// Recordings above this size go through the resumable upload API (/api/uploads)
+const RESUMABLE_MIN_BYTES = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_BYTES = 4 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 8;
+// Hashing needs the whole file in memory; above this the server-side size check suffices
+const UPLOAD_HASH_MAX_BYTES = 256 * 1024 * 1024;
+
+async function sha256Hex(blob: Blob): Promise<string | undefined> {
+  if (!globalThis.crypto?.subtle || blob.size > UPLOAD_HASH_MAX_BYTES) return undefined;
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Upload in chunks at explicit offsets; after a failure ask the server how far
+// it got and continue from there instead of starting over.
+async function uploadResumable(blob: Blob, name: string, folder?: string): Promise<{ filename: string }> {
+  const init = await fetch(`${BACKEND_URL}/api/uploads`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: name, size: blob.size, content_type: blob.type || undefined, sha256: await sha256Hex(blob), folder }),
+  });
+  const { upload_id } = await j<{ upload_id: string }>(init);
+  const url = `${BACKEND_URL}/api/uploads/${upload_id}`;
+  let offset = 0;
+  let failures = 0;
+  while (offset < blob.size) {
+    try {
+      const res = await fetch(`${url}?offset=${offset}`, { method: 'PUT', body: blob.slice(offset, offset + UPLOAD_CHUNK_BYTES) });
+      if (!res.ok && res.status !== 409) throw new Error(`${res.status} ${res.statusText}`);
+      offset = Number(res.headers.get('Upload-Offset') ?? offset);
+      failures = 0;
+    } catch (err) {
+      if (++failures > UPLOAD_MAX_RETRIES) throw err;
+      dbg('api:upload retry', upload_id, offset, String(err));
+      await new Promise((r) => setTimeout(r, Math.min(30_000, 500 * 2 ** failures)));
+      try {
+        offset = (await j<{ offset: number }>(await fetch(url))).offset;
+      } catch {}
+    }
+  }
+  const res = await fetch(`${url}/finalize`, { method: 'POST' });
+  return j<{ filename: string }>(res);
+}
+
 export const api = {
   // Notes
   async getNotes(): Promise<Note[]> {
     const res = await fetch(`${BACKEND_URL}/api/notes`);
+    const seq = res.headers.get('X-Notes-Seq');
     const data = await j<Note[]>(res);
+    if (seq) notesSeq = Number(seq);
     dbg('api:getNotes', Array.isArray(data) ? data.length : 'n/a');
     return data;
   },
+  notesSeq(): number | null {
+    return notesSeq;
+  },
+  async getNoteChanges(since: number): Promise<NoteChanges> {
+    const res = await fetch(`${BACKEND_URL}/api/notes/changes?since=${since}`);
+    const data = await j<NoteChanges>(res);
+    if (!data.reset) notesSeq = data.seq;
+    return data;
+  },
+  // build=false answers 404 instead of decoding audio that has no peaks yet
+  async getPeaks(filename: string, build = true): Promise<NotePeaks> {
+    const query = build ? '' : '?build=0';
+    const res = await fetch(`${BACKEND_URL}/api/notes/${encodeURIComponent(filename)}/peaks${query}`);
+    return j<NotePeaks>(res);
+  },
   async deleteNote(filename: string): Promise<void> {
     const res = await fetch(`${BACKEND_URL}/api/notes/${encodeURIComponent(filename)}`, { method: 'DELETE' });
     if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
   },
   async uploadNote(fileOrBlob: File | Blob, folder?: string): Promise<{ filename: string }> {
+    const name = (fileOrBlob as File).name || 'recording.wav';
+    const target = folder && folder !== '__ALL__' && folder !== '__UNFILED__' ? folder : undefined;
+    if (fileOrBlob.size >= RESUMABLE_MIN_BYTES) return uploadResumable(fileOrBlob, name, target);
     const formData = new FormData();
-    formData.append('file', fileOrBlob, (fileOrBlob as File).name || 'recording.wav');
-    if (folder && folder !== '__ALL__' && folder !== '__UNFILED__') {
-      formData.append('folder', folder);
+    formData.append('file', fileOrBlob, name);
+    if (target) {
+      formData.append('folder', target);
     }
     const res = await fetch(`${BACKEND_URL}/api/notes`, { method: 'POST', body: formData });
     return j<{ filename: string }>(res);
@@ -36,6 +107,14 @@ export const api = {
     });
     return j<{ filename: string }>(res);
   },
+  async bulkNotes(payload: { ids: string[]; op: 'move' | 'set_tags' | 'add_tag' | 'remove_tag' | 'delete'; folder?: string; tags?: { label: string; color?: string }[]; tag?: { label: string; color?: string } }): Promise<{ op: string; results: { id: string; ok: boolean; error?: string }[]; succeeded: number; failed: number }> {
+    const res = await fetch(`${BACKEND_URL}/api/notes/bulk`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(payload),
+    });
+    return j(res);
+  },
   async patchNoteFolder(filename: string, folder: string): Promise<void> {
     const res = await fetch(`${BACKEND_URL}/api/notes/${encodeURIComponent(filename)}/folder`, {
       method: 'PATCH',
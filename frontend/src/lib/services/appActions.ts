@@ -15,18 +15,18 @@ export const appActions = {
     return api.deleteNote(filename);
   },
   async deleteNotes(filenames: string[]): Promise<void> {
-    const results = await Promise.allSettled(filenames.map((f) => api.deleteNote(f)));
-    const failures = results
-      .map((r, i) => ({ r, name: filenames[i] }))
-      .filter((x) => x.r.status === 'rejected') as { r: PromiseRejectedResult; name: string }[];
-    if (failures.length) {
-      console.error(`Failed to delete ${failures.length} of ${filenames.length} notes`, failures.map(f => ({ filename: f.name, reason: String(f.r.reason) })));
+    if (!filenames.length) return;
+    const { results, failed } = await api.bulkNotes({ ids: filenames, op: 'delete' });
+    if (failed) {
+      console.error(`Failed to delete ${failed} of ${filenames.length} notes`, results.filter((r) => !r.ok));
       // Optional: throw to allow caller to surface a UI error
-      // throw new Error(`Failed to delete: ${failures.map(f=>f.name).join(', ')}`);
+      // throw new Error(`Failed to delete ${failed} notes`);
     }
   },
   async moveNotesToFolder(filenames: string[], folder: string): Promise<void> {
-    await Promise.all(filenames.map((f) => api.patchNoteFolder(f, folder)));
+    if (!filenames.length) return;
+    const { failed } = await api.bulkNotes({ ids: filenames, op: 'move', folder });
+    if (failed) throw new Error(`Failed to move ${failed} of ${filenames.length} notes`);
   },
 
   // Folders
@@ -1,5 +1,6 @@
 import type { Note } from '$lib/types';
 import { BACKEND_URL } from '$lib/config';
+import { loadStoredPeaks } from '$lib/services/peaks';
 import { dbg } from '$lib/debug';
 
 function isAudioFilename(name: string): boolean {
@@ -21,7 +22,17 @@ export async function ensureDurations(
   }
 }
 
-function loadDurationFor(filename: string): Promise<number | null> {
+// The peaks sidecar carries the duration, so no audio is fetched for it. Notes
+// without one (older uploads until /peaks/backfill runs) read the audio metadata
+// instead of having the backend decode the whole file.
+async function loadDurationFor(filename: string): Promise<number | null> {
+  const peaks = await loadStoredPeaks(filename);
+  const dur = peaks?.duration_seconds;
+  if (typeof dur === 'number' && Number.isFinite(dur)) return dur;
+  return loadMetadataDuration(filename);
+}
+
+function loadMetadataDuration(filename: string): Promise<number | null> {
   return new Promise((resolve) => {
     try {
       const audio = new Audio();
@@ -37,7 +48,7 @@ function loadDurationFor(filename: string): Promise<number | null> {
         cleanup();
         resolve(Number.isFinite(dur) ? dur : null);
       };
-      audio.onerror = (e) => { cleanup(); dbg('durations:error', filename); resolve(null); };
+      audio.onerror = () => { cleanup(); dbg('durations:error', filename); resolve(null); };
     } catch (e) {
       dbg('durations:exception', filename, e);
       resolve(null);
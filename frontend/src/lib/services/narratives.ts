@@ -30,3 +30,51 @@ export async function generateNarrative(
   return { filename: fname };
 }
 
+// Streams POST /api/narratives/generate/stream (SSE over fetch, since EventSource
+// can't POST). `onText` receives the narrative as it is written; resolves with
+// the saved filename once the server reports `done`.
+export async function generateNarrativeStream(
+  items: { filename: string }[],
+  opts: GenerateOptions,
+  onText: (text: string) => void
+): Promise<{ filename: string | null }> {
+  const res = await fetch(`${BACKEND_URL}/api/narratives/generate/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({
+      items,
+      extra_text: opts.extra_text,
+      provider: opts.provider,
+      model: opts.model || undefined,
+      temperature: opts.temperature,
+      format_ids: opts.format_ids,
+    }),
+  });
+  if (!res.ok || !res.body) throw new Error('Failed to generate narrative');
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  let filename: string | null = null;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let sep: number;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'start') filename = payload.filename;
+      else if (event === 'token') onText(payload.text);
+      else if (event === 'error') throw new Error(payload.error || 'Failed to generate narrative');
+      else if (event === 'done') { reader.cancel().catch(() => {}); return { filename: payload.filename || filename }; }
+    }
+  }
+  throw new Error('Narrative stream ended early');
+}
@@ -0,0 +1,117 @@
+import { BACKEND_URL } from '$lib/config';
+import { api } from '$lib/api';
+import { dbg } from '$lib/debug';
+import { notes as notesStore } from '$lib/stores/notes';
+import { folderActions } from '$lib/stores/folders';
+import type { Note } from '$lib/types';
+
+// Server-Sent Events from GET /api/events. Each event carries the note's base id
+// and (except for deletes) the same fields GET /api/notes returns, so the list
+// is patched in place instead of being refetched.
+export type NoteEvent = { id: string; note?: Note };
+type Listener = (type: string, data: NoteEvent) => void;
+
+const NOTE_EVENT_TYPES = [
+  'note.created',
+  'note.transcribed',
+  'note.failed',
+  'note.classified',
+  'note.moved',
+  'note.updated',
+  'note.deleted',
+];
+const FOLDER_EVENT_TYPES = new Set(['note.created', 'note.moved', 'note.deleted']);
+
+let source: EventSource | null = null;
+let foldersTimer: ReturnType<typeof setTimeout> | null = null;
+const listeners = new Set<Listener>();
+
+function baseId(filename: string): string {
+  return filename.replace(/\.[^.]+$/, '');
+}
+
+function applyNoteEvent(type: string, data: NoteEvent) {
+  notesStore.update((list) => {
+    const idx = list.findIndex((n) => baseId(n.filename) === data.id);
+    if (type === 'note.deleted') return idx === -1 ? list : list.filter((_, i) => i !== idx);
+    if (!data.note) return list;
+    if (idx === -1) return [data.note, ...list];
+    const next = list.slice();
+    next[idx] = { ...list[idx], ...data.note };
+    return next;
+  });
+  if (FOLDER_EVENT_TYPES.has(type)) refreshFoldersSoon();
+}
+
+function refreshFoldersSoon() {
+  // Folder counts are cheap to fetch; coalesce bursts (bulk moves) into one call
+  if (foldersTimer) return;
+  foldersTimer = setTimeout(() => { foldersTimer = null; folderActions.refresh(); }, 500);
+}
+
+export function noteEventsConnected(): boolean {
+  return !!source && source.readyState === EventSource.OPEN;
+}
+
+export function onNoteEvent(fn: Listener): () => void {
+  listeners.add(fn);
+  return () => listeners.delete(fn);
+}
+
+// Catch up through the change feed (GET /api/notes/changes) from the cursor of
+// the last listing; falls back to `onReset` (a full refetch) when it can't.
+export async function syncNotes(onReset: () => unknown): Promise<void> {
+  let since = api.notesSeq();
+  try {
+    while (since !== null) {
+      const changes = await api.getNoteChanges(since);
+      if (changes.reset) break;
+      for (const id of changes.deleted) applyNoteEvent('note.deleted', { id });
+      for (const note of changes.upserts) applyNoteEvent('note.updated', { id: baseId(note.filename), note });
+      if (changes.deleted.length || changes.upserts.length) refreshFoldersSoon();
+      if (!changes.more) return;
+      since = changes.seq;
+    }
+  } catch (err) {
+    dbg('events:sync failed', String(err));
+  }
+  await onReset();
+}
+
+// Open the stream (once). When the server cannot replay what was missed since
+// the last event (e.g. after a backend restart) the client catches up with
+// syncNotes(), and `onReset` runs if even that is not possible.
+export function connectNoteEvents(onReset: () => unknown): () => void {
+  if (typeof window === 'undefined' || typeof EventSource === 'undefined') return () => {};
+  if (source) return () => {};
+  const es = new EventSource(`${BACKEND_URL}/api/events`);
+  source = es;
+  for (const type of NOTE_EVENT_TYPES) {
+    es.addEventListener(type, (ev) => {
+      let data: NoteEvent;
+      try { data = JSON.parse((ev as MessageEvent).data); } catch { return; }
+      dbg('events:' + type, data.id);
+      applyNoteEvent(type, data);
+      for (const fn of listeners) {
+        try { fn(type, data); } catch {}
+      }
+    });
+  }
+  es.addEventListener('reset', () => { dbg('events:reset'); syncNotes(onReset); });
+  return () => {
+    es.close();
+    if (source === es) source = null;
+  };
+}
+
+// Resolve when `filename` finishes transcribing (or fails), or after `timeoutMs`.
+export function waitForTranscription(filename: string, timeoutMs = 60_000): Promise<void> {
+  const id = baseId(filename);
+  return new Promise((resolve) => {
+    const done = () => { clearTimeout(timer); off(); resolve(); };
+    const timer = setTimeout(done, timeoutMs);
+    const off = onNoteEvent((type, data) => {
+      if (data.id === id && (type === 'note.transcribed' || type === 'note.failed')) done();
+    });
+  });
+}
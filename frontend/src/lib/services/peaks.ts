@@ -0,0 +1,46 @@
+import { api, type NotePeaks } from '$lib/api';
+import { dbg } from '$lib/debug';
+
+// Waveform peaks from GET /api/notes/{filename}/peaks: a few KB per note instead
+// of downloading and decoding the audio. One request per file per session.
+const cache = new Map<string, Promise<NotePeaks | null>>();
+
+export function loadPeaks(filename: string): Promise<NotePeaks | null> {
+  let pending = cache.get(filename);
+  if (!pending) {
+    pending = api.getPeaks(filename).catch((err) => {
+      dbg('peaks:error', filename, String(err));
+      cache.delete(filename);
+      return null;
+    });
+    cache.set(filename, pending);
+  }
+  return pending;
+}
+
+// Peaks only if already computed (a cached load or the stored sidecar); never
+// makes the backend decode audio. Misses aren't cached: the file may be built later.
+export async function loadStoredPeaks(filename: string): Promise<NotePeaks | null> {
+  const pending = cache.get(filename);
+  if (pending) return pending;
+  try {
+    const peaks = await api.getPeaks(filename, false);
+    cache.set(filename, Promise.resolve(peaks));
+    return peaks;
+  } catch (err) {
+    dbg('peaks:stored-miss', filename, String(err));
+    return null;
+  }
+}
+
+// SVG path (viewBox 0 0 bins 256, centre line at 128) of the min/max envelope.
+export function peaksPath(p: NotePeaks): string {
+  const pts = p.peaks;
+  let d = '';
+  for (let i = 0; i < pts.length / 2; i++) {
+    const lo = 128 - pts[2 * i];
+    const hi = 128 - Math.max(pts[2 * i + 1], pts[2 * i] + 1);
+    d += `M${i + 0.5} ${hi}V${lo}`;
+  }
+  return d;
+}
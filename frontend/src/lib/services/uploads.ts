@@ -2,6 +2,7 @@ import { appActions } from '$lib/services/appActions';
 import { notes as notesStore } from '$lib/stores/notes';
 import { folders as foldersStore, selectedFolder as selectedFolderStore } from '$lib/stores/folders';
 import { dbg } from '$lib/debug';
+import { noteEventsConnected, waitForTranscription } from '$lib/services/noteEvents';
 import { get } from 'svelte/store';
 
 async function refreshAll() {
@@ -21,6 +22,11 @@ export async function uploadBlob(blob: Blob, skipPoll = false) {
   const folder = getSelectedFolder();
   dbg('uploads:uploadBlob', { folder });
   const { filename } = await appActions.uploadNote(blob as any, folder);
+  if (noteEventsConnected()) {
+    // The event stream delivers the new note and its transcription as they happen
+    if (!skipPoll) await waitForTranscription(filename);
+    return;
+  }
   if (skipPoll) {
     await refreshAll();
     return;
@@ -45,6 +51,7 @@ export async function handleFiles(files: File[]) {
   for (const f of files) {
     await uploadBlob(f, true);
   }
+  if (noteEventsConnected()) return;
   // open a short polling window
   const started = Date.now();
   const end = started + 30_000;
@@ -35,6 +35,8 @@ def temp_dirs(monkeypatch):
     monkeypatch.setattr(config, "TRANSCRIPTS_DIR", trans, raising=False)
     monkeypatch.setattr(config, "PROGRAMS_DIR", programs, raising=False)
     monkeypatch.setattr(config, "NARRATIVES_DIR", narr, raising=False)
+    monkeypatch.setattr(config, "FOLDERS_DIR", os.path.join(base, "folders"), raising=False)
+    monkeypatch.setattr(config, "TELEGRAM_UPDATES_DIR", os.path.join(base, "telegram", "updates"), raising=False)
     monkeypatch.setattr(main, "VOICE_NOTES_DIR", voice, raising=False)
     monkeypatch.setattr(main, "TRANSCRIPTS_DIR", trans, raising=False)
     monkeypatch.setattr(main, "NARRATIVES_DIR", narr, raising=False)
@@ -47,11 +49,37 @@ def temp_dirs(monkeypatch):
     monkeypatch.setattr(routes_narratives, "NARRATIVE_META_DIR", os.path.join(narr, "meta"), raising=False)
     monkeypatch.setattr(routes_narratives, "TRANSCRIPTS_DIR", trans, raising=False)
 
+    # The registry cache is keyed by path, and every test reuses the same one
+    importlib.import_module("core.programs").invalidate_programs_cache()
+    monkeypatch.setattr(config, "MODELS_DIR", os.path.join(base, "models"), raising=False)
+    importlib.import_module("learned_categorizer").CORRECTIONS.reset()
+    monkeypatch.setattr(config, "INDEX_DIR", os.path.join(base, "index"), raising=False)
+    monkeypatch.setattr(config, "AUDIO_CACHE_DIR", os.path.join(base, "cache", "audio"), raising=False)
+    monkeypatch.setattr(config, "PEAKS_DIR", os.path.join(base, "peaks"), raising=False)
+    importlib.import_module("store.index").NOTE_INDEX.reset()
+    importlib.import_module("core.http_cache").clear_body_cache()
+    importlib.import_module("store.audio_cache").AUDIO_CACHE.reset()
+
     yield types.SimpleNamespace(base=base, voice=voice, trans=trans, narr=narr, programs=programs)
 
     shutil.rmtree(base, ignore_errors=True)
 
 
+@pytest.fixture(autouse=True)
+def usage_dir(monkeypatch, tmp_path):
+    """Keep usage telemetry out of backend/usage/ and drain the flusher afterwards."""
+    import usage_log
+
+    directory = str(tmp_path / "usage")
+    monkeypatch.setattr(usage_log, "USAGE_DIR", directory)
+    monkeypatch.setattr(usage_log, "_WEEKLY_CACHE", {})
+
+    yield directory
+
+    # Flush while USAGE_DIR still points at the temp dir
+    usage_log.stop_flusher()
+
+
 @pytest.fixture(autouse=True)
 def stub_providers(monkeypatch):
     import providers
@@ -64,5 +92,7 @@ def stub_providers(monkeypatch):
     monkeypatch.setattr(providers, "transcribe_with_openai", lambda b, file_ext="wav": "OK_TRANSCRIPT")
     monkeypatch.setattr(providers, "title_with_openai", lambda text: "OK Title")
     monkeypatch.setattr(providers, "openai_chat", lambda messages, model=None, temperature=0.2: "Generated Narrative")
+    monkeypatch.setattr(providers, "stream_google", lambda msgs, model=None: iter(["OK"]))
+    monkeypatch.setattr(providers, "stream_openai_chat", lambda messages, model=None, temperature=0.2: iter(["Generated ", "Narrative"]))
 
     yield
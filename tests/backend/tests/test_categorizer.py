@@ -24,3 +24,68 @@ def test_categorize_note_general_fallback():
     assert data["domain"] == "personal"
     assert data["program"] is None
     assert data["confidence"] >= 0.2
+
+
+def test_categorize_note_matches_phrases_and_aliases():
+    programs = [
+        {"key": "search", "title": "Search", "domain": "programming", "keywords": ["vector db", "ranking"]},
+        {"key": "billing", "title": "Billing", "domain": "programming", "keywords": ["invoice"], "aliases": ["stripe"]},
+    ]
+    result = categorizer.categorize_note("Deploy the vector db ranking fix to the backend api", None, programs)
+    assert result.program == "search"
+    assert result.program_rationale == "Matched program keywords: vector db, ranking."
+
+    result = categorizer.categorize_note("Stripe webhook code needs a refactor", None, programs)
+    assert result.program == "billing"
+
+    # "vector" alone does not satisfy the two-word keyword
+    result = categorizer.categorize_note("Deploy vector backend api stripe", None, programs)
+    assert result.program == "billing"
+
+
+def test_compiled_categorizer_is_reused_until_programs_change():
+    programs = [{"key": "ops", "title": "Operations", "domain": "operations", "keywords": ["vendor"]}]
+    first = categorizer.compiled_categorizer(programs)
+    assert categorizer.compiled_categorizer([dict(p) for p in programs]) is first
+    changed = [dict(programs[0], keywords=["supplier"])]
+    assert categorizer.compiled_categorizer(changed) is not first
+
+
+def test_folder_corrections_train_suggestions(temp_dirs):
+    import json
+    import os
+    from fastapi.testclient import TestClient
+    from core import note_logic
+    from learned_categorizer import CORRECTIONS
+    from main import app
+
+    notes = {
+        "g1": ("Garden", "Water the tomatoes and prune the roses in the garden"),
+        "g2": ("Garden", "Plant basil seedlings and compost the garden beds"),
+        "g3": ("Garden", "Roses need compost and the tomatoes need water"),
+        "b1": ("Books", "Finished the novel chapter about the lighthouse keeper"),
+        "b2": ("Books", "Reading list novel recommendations and library holds"),
+        "b3": ("Books", "The lighthouse novel has a great reading group guide"),
+    }
+    client = TestClient(app)
+    for base, (folder, text) in notes.items():
+        with open(os.path.join(temp_dirs.trans, f"{base}.json"), "w") as f:
+            json.dump({"filename": f"{base}.wav", "title": "", "transcription": text}, f)
+        resp = client.patch(f"/api/notes/{base}.wav/folder", json={"folder": folder})
+        assert resp.json()["folder"] == folder
+    assert CORRECTIONS.example_count("folder") == 6
+
+    note = {}
+    note_logic.apply_classification(note, None, "Should I prune the roses before adding compost?")
+    assert note["auto_folder"] == "Garden"
+    assert 0.6 <= note["auto_folder_score"] < 1.0 and "auto_folder_confidence" not in note
+
+    # Relabelling replaces the old example instead of adding a second one
+    client.patch("/api/notes/g3.wav/folder", json={"folder": "Books"})
+    assert CORRECTIONS.example_count("folder") == 6
+    resp = client.patch("/api/notes/b1.wav/folder", json={"program": "reading"})
+    assert resp.json() == {"status": "ok", "folder": "Books", "program": "reading"}
+
+    # Deleting a note drops its example
+    assert client.delete("/api/notes/b2.wav").status_code == 200
+    assert CORRECTIONS.example_count("folder") == 5
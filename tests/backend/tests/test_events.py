@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_broker_resume_and_reset():
+    from core.events import EventBroker
+
+    broker = EventBroker(retain=3)
+
+    async def scenario():
+        first = broker.publish("note.created", {"id": "a"})
+        broker.publish("note.moved", {"id": "a"})
+        queue, backlog = broker.subscribe(first)
+        assert [e[1] for e in backlog] == ["note.moved"]
+        broker.publish("note.deleted", {"id": "a"})
+        assert (await asyncio.wait_for(queue.get(), 1))[1] == "note.deleted"
+        broker.unsubscribe(queue)
+
+        # Evicted ids and ids from another process both require a resync
+        for _ in range(3):
+            broker.publish("note.updated", {"id": "b"})
+        assert broker.subscribe(first)[1] is None
+        assert broker.subscribe("other-1")[1] is None
+        assert broker.subscribe(None)[1] == []
+
+    asyncio.run(scenario())
+
+
+def test_note_changes_are_published_and_replayed(temp_dirs):
+    from core.events import NOTE_EVENTS
+    from main import app
+    from routes.events import event_stream
+
+    client = TestClient(app)
+    start = NOTE_EVENTS.last_event_id
+    created = client.post("/api/notes/text", json={"transcription": "Call the vendor", "title": "Vendor"}).json()
+    client.patch(f"/api/notes/{created['filename']}/folder", json={"folder": "Work"})
+    client.delete(f"/api/notes/{created['filename']}")
+
+    class _Request:
+        async def is_disconnected(self):
+            return True
+
+    async def collect():
+        frames = []
+        async for frame in event_stream(_Request(), start):
+            frames.append(frame)
+        return frames
+
+    frames = asyncio.run(collect())
+    events = []
+    for frame in frames:
+        fields = dict(line.split(": ", 1) for line in frame.strip().splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    assert [e for e, _ in events] == ["note.created", "note.moved", "note.deleted"]
+    assert events[0][1]["note"]["title"] == "Vendor"
+    assert events[1][1]["note"]["folder"] == "Work"
+    assert NOTE_EVENTS.subscriber_count() == 0
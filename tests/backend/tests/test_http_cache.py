@@ -0,0 +1,94 @@
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+
+def _revalidate(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    return etag
+
+
+def test_list_endpoints_answer_304_until_something_changes(temp_dirs, monkeypatch):
+    import config
+    import services
+    from main import app
+
+    monkeypatch.setattr(config, "FORMATS_DIR", os.path.join(temp_dirs.base, "formats"), raising=False)
+    with open(os.path.join(temp_dirs.trans, "a.json"), "w") as f:
+        json.dump({"filename": "a.wav", "title": "A", "transcription": "hello", "folder": "Work"}, f)
+    client = TestClient(app)
+    client.get("/api/notes")  # backfills metadata
+
+    etag = _revalidate(client, "/api/notes")
+    # A 304 is answered without listing the notes again
+    monkeypatch.setattr("routes.notes.get_notes", lambda: (_ for _ in ()).throw(AssertionError("listed")))
+    assert client.get("/api/notes", headers={"If-None-Match": etag}).status_code == 304
+    monkeypatch.setattr("routes.notes.get_notes", services.get_notes)
+    folders_etag = _revalidate(client, "/api/folders")
+    client.patch("/api/notes/a.wav/folder", json={"folder": "Home"})
+    assert client.get("/api/notes", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/folders", headers={"If-None-Match": folders_etag}).json() == [{"name": "Home", "count": 1}]
+
+    programs_etag = _revalidate(client, "/api/programs")
+    client.put("/api/programs", json=[{"key": "ops", "title": "Ops", "domain": "operations", "keywords": ["vendor"]}])
+    assert client.get("/api/programs", headers={"If-None-Match": programs_etag}).status_code == 200
+
+    formats_etag = _revalidate(client, "/api/formats")
+    client.post("/api/formats", json={"title": "Brief", "prompt": "Be brief"})
+    resp = client.get("/api/formats", headers={"If-None-Match": formats_etag})
+    assert resp.status_code == 200 and [f["title"] for f in resp.json()] == ["Brief"]
+    assert client.get("/api/formats", headers={"If-Modified-Since": resp.headers["Last-Modified"]}).status_code == 304
+
+    _revalidate(client, "/api/narratives/list")
+
+
+def test_notes_list_ndjson_and_gzip(temp_dirs):
+    from main import app
+
+    for i in range(3):
+        with open(os.path.join(temp_dirs.trans, f"n{i}.json"), "w") as f:
+            json.dump({"filename": f"n{i}.wav", "title": f"T{i}", "transcription": "word " * 400}, f)
+    client = TestClient(app)
+    client.get("/api/notes")  # backfills metadata
+
+    resp = client.get("/api/notes", params={"format": "ndjson"})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted(r["filename"] for r in rows) == ["n0.wav", "n1.wav", "n2.wav"]
+    assert client.get("/api/notes", headers={"Accept": "application/x-ndjson", "If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+    resp = client.get("/api/notes", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert len(resp.json()) == 3
+
+
+def test_folders_listing_is_not_cached_for_remote_stores(temp_dirs, monkeypatch):
+    import config
+    from main import app
+
+    monkeypatch.setattr(config, "STORE_BACKEND", "appwrite")
+    monkeypatch.setattr("routes.folders.load_folders_registry", lambda: ["Shared"])
+    client = TestClient(app)
+    resp = client.get("/api/folders")
+    assert resp.status_code == 200 and resp.json() == [{"name": "Shared", "count": 0}]
+    assert "etag" not in resp.headers
+    assert client.get("/api/folders", headers={"If-None-Match": "*"}).status_code == 200
+
+
+def test_notes_listing_is_not_cached_for_remote_stores(temp_dirs, monkeypatch):
+    import config
+    from main import app
+
+    monkeypatch.setattr(config, "STORE_BACKEND", "appwrite")
+    monkeypatch.setattr("routes.notes.get_notes", lambda: [{"filename": "a.wav", "folder": "Shared"}])
+    client = TestClient(app)
+    for params in ({}, {"format": "ndjson"}):
+        resp = client.get("/api/notes", params=params, headers={"If-None-Match": "*"})
+        assert resp.status_code == 200 and "etag" not in resp.headers
+        assert "X-Notes-Seq" in resp.headers
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+
+
+def test_local_audio_supports_range_etag_and_immutable_caching(temp_dirs):
+    from main import app
+
+    data = bytes(range(256)) * 40
+    with open(os.path.join(temp_dirs.voice, "20240101_120000.m4a"), "wb") as f:
+        f.write(data)
+    client = TestClient(app)
+
+    full = client.get("/voice_notes/20240101_120000.m4a")
+    assert full.status_code == 200 and full.content == data
+    assert full.headers["content-type"] == "audio/mp4"
+    assert full.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = full.headers["etag"]
+
+    part = client.get("/voice_notes/20240101_120000.m4a", headers={"Range": "bytes=1000-1099"})
+    assert part.status_code == 206
+    assert part.content == data[1000:1100]
+    assert part.headers["content-range"] == f"bytes 1000-1099/{len(data)}"
+
+    assert client.get("/voice_notes/20240101_120000.m4a", headers={"If-None-Match": etag}).status_code == 304
+    # A stale If-Range validator gets the whole file instead of a range
+    stale = client.get("/voice_notes/20240101_120000.m4a", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200 and len(stale.content) == len(data)
+
+    assert client.get("/voice_notes/missing.m4a").status_code == 404
+    assert client.get("/voice_notes/..%2Fsecret.json").status_code == 404
+
+
+def test_appwrite_audio_is_proxied_with_range(temp_dirs, monkeypatch):
+    from main import app
+    from routes import media
+
+    data = b"0123456789" * 100
+    seen = {}
+
+    async def fake_open(file_id, range_header=None):
+        seen["file_id"], seen["range"] = file_id, range_header
+        start, end = (int(x) for x in range_header.split("=")[1].split("-"))
+        body = data[start:end + 1]
+        resp = httpx.Response(
+            206,
+            headers={"content-range": f"bytes {start}-{end}/{len(data)}", "content-length": str(len(body))},
+            stream=httpx.ByteStream(body),
+        )
+
+        async def close():
+            seen["closed"] = True
+
+        return resp, close
+
+    monkeypatch.setattr(media, "is_appwrite_storage_enabled", lambda: True)
+    monkeypatch.setattr(media, "open_audio_stream", fake_open)
+    monkeypatch.setattr(media, "_appwrite_file_id", lambda filename: ("file123", None))
+    monkeypatch.setattr(media, "prefetch_audio", lambda file_id, sha256=None: seen.setdefault("prefetch", file_id))
+    client = TestClient(app)
+
+    resp = client.get("/voice_notes/remote.webm", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.content == data[100:200]
+    assert resp.headers["etag"] == '"aw-file123"'
+    assert resp.headers["content-range"] == "bytes 100-199/1000"
+    assert seen == {"prefetch": "file123", "file_id": "file123", "range": "bytes=100-199", "closed": True}
+    assert client.get("/voice_notes/remote.webm", headers={"If-None-Match": '"aw-file123"'}).status_code == 304
+
+
+def test_audio_cache_coalesces_downloads_and_evicts_lru(temp_dirs, monkeypatch):
+    import config
+    from store.audio_cache import AUDIO_CACHE, AudioCache
+    import store.audio_cache as audio_cache
+
+    calls = []
+    gate = threading.Event()
+
+    def download(file_id, out):
+        calls.append(file_id)
+        gate.wait(5)
+        out.write(file_id.encode() * 100)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(AUDIO_CACHE.fetch("a", download))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert calls == ["a"]
+    assert len(set(results)) == 1
+    path = results[0]
+    assert os.path.basename(path) == hashlib.sha256(b"a" * 100).hexdigest()
+    assert AUDIO_CACHE.fetch("a", download) == path and calls == ["a"]
+    # Same bytes under another file id share the blob; the content hash alone is a hit
+    assert AUDIO_CACHE.lookup("unknown", hashlib.sha256(b"a" * 100).hexdigest()) == path
+
+    monkeypatch.setattr(config, "AUDIO_CACHE_MAX_BYTES", 250)
+    monkeypatch.setattr(audio_cache, "PIN_SECONDS", 0)
+    AUDIO_CACHE.fetch("b", download)
+    os.utime(path, (time.time() - 100, time.time() - 100))
+    AUDIO_CACHE.lookup("b")
+    AUDIO_CACHE.fetch("c", download)
+    assert AUDIO_CACHE.lookup("a") is None
+    assert AUDIO_CACHE.lookup("b") and AUDIO_CACHE.lookup("c")
+    assert AudioCache().stats() == (2, 200)
+
+
+def test_appwrite_audio_is_served_from_cache(temp_dirs, monkeypatch):
+    from main import app
+    from routes import media
+    from store.audio_cache import AUDIO_CACHE
+
+    data = b"cached-audio" * 50
+    path = AUDIO_CACHE.fetch("file456", lambda file_id, out: out.write(data))
+
+    async def no_proxy(file_id, range_header=None):
+        raise AssertionError("cached audio should not be proxied")
+
+    monkeypatch.setattr(media, "is_appwrite_storage_enabled", lambda: True)
+    monkeypatch.setattr(media, "open_audio_stream", no_proxy)
+    monkeypatch.setattr(media, "_appwrite_file_id", lambda filename: ("file456", None))
+    client = TestClient(app)
+
+    resp = client.get("/voice_notes/remote.webm", headers={"Range": "bytes=0-11", "If-Range": '"aw-file456"'})
+    assert resp.status_code == 206 and resp.content == b"cached-audio"
+    assert resp.headers["etag"] == '"aw-file456"'
+    assert path and os.path.exists(path)
@@ -0,0 +1,270 @@
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+
+def _write_note(trans_dir, base, **fields):
+    with open(os.path.join(trans_dir, f"{base}.json"), "w") as f:
+        json.dump({"filename": f"{base}.wav", "title": base, "transcription": "text", **fields}, f)
+
+
+def test_folder_counts_follow_saves_moves_and_deletes(temp_dirs, monkeypatch):
+    from main import app
+    from store import get_notes_store
+    from store.index import NOTE_INDEX
+
+    _write_note(temp_dirs.trans, "a", folder="Work", tags=[{"label": "x"}], language="en")
+    _write_note(temp_dirs.trans, "b", folder="Work", language="es")
+    client = TestClient(app)
+    assert {f["name"]: f["count"] for f in client.get("/api/folders").json()} == {"Work": 2}
+
+    # After the initial scan, reads are answered without listing notes
+    store = get_notes_store()
+    monkeypatch.setattr(type(store), "list_notes", lambda self: (_ for _ in ()).throw(AssertionError("scan")))
+    client.patch("/api/notes/b.wav/folder", json={"folder": "Home"})
+    client.patch("/api/notes/a.wav/tags", json={"tags": [{"label": "y"}, {"label": "z"}]})
+    assert {f["name"]: f["count"] for f in client.get("/api/folders").json()} == {"Work": 1, "Home": 1}
+
+    facets = client.get("/api/notes/facets").json()
+    assert facets["tag"] == {"y": 1, "z": 1}
+    assert facets["language"] == {"en": 1, "es": 1}
+    assert NOTE_INDEX.members("folder", "Home") == ["b"]
+
+    assert client.delete("/api/notes/a.wav").status_code == 200
+    assert {f["name"]: f["count"] for f in client.get("/api/folders").json()} == {"Home": 1}
+
+    # A restart replays the snapshot + journal instead of rescanning
+    NOTE_INDEX.reset()
+    assert NOTE_INDEX.counts("folder") == {"Home": 1}
+
+
+def test_index_rebuilds_when_notes_change_out_of_band(temp_dirs):
+    from store.index import NOTE_INDEX
+
+    _write_note(temp_dirs.trans, "a", folder="Work")
+    assert NOTE_INDEX.counts("folder") == {"Work": 1}
+    _write_note(temp_dirs.trans, "c", folder="Ideas")
+    os.utime(temp_dirs.trans, ns=(1, 1))
+    assert NOTE_INDEX.counts("folder") == {"Work": 1, "Ideas": 1}
+
+
+def test_remote_index_rescans_after_refresh_interval(temp_dirs, monkeypatch):
+    from types import SimpleNamespace
+
+    import config
+    import store
+    from store import index
+    from store.index import NOTE_INDEX
+
+    notes = [{"filename": "a.wav", "folder": "Work"}]
+
+    class RemoteStore:
+        def list_notes(self):
+            return list(notes)
+
+    clock = [1_000_000.0]
+    monkeypatch.setattr(config, "STORE_BACKEND", "appwrite")
+    monkeypatch.setattr(config, "INDEX_REMOTE_REFRESH_SECONDS", 60.0)
+    monkeypatch.setattr(store, "get_notes_store", lambda: RemoteStore())
+    monkeypatch.setattr(index, "time", SimpleNamespace(time=lambda: clock[0]))
+    NOTE_INDEX.reset()
+    assert NOTE_INDEX.counts("folder") == {"Work": 1}
+
+    # Another instance adds a note; seen once the scan is older than the interval
+    notes.append({"filename": "b.wav", "folder": "Home"})
+    clock[0] += 30
+    assert NOTE_INDEX.counts("folder") == {"Work": 1}
+    clock[0] += 30
+    assert NOTE_INDEX.counts("folder") == {"Work": 1, "Home": 1}
+    NOTE_INDEX.reset()
+
+
+def test_folder_delete_runs_as_job_from_index(temp_dirs, monkeypatch):
+    import time
+
+    from main import app
+    from store import get_notes_store
+
+    for base in ("a", "b", "c"):
+        _write_note(temp_dirs.trans, base, folder="Old")
+        with open(os.path.join(temp_dirs.voice, f"{base}.wav"), "wb") as f:
+            f.write(b"RIFF")
+    _write_note(temp_dirs.trans, "d", folder="Keep")
+    client = TestClient(app)
+    client.post("/api/folders", json={"name": "Old"})
+    assert {f["name"]: f["count"] for f in client.get("/api/folders").json()} == {"Keep": 1, "Old": 3}
+
+    store = get_notes_store()
+    monkeypatch.setattr(type(store), "list_notes", lambda self: (_ for _ in ()).throw(AssertionError("scan")))
+    resp = client.delete("/api/folders/Old")
+    assert resp.status_code == 202
+    job_id = resp.json()["job"]["id"]
+    # The folder is gone from listings right away
+    assert [f["name"] for f in client.get("/api/folders").json()] == ["Keep"]
+
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.02)
+    assert job["status"] == "completed"
+    assert job["result"]["notes_deleted"] == 3 and job["result"]["remaining"] == 0
+    assert sorted(os.listdir(temp_dirs.trans)) == ["d.json"]
+    assert os.listdir(temp_dirs.voice) == []
+    assert [f["name"] for f in client.get("/api/folders").json()] == ["Keep"]
+
+
+def test_folder_delete_keeps_tombstone_until_empty(temp_dirs, monkeypatch):
+    import time
+
+    from core import note_logic
+    from core.folders import load_folder_tombstones
+    from main import app
+
+    for base in ("a", "b"):
+        _write_note(temp_dirs.trans, base, folder="Old")
+    client = TestClient(app)
+    real_delete = note_logic.delete_note_everywhere
+
+    def flaky_delete(note_id):
+        if note_id.startswith("b"):
+            return True, ["remote store unavailable"]
+        return real_delete(note_id)
+
+    def run_delete():
+        job_id = client.delete("/api/folders/Old").json()["job"]["id"]
+        for _ in range(200):
+            job = client.get(f"/api/jobs/{job_id}").json()
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(0.02)
+        raise AssertionError("job did not finish")
+
+    monkeypatch.setattr(note_logic, "delete_note_everywhere", flaky_delete)
+    job = run_delete()
+    assert job["result"]["failed"] == 1 and job["result"]["remaining"] == 1
+    # The half-deleted folder stays hidden and is retried later
+    assert load_folder_tombstones() == ["Old"]
+    assert "Old" not in [f["name"] for f in client.get("/api/folders").json()]
+
+    monkeypatch.setattr(note_logic, "delete_note_everywhere", real_delete)
+    job = run_delete()
+    assert job["result"]["remaining"] == 0
+    assert load_folder_tombstones() == []
+
+
+def test_recreated_folder_keeps_new_notes(temp_dirs, monkeypatch):
+    import threading
+    import time
+
+    from core import note_logic
+    from core.folders import load_folder_tombstones
+    from main import app
+    from routes.folders import resume_folder_deletes
+
+    for base in ("a", "b"):
+        _write_note(temp_dirs.trans, base, folder="Old")
+    _write_note(temp_dirs.trans, "c", folder="Keep")
+    client = TestClient(app)
+    client.get("/api/notes")
+    real_delete = note_logic.delete_note_everywhere
+    started, release = threading.Event(), threading.Event()
+
+    def slow_delete(note_id):
+        started.set()
+        release.wait(5)
+        return real_delete(note_id)
+
+    monkeypatch.setattr(note_logic, "delete_note_everywhere", slow_delete)
+    job_id = client.delete("/api/folders/Old").json()["job"]["id"]
+    assert started.wait(5)
+    # The folder comes back and a note is filed into it mid-delete
+    assert client.post("/api/folders", json={"name": "Old"}).json() == {"name": "Old"}
+    client.patch("/api/notes/c.wav/folder", json={"folder": "Old"})
+    assert load_folder_tombstones() == []
+    release.set()
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.02)
+    assert job["status"] == "completed" and job["result"]["notes_deleted"] == 2
+
+    resume_folder_deletes()
+    assert sorted(os.listdir(temp_dirs.trans)) == ["c.json"]
+    assert {f["name"]: f["count"] for f in client.get("/api/folders").json()} == {"Old": 1}
+
+
+def test_changes_since_cursor(temp_dirs):
+    from main import app
+    from store.index import NOTE_INDEX
+
+    _write_note(temp_dirs.trans, "a", folder="Work")
+    _write_note(temp_dirs.trans, "b", folder="Work")
+    client = TestClient(app)
+    client.get("/api/notes")  # the first listing backfills metadata (saves)
+    listing = client.get("/api/notes")
+    cursor = int(listing.headers["X-Notes-Seq"])
+
+    assert client.get("/api/notes/changes", params={"since": cursor}).json() == {
+        "seq": cursor, "reset": False, "upserts": [], "deleted": [], "more": False,
+    }
+
+    client.patch("/api/notes/a.wav/tags", json={"tags": [{"label": "x"}]})
+    client.delete("/api/notes/b.wav")
+    client.patch("/api/notes/a.wav/folder", json={"folder": "Home"})
+    changes = client.get("/api/notes/changes", params={"since": cursor}).json()
+    assert changes["reset"] is False
+    assert [n["filename"] for n in changes["upserts"]] == ["a.wav"]
+    assert changes["upserts"][0]["folder"] == "Home"
+    assert changes["deleted"] == ["b"]
+    assert changes["seq"] > cursor
+
+    # Paging, then the cursor survives a restart (snapshot + journal replay)
+    page = client.get("/api/notes/changes", params={"since": cursor, "limit": 1}).json()
+    assert page["more"] is True and page["deleted"] == ["b"] and page["upserts"] == []
+    NOTE_INDEX.reset()
+    assert client.get("/api/notes/changes", params={"since": changes["seq"]}).json()["upserts"] == []
+
+    # A rebuild cannot say what changed, so older cursors must resync
+    NOTE_INDEX.rebuild()
+    assert client.get("/api/notes/changes", params={"since": changes["seq"]}).json()["reset"] is True
+
+
+def test_changes_feed_survives_concurrent_writes(temp_dirs, monkeypatch):
+    import threading
+
+    from main import app
+    from note_store import save_note_json
+    from store import get_notes_store
+    from store.index import NOTE_INDEX
+
+    _write_note(temp_dirs.trans, "seed")
+    client = TestClient(app)
+    client.get("/api/notes")
+    cursor = int(client.get("/api/notes").headers["X-Notes-Seq"])
+    monkeypatch.setattr(type(NOTE_INDEX), "rebuild", lambda self: (_ for _ in ()).throw(AssertionError("rebuild")))
+
+    store = get_notes_store()
+
+    def writer():
+        for i in range(150):
+            save_note_json(f"w{i}", {"filename": f"w{i}.wav", "title": "w", "transcription": "t"})
+            if i % 3 == 0:
+                store.delete_note(f"w{i}")
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    seen_up, seen_del = set(), set()
+    while thread.is_alive():
+        changes = client.get("/api/notes/changes", params={"since": cursor}).json()
+        assert changes["reset"] is False
+        seen_up.update(n["filename"] for n in changes["upserts"])
+        seen_del.update(changes["deleted"])
+        cursor = changes["seq"]
+    thread.join()
+    changes = client.get("/api/notes/changes", params={"since": cursor}).json()
+    assert changes["reset"] is False
+    assert {f"w{i}" for i in range(0, 150, 3)} <= seen_del | set(changes["deleted"])
+    assert len(seen_up | {n["filename"] for n in changes["upserts"]}) >= 100
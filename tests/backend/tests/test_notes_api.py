@@ -38,6 +38,43 @@ def test_generate_narrative_with_extra_text(temp_dirs):
     assert "Generated Narrative" in content or content.strip()
 
 
+def test_generate_narrative_stream_sends_tokens_and_saves_file(monkeypatch, temp_dirs):
+    import time
+    import providers
+
+    with open(os.path.join(temp_dirs.trans, "n1.json"), "w") as f:
+        json.dump({"title": "T1", "transcription": "Hello world"}, f)
+
+    def gemini_down(msgs, model=None):
+        raise RuntimeError("quota")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(providers, "stream_google", gemini_down)
+    from main import app
+    client = TestClient(app)
+
+    assert client.post("/api/narratives/generate/stream", json={"items": []}).status_code == 400
+    with client.stream("POST", "/api/narratives/generate/stream", json={"items": [{"filename": "n1.wav"}]}) as resp:
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        frames = [f for f in resp.read().decode().split("\n\n") if f.startswith("event:")]
+    events = [(f.split("\n")[0][7:], json.loads(f.split("\n")[1][6:])) for f in frames]
+    assert [e for e, _ in events] == ["start", "token", "token", "done"]
+    name = events[0][1]["filename"]
+    assert "".join(d["text"] for e, d in events if e == "token") == "Generated Narrative"
+    assert events[-1][1] == {"filename": name, "provider": "openai", "model": events[-1][1]["model"], "chars": 19}
+    with open(os.path.join(temp_dirs.narr, name)) as f:
+        assert f.read() == "Generated Narrative"
+    # Summary and classification land after the stream has finished
+    meta_path = os.path.join(temp_dirs.narr, "meta", f"{name}.json")
+    for _ in range(100):
+        if os.path.exists(meta_path):
+            break
+        time.sleep(0.02)
+    with open(meta_path) as f:
+        assert "summary" in json.load(f)
+
+
 def test_telegram_text_flow_returns_feedback(monkeypatch, temp_dirs):
     from main import app
     client = TestClient(app)
@@ -147,3 +184,67 @@ def test_text_note_creation_includes_auto_category(temp_dirs):
         stored = json.load(fh)
     assert stored.get("auto_category") == "programming"
     assert stored.get("auto_program") == "ai_pipeline"
+
+
+def test_audio_upload_is_spooled_and_hashed(monkeypatch, temp_dirs):
+    import hashlib
+    import core.note_logic as note_logic
+    from main import app
+
+    monkeypatch.setattr(note_logic, "UPLOAD_CHUNK_BYTES", 1024)
+    monkeypatch.setattr(note_logic, "transcribe_and_save", lambda path: None)
+    blob = os.urandom(5000)
+
+    client = TestClient(app)
+    resp = client.post("/api/notes", files={"file": ("clip.mp3", blob, "audio/mpeg")})
+    assert resp.status_code == 200
+    filename = resp.json()["filename"]
+    assert filename.endswith(".mp3")
+    with open(os.path.join(temp_dirs.voice, filename), "rb") as f:
+        assert f.read() == blob
+    assert os.listdir(note_logic.incoming_dir()) == []
+    with open(os.path.join(temp_dirs.trans, filename.replace(".mp3", ".json"))) as f:
+        meta = json.load(f)
+    assert meta["upload_sha256"] == hashlib.sha256(blob).hexdigest()
+    assert meta["upload_size_bytes"] == 5000
+
+
+def test_bulk_notes_move_tag_delete(temp_dirs, monkeypatch):
+    for i in range(3):
+        with open(os.path.join(temp_dirs.trans, f"n{i}.json"), "w") as f:
+            json.dump({"filename": f"n{i}.wav", "title": f"T{i}", "transcription": "hello", "tags": []}, f)
+    with open(os.path.join(temp_dirs.voice, "n2.wav"), "wb") as f:
+        f.write(b"RIFF")
+
+    from learned_categorizer import CORRECTIONS
+    from main import app
+    client = TestClient(app)
+    persists = []
+    real_persist = CORRECTIONS._persist
+    monkeypatch.setattr(CORRECTIONS, "_persist", lambda: persists.append(1) or real_persist())
+
+    r = client.post("/api/notes/bulk", json={"ids": ["n0.wav", "n1", "missing"], "op": "move", "folder": "Work"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["succeeded"] == 2 and body["failed"] == 1
+    assert {x["id"]: x["ok"] for x in body["results"]} == {"n0": True, "n1": True, "missing": False}
+    with open(os.path.join(temp_dirs.trans, "n1.json")) as f:
+        assert json.load(f)["folder"] == "Work"
+    # Both moves are learned from, with a single corrections.json write
+    assert CORRECTIONS.example_count("folder") == 2 and persists == [1]
+
+    r = client.post("/api/notes/bulk", json={"ids": ["n0", "n1"], "op": "add_tag", "tag": {"label": "urgent"}})
+    assert r.json()["succeeded"] == 2
+    r = client.post("/api/notes/bulk", json={"ids": ["n0"], "op": "remove_tag", "tag": {"label": "urgent"}})
+    assert r.json()["results"][0]["changed"] is True
+    with open(os.path.join(temp_dirs.trans, "n0.json")) as f:
+        assert json.load(f)["tags"] == []
+    with open(os.path.join(temp_dirs.trans, "n1.json")) as f:
+        assert [t["label"] for t in json.load(f)["tags"]] == ["urgent"]
+
+    r = client.post("/api/notes/bulk", json={"ids": ["n2"], "op": "delete"})
+    assert r.json()["succeeded"] == 1
+    assert not os.path.exists(os.path.join(temp_dirs.trans, "n2.json"))
+    assert not os.path.exists(os.path.join(temp_dirs.voice, "n2.wav"))
+
+    assert client.post("/api/notes/bulk", json={"ids": ["n0"], "op": "explode"}).status_code == 400
@@ -34,3 +34,109 @@ def test_programs_put_and_roundtrip(temp_dirs):
     res2 = client.get("/api/programs")
     assert res2.status_code == 200
     assert len(res2.json()) == 2
+
+
+def test_programs_registry_cache_tracks_saves_and_file_edits(temp_dirs, monkeypatch):
+    import config
+    from core import programs as registry
+
+    monkeypatch.setattr(config, "PROGRAMS_CACHE_CHECK_SECONDS", 3600)
+    registry.save_programs_registry([registry.normalize_program_entry({"key": "alpha"})])
+    first, version = registry.programs_registry_snapshot()
+    assert [p["key"] for p in first] == ["alpha"]
+
+    reads = []
+    original = registry._read_programs_registry
+    monkeypatch.setattr(registry, "_read_programs_registry", lambda: reads.append(1) or original())
+    assert registry.programs_registry_snapshot() == (first, version)
+    assert reads == []
+
+    # Out-of-band edit: hot path keeps the cached copy until the recheck interval,
+    # API reads notice it immediately
+    path = os.path.join(temp_dirs.programs, "programs.json")
+    with open(path, "w") as f:
+        json.dump([{"key": "beta", "title": "Beta"}], f)
+    os.utime(path, ns=(1, 1))
+    assert registry.programs_registry_snapshot()[1] == version
+    assert [p["key"] for p in registry.load_programs_registry()] == ["beta"]
+    assert registry.registry_version() > version
+    assert reads == [1]
+
+
+def _wait_for_job(client, job_id):
+    import time
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_reclassify_job_dry_run_then_write(temp_dirs):
+    import categorizer
+    from core import note_logic
+    from main import app
+
+    unchanged = categorizer.categorize_note("Supplier meeting about the vendor budget.", "Vendor call", [])
+    notes = {
+        "n1": {"filename": "n1.wav", "title": "Vendor call", "transcription": "Supplier meeting about the vendor budget.",
+               **note_logic.classification_fields(unchanged)},
+        "n2": {"filename": "n2.wav", "title": "Refactor", "transcription": "Refactor the fastapi backend api code.",
+               "auto_category": "general", "auto_category_confidence": 0.1},
+    }
+    for base, data in notes.items():
+        with open(os.path.join(temp_dirs.trans, f"{base}.json"), "w") as f:
+            json.dump(data, f)
+
+    client = TestClient(app)
+    client.put("/api/programs", json=[{"key": "api", "domain": "programming", "keywords": ["fastapi"]}])
+
+    resp = client.post("/api/programs/reclassify", params={"dry_run": True})
+    assert resp.status_code == 202
+    job = _wait_for_job(client, resp.json()["id"])
+    assert job["status"] == "completed"
+    assert job["result"]["changed"] == 1 and job["result"]["written"] == 0
+    assert job["result"]["diffs"] == [{
+        "id": "n2",
+        "before": {"domain": "general", "program": None},
+        "after": {"domain": "programming", "program": "api"},
+    }]
+    with open(os.path.join(temp_dirs.trans, "n2.json")) as f:
+        assert json.load(f)["auto_category"] == "general"
+
+    job = _wait_for_job(client, client.post("/api/programs/reclassify").json()["id"])
+    assert job["progress"]["processed"] == 2 and job["result"]["written"] == 1
+    with open(os.path.join(temp_dirs.trans, "n2.json")) as f:
+        updated = json.load(f)
+    assert updated["auto_program"] == "api" and updated["title"] == "Refactor"
+    assert client.get("/api/jobs/nope").status_code == 404
+
+
+def test_reclassify_keeps_edits_made_after_listing(temp_dirs, monkeypatch):
+    import types
+    from core import note_logic
+
+    notes = {
+        "n1": {"filename": "n1.wav", "title": "Refactor", "transcription": "Refactor the fastapi backend api code.",
+               "auto_category": "general", "folder": ""},
+        "n2": {"filename": "n2.wav", "title": "Old", "transcription": "Refactor the fastapi backend api code.",
+               "auto_category": "general"},
+    }
+    for base, data in notes.items():
+        with open(os.path.join(temp_dirs.trans, f"{base}.json"), "w") as f:
+            json.dump(data, f)
+    stale = [dict(n) for n in note_logic.NOTES_STORE.list_notes()]
+    # Edits land while the job is working from its listing
+    note_logic.NOTES_STORE.save_note("n1", {**notes["n1"], "folder": "Work", "tags": ["x"]})
+    note_logic.NOTES_STORE.save_note("n2", {**notes["n2"], "title": "Renamed"})
+    monkeypatch.setattr(note_logic.NOTES_STORE, "list_notes", lambda: stale)
+
+    job = types.SimpleNamespace(cancelled=False, update=lambda **kw: None)
+    result = note_logic.reclassify_notes(job)
+    assert result["changed"] == 2 and result["written"] == 1 and result["skipped"] == 1
+    with open(os.path.join(temp_dirs.trans, "n1.json")) as f:
+        n1 = json.load(f)
+    assert n1["folder"] == "Work" and n1["tags"] == ["x"] and n1["auto_category"] == "programming"
+    with open(os.path.join(temp_dirs.trans, "n2.json")) as f:
+        assert json.load(f)["title"] == "Renamed"
@@ -28,3 +28,52 @@ def test_transcribe_and_save_writes_json(temp_dirs):
     assert data.get("title")
     assert data.get("transcription")
 
+
+
+def test_transcribe_and_save_wakes_completion_waiters(temp_dirs):
+    import asyncio
+    from core.events import COMPLETION_BUS
+    from services import transcribe_and_save
+    wav_path = os.path.join(temp_dirs.voice, "waited.wav")
+    _write_wav(wav_path)
+
+    async def run():
+        waiter = asyncio.create_task(COMPLETION_BUS.wait("waited", timeout=5))
+        await asyncio.sleep(0)
+        assert COMPLETION_BUS.waiter_count("waited") == 1
+        await transcribe_and_save(wav_path)
+        return await waiter
+
+    result = asyncio.run(run())
+    assert result["status"] == "complete"
+    assert result["note"]["transcription"]
+    assert COMPLETION_BUS.waiter_count() == 0
+
+
+def test_openai_fallback_logs_the_attempt_after_gemini(temp_dirs, monkeypatch):
+    import asyncio
+    import providers
+    import usage_log as usage
+    from services import transcribe_and_save
+
+    def rate_limited(msgs, model=None):
+        raise RuntimeError("429 quota exceeded")
+
+    attempts = {}
+
+    def openai_transcribe(audio_bytes, file_ext="wav"):
+        attempts["transcribe"] = usage.current_call_context()["attempt"]
+        return "text"
+
+    def openai_title(text):
+        attempts["title"] = usage.current_call_context()["attempt"]
+        return "Title"
+
+    monkeypatch.setattr(providers, "invoke_google", rate_limited)
+    monkeypatch.setattr(providers, "transcribe_with_openai", openai_transcribe)
+    monkeypatch.setattr(providers, "title_with_openai", openai_title)
+    wav_path = os.path.join(temp_dirs.voice, "fallback.wav")
+    _write_wav(wav_path)
+    asyncio.run(transcribe_and_save(wav_path))
+    # A rate limit skips the second Gemini try, so OpenAI is attempt 2
+    assert attempts == {"transcribe": 2, "title": 2}
@@ -14,6 +14,7 @@ def test_note_store_allows_appwrite(monkeypatch, tmp_path):
     monkeypatch.setattr(cfg, "STORE_BACKEND", "appwrite", raising=False)
     monkeypatch.setattr(cfg, "VOICE_NOTES_DIR", str(voice_dir), raising=False)
     monkeypatch.setattr(cfg, "TRANSCRIPTS_DIR", str(trans_dir), raising=False)
+    monkeypatch.setattr(cfg, "INDEX_DIR", str(tmp_path / "index"), raising=False)
     monkeypatch.setattr(cfg, "APPWRITE_ENDPOINT", "http://localhost/v1", raising=False)
     monkeypatch.setattr(cfg, "APPWRITE_PROJECT_ID", "test-project", raising=False)
     monkeypatch.setattr(cfg, "APPWRITE_API_KEY", "test-key", raising=False)
@@ -41,6 +42,7 @@ def test_note_store_filesystem_still_functions(monkeypatch, tmp_path):
 
     monkeypatch.setattr(cfg, "VOICE_NOTES_DIR", str(voice_dir), raising=False)
     monkeypatch.setattr(cfg, "TRANSCRIPTS_DIR", str(trans_dir), raising=False)
+    monkeypatch.setattr(cfg, "INDEX_DIR", str(tmp_path / "index"), raising=False)
     importlib.reload(ns)
 
     base = "sample"
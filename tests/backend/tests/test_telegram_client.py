@@ -0,0 +1,281 @@
+import asyncio
+import os
+import json
+
+import httpx
+import pytest
+
+
+def test_send_queue_retries_429_and_keeps_chat_order():
+    from core.telegram import TelegramBot
+
+    sent = []
+    throttled = {"done": False}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if body["text"] == "first" and not throttled["done"]:
+            throttled["done"] = True
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0}})
+        sent.append((body["chat_id"], body["text"], body.get("reply_to_message_id")))
+        return httpx.Response(200, json={"ok": True})
+
+    bot = TelegramBot(
+        token="123:abc",
+        api_base="https://telegram.test",
+        transport=httpx.MockTransport(handler),
+        global_rate=1000,
+        chat_rate=1000,
+    )
+
+    async def run():
+        assert bot.enqueue_message(1, "first", reply_to=9)
+        assert bot.enqueue_message(1, "second")
+        assert bot.enqueue_message(2, "other")
+        assert not bot.enqueue_message(1, "")
+        await bot.drain(timeout=5)
+        assert bot.pending() == 0
+        await bot.close()
+
+    asyncio.run(run())
+    assert throttled["done"]
+    assert [m for m in sent if m[0] == 1] == [(1, "first", 9), (1, "second", None)]
+    assert (2, "other", None) in sent
+
+
+def test_token_bucket_paces_after_burst():
+    from core.telegram import TokenBucket
+
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - start
+
+    elapsed = asyncio.run(run())
+    # Two tokens are banked; the other two wait ~50ms each
+    assert elapsed >= 0.08
+
+
+def test_webhook_acks_and_dedupes_update_ids(monkeypatch, temp_dirs):
+    import config
+    from fastapi.testclient import TestClient
+    from main import app
+    from routes import integrations
+
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", "123:abc")
+    monkeypatch.setattr(config, "TELEGRAM_WEBHOOK_SECRET", None)
+    replies = []
+
+    async def fake_send(chat_id, text, reply_to=None):
+        replies.append((chat_id, reply_to))
+
+    monkeypatch.setattr(integrations, "_telegram_send_message", fake_send)
+
+    update = {
+        "update_id": 501,
+        "message": {"message_id": 7, "chat": {"id": 42}, "text": "Buy milk and eggs"},
+    }
+    with TestClient(app) as client:
+        assert client.post("/api/integrations/telegram/webhook", json=update).json() == {"ok": True}
+        assert client.post("/api/integrations/telegram/webhook", json=update).json() == {"ok": True}
+        assert client.post("/api/integrations/telegram/webhook", json={"message": {}}).status_code == 400
+        client.portal.call(integrations.TELEGRAM_UPDATES.join)
+
+    assert replies == [(42, 7)]
+    notes = [n for n in os.listdir(temp_dirs.trans) if n.endswith(".json")]
+    assert len(notes) == 1
+    done_dir = os.path.join(config.TELEGRAM_UPDATES_DIR, "done")
+    assert os.listdir(done_dir) == ["501.json"]
+
+
+def test_download_streams_to_disk_with_hash(tmp_path):
+    import hashlib
+    from core.telegram import TelegramBot
+
+    blob = os.urandom(700 * 1024)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/getFile"):
+            return httpx.Response(200, json={"ok": True, "result": {"file_path": "voice/file_1.oga"}})
+        assert request.url.path == "/file/bot123:abc/voice/file_1.oga"
+        return httpx.Response(200, content=blob)
+
+    bot = TelegramBot(token="123:abc", api_base="https://telegram.test", transport=httpx.MockTransport(handler))
+
+    async def run():
+        try:
+            return await bot.download_to_file("f1", str(tmp_path / "incoming"))
+        finally:
+            await bot.close()
+
+    path, name, sha256, size = asyncio.run(run())
+    assert name == "file_1.oga" and size == len(blob)
+    assert sha256 == hashlib.sha256(blob).hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == blob
+
+
+def test_poller_feeds_inbox_and_persists_offset(monkeypatch, tmp_path):
+    import config
+    from core.telegram import TelegramBot, TelegramPoller, TelegramUpdateInbox
+
+    monkeypatch.setattr(config, "TELEGRAM_UPDATES_DIR", str(tmp_path / "updates"))
+    backlog = [{"update_id": i, "message": {"text": f"m{i}"}} for i in (10, 11, 12)]
+    offsets = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        offset = body.get("offset", 0)
+        offsets.append(offset)
+        batch = [u for u in backlog if u["update_id"] >= offset][: body["limit"]]
+        return httpx.Response(200, json={"ok": True, "result": batch})
+
+    handled = []
+
+    async def handle(update):
+        handled.append(update["update_id"])
+
+    bot = TelegramBot(token="123:abc", api_base="https://telegram.test", transport=httpx.MockTransport(handler))
+
+    async def run():
+        inbox = TelegramUpdateInbox(handle, workers=2)
+        poller = TelegramPoller(bot, inbox, poll_timeout=0, limit=2)
+        assert await poller.poll_once() == 2
+        assert await poller.poll_once() == 1
+        assert await poller.poll_once() == 0
+        await inbox.join()
+        await inbox.stop()
+        # A fresh poller resumes from the persisted offset
+        assert TelegramPoller(bot, inbox).offset == 13
+        await bot.close()
+
+    asyncio.run(run())
+    assert offsets == [0, 12, 13]
+    assert sorted(handled) == [10, 11, 12]
+
+
+def test_integration_logging_samples_payloads_lazily(monkeypatch, caplog):
+    import logging
+    import config
+    from core import integration_logging
+
+    update = {
+        "update_id": 9,
+        "message": {"message_id": 3, "chat": {"id": 42}, "voice": {"file_id": "x", "file_size": 2048, "mime_type": "audio/ogg"}},
+    }
+    fields = integration_logging.telegram_update_fields(update)
+    assert fields == {"update_id": 9, "chat_id": 42, "message_id": 3, "media": "voice", "size": 2048, "mime": "audio/ogg"}
+
+    class Boom:
+        def __str__(self):
+            raise AssertionError("payload should not be formatted")
+
+    log = logging.getLogger("test.integration")
+    monkeypatch.setattr(config, "INTEGRATION_LOG_SAMPLE_RATE", 0.0)
+    with caplog.at_level(logging.INFO, logger="test.integration"):
+        integration_logging.log_event(log, "tg", fields, payload={"big": Boom()})
+    assert [r.getMessage() for r in caplog.records] == [
+        "[tg] update_id=9 chat_id=42 message_id=3 media=voice size=2048 mime=audio/ogg"
+    ]
+
+    caplog.clear()
+    monkeypatch.setattr(config, "INTEGRATION_LOG_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(config, "INTEGRATION_LOG_PAYLOAD_LIMIT", 10)
+    with caplog.at_level(logging.INFO, logger="test.integration"):
+        integration_logging.log_event(log, "tg", {"a": 1}, payload={"text": "x" * 50})
+    assert caplog.records[1].getMessage().startswith('[tg] sampled payload={"text": "')
+    assert "(+" in caplog.records[1].getMessage()
+
+
+def test_webhook_voice_note_replies_via_followup_without_blocking(monkeypatch, temp_dirs):
+    import time
+
+    import config
+    import core.note_logic as note_logic
+    from fastapi.testclient import TestClient
+    from main import app
+    from routes import integrations
+
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", "123:abc")
+    monkeypatch.setattr(config, "TELEGRAM_WEBHOOK_SECRET", None)
+    monkeypatch.setattr(note_logic, "transcribe_and_save", lambda path: None)
+
+    async def fake_download(file_id):
+        directory = note_logic.incoming_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{file_id}.mp3")
+        with open(path, "wb") as f:
+            f.write(b"ID3audio")
+        return path, f"{file_id}.mp3", "0" * 64, 8
+
+    followups = []
+
+    async def fake_followup(chat_id, message_id, filename, fallback_tags=None):
+        followups.append((chat_id, message_id, filename))
+
+    monkeypatch.setattr(integrations, "_telegram_download_file", fake_download)
+    monkeypatch.setattr(integrations, "_send_followup_when_ready", fake_followup)
+
+    update = {"update_id": 601, "message": {"message_id": 3, "chat": {"id": 42}, "voice": {"file_id": "v1"}}}
+    started = time.monotonic()
+    with TestClient(app) as client:
+        assert client.post("/api/integrations/telegram/webhook", json=update).json() == {"ok": True}
+        client.portal.call(integrations.TELEGRAM_UPDATES.join)
+        for _ in range(100):
+            if followups:
+                break
+            time.sleep(0.01)
+    # The worker did not sit in the 30s inline transcription wait
+    assert time.monotonic() - started < 10
+    assert len(followups) == 1 and followups[0][:2] == (42, 3)
+    assert followups[0][2].endswith(".mp3")
+    assert not integrations._FOLLOWUPS
+
+
+def test_poller_deletes_webhook_before_polling(monkeypatch, tmp_path):
+    import config
+    from core.telegram import TelegramBot, TelegramPoller, TelegramUpdateInbox
+
+    monkeypatch.setattr(config, "TELEGRAM_UPDATES_DIR", str(tmp_path / "updates"))
+    calls = []
+    state = {"webhook": True}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        method = request.url.path.rsplit("/", 1)[-1]
+        calls.append(method)
+        if method == "deleteWebhook":
+            state["webhook"] = False
+            return httpx.Response(200, json={"ok": True, "result": True})
+        if state["webhook"]:
+            return httpx.Response(409, json={"ok": False, "description": "Conflict: can't use getUpdates method while webhook is active"})
+        # Someone sets the webhook again; the poller backs off and re-deletes it
+        state["webhook"] = True
+        return httpx.Response(200, json={"ok": True, "result": [{"update_id": 5, "message": {"text": "hi"}}]})
+
+    handled = []
+
+    async def handle(update):
+        handled.append(update["update_id"])
+
+    bot = TelegramBot(token="123:abc", api_base="https://telegram.test", transport=httpx.MockTransport(handler))
+
+    async def run():
+        inbox = TelegramUpdateInbox(handle, workers=1)
+        poller = TelegramPoller(bot, inbox, poll_timeout=0)
+        with pytest.raises(RuntimeError):
+            await poller.poll_once()
+        poller.start()
+        for _ in range(100):
+            if handled:
+                break
+            await asyncio.sleep(0.01)
+        await poller.stop()
+        await inbox.stop()
+        await bot.close()
+
+    asyncio.run(run())
+    assert calls[:3] == ["getUpdates", "deleteWebhook", "getUpdates"]
+    assert handled == [5]
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+
+def test_resumable_upload_resumes_and_creates_note(monkeypatch, temp_dirs):
+    import core.note_logic as note_logic
+    from main import app
+
+    monkeypatch.setattr(note_logic, "transcribe_and_save", lambda path: None)
+    blob = os.urandom(10_000)
+    digest = hashlib.sha256(blob).hexdigest()
+    client = TestClient(app)
+
+    resp = client.post("/api/uploads", json={"filename": "long.mp3", "size": len(blob), "content_type": "audio/mpeg", "sha256": digest, "folder": "Work"})
+    assert resp.status_code == 201
+    upload_id = resp.json()["upload_id"]
+
+    assert client.put(f"/api/uploads/{upload_id}?offset=0", content=blob[:4000]).json() == {"offset": 4000}
+    # A retried chunk at a stale offset is rejected with the real offset
+    stale = client.put(f"/api/uploads/{upload_id}?offset=0", content=blob[:4000])
+    assert stale.status_code == 409 and stale.json()["offset"] == 4000
+    # Finalizing early reports how far the upload got
+    early = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert early.status_code == 409 and early.headers["upload-offset"] == "4000"
+
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    assert status == {"upload_id": upload_id, "offset": 4000, "size": len(blob)}
+    resp = client.put(f"/api/uploads/{upload_id}", content=blob[4000:], headers={"Upload-Offset": "4000"})
+    assert resp.json() == {"offset": len(blob)}
+    assert client.put(f"/api/uploads/{upload_id}?offset={len(blob)}", content=b"x").status_code == 409
+
+    resp = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert resp.status_code == 200
+    filename = resp.json()["filename"]
+    with open(os.path.join(temp_dirs.voice, filename), "rb") as f:
+        assert f.read() == blob
+    with open(os.path.join(temp_dirs.trans, filename.replace(".mp3", ".json"))) as f:
+        meta = json.load(f)
+    assert meta["upload_sha256"] == digest and meta["folder"] == "Work"
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+
+
+def test_resumable_upload_rejects_bad_hash_and_prunes_stale(monkeypatch, temp_dirs):
+    from core import uploads
+    from main import app
+
+    client = TestClient(app)
+    assert client.post("/api/uploads", json={"filename": "a.mp3", "size": 0}).status_code == 400
+    assert client.get("/api/uploads/..%2Fsessions").status_code == 404
+
+    upload_id = client.post("/api/uploads", json={"filename": "a.mp3", "size": 3}).json()["upload_id"]
+    client.put(f"/api/uploads/{upload_id}?offset=0", content=b"abc")
+    resp = client.post(f"/api/uploads/{upload_id}/finalize", json={"sha256": "0" * 64})
+    assert resp.status_code == 400
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+
+    upload_id = client.post("/api/uploads", json={"filename": "b.mp3", "size": 3}).json()["upload_id"]
+    assert uploads.prune_stale_uploads(max_age=3600) == 0
+    assert uploads.prune_stale_uploads(max_age=-1) == 1
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+    assert client.delete(f"/api/uploads/{upload_id}").status_code == 404
+
+
+def test_failed_transcode_keeps_upload_for_retry(monkeypatch, temp_dirs):
+    import shutil
+    import core.note_logic as note_logic
+    from main import app
+
+    monkeypatch.setattr(note_logic, "transcribe_and_save", lambda path: None)
+    client = TestClient(app)
+    upload_id = client.post("/api/uploads", json={"filename": "memo.webm", "size": 3}).json()["upload_id"]
+    client.put(f"/api/uploads/{upload_id}?offset=0", content=b"abc")
+
+    def broken_ffmpeg(cmd, **kwargs):
+        raise OSError("ffmpeg not found")
+
+    monkeypatch.setattr(note_logic.subprocess, "run", broken_ffmpeg)
+    resp = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert resp.status_code == 400 and "normalize" in resp.text
+    assert client.get(f"/api/uploads/{upload_id}").json()["offset"] == 3
+
+    monkeypatch.setattr(note_logic.subprocess, "run", lambda cmd, **kwargs: shutil.copyfile(cmd[3], cmd[-1]))
+    resp = client.post(f"/api/uploads/{upload_id}/finalize")
+    assert resp.status_code == 200 and resp.json()["filename"].endswith(".m4a")
+    assert client.get(f"/api/uploads/{upload_id}").status_code == 404
+
+
+def test_concurrent_finalize_creates_one_note(monkeypatch, temp_dirs):
+    import asyncio
+    import core.note_logic as note_logic
+    from fastapi import BackgroundTasks
+    from core import uploads
+
+    monkeypatch.setattr(note_logic, "transcribe_and_save", lambda path: None)
+    upload_id = uploads.create_upload("a.mp3", 3)["upload_id"]
+
+    async def body():
+        yield b"abc"
+
+    async def run():
+        await uploads.append_chunk(upload_id, 0, body())
+        return await asyncio.gather(
+            uploads.finalize_upload(upload_id, BackgroundTasks()),
+            uploads.finalize_upload(upload_id, BackgroundTasks()),
+            return_exceptions=True,
+        )
+
+    first, second = asyncio.run(run())
+    assert first["filename"].endswith(".mp3")
+    assert isinstance(second, KeyError)
+    assert [n for n in os.listdir(temp_dirs.voice) if n.endswith(".mp3")] == [first["filename"]]
@@ -0,0 +1,89 @@
+import json
+import os
+import struct
+import time
+import wave
+
+from fastapi.testclient import TestClient
+
+
+def _write_wav(path, samples, rate=8000, channels=1):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+
+def test_peaks_are_built_on_demand_and_cached(temp_dirs, monkeypatch):
+    import config
+    from main import app
+
+    monkeypatch.setattr(config, "PEAKS_BINS", 4)
+    # One second of stereo: quiet first half, loud second half (left channel only)
+    frames = []
+    for i in range(8000):
+        left = 1000 if i < 4000 else 32000
+        frames += [left if i % 2 else -left, 0]
+    _write_wav(os.path.join(temp_dirs.voice, "a.wav"), frames, channels=2)
+    client = TestClient(app)
+
+    # Lookups that must stay cheap don't decode
+    assert client.get("/api/notes/a.wav/peaks", params={"build": 0}).status_code == 404
+    assert not os.path.exists(os.path.join(config.PEAKS_DIR, "a.json"))
+    resp = client.get("/api/notes/a.wav/peaks")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["bins"] == 4 and data["duration_seconds"] == 1.0
+    assert len(data["peaks"]) == 8
+    assert all(-128 <= v <= 127 for v in data["peaks"])
+    # Loud half has larger peaks than the quiet half
+    assert data["peaks"][7] > data["peaks"][1] > 0
+    assert data["peaks"][6] < data["peaks"][0] < 0
+    assert os.path.exists(os.path.join(config.PEAKS_DIR, "a.json"))
+
+    assert client.get("/api/notes/a.wav/peaks", headers={"If-None-Match": resp.headers["etag"]}).status_code == 304
+    assert client.get("/api/notes/a.wav/peaks", params={"build": 0}).json() == data
+    assert client.get("/api/notes/missing.wav/peaks").status_code == 404
+
+    client.delete("/api/notes/a.wav")
+    assert not os.path.exists(os.path.join(config.PEAKS_DIR, "a.json"))
+
+
+def test_peaks_backfill_job(temp_dirs):
+    import config
+    from main import app
+
+    for base in ("a", "b"):
+        _write_wav(os.path.join(temp_dirs.voice, f"{base}.wav"), [0, 100, -100, 50] * 100)
+        with open(os.path.join(temp_dirs.trans, f"{base}.json"), "w") as f:
+            json.dump({"filename": f"{base}.wav", "title": base, "transcription": "text"}, f)
+    with open(os.path.join(temp_dirs.trans, "t.json"), "w") as f:
+        json.dump({"filename": "t.txt", "title": "t", "transcription": "text"}, f)
+    client = TestClient(app)
+    client.get("/api/notes/a.wav/peaks")
+
+    resp = client.post("/api/notes/peaks/backfill")
+    assert resp.status_code == 202
+    job_id = resp.json()["id"]
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.02)
+    assert job["status"] == "completed"
+    assert job["result"] == {"total": 2, "built": 1, "skipped": 1, "failed": 0}
+    assert sorted(os.listdir(config.PEAKS_DIR)) == ["a.json", "b.json"]
+
+
+def test_wav_downmix_averages_channels_in_blocks(tmp_path, monkeypatch):
+    from core import waveform
+
+    path = str(tmp_path / "s.wav")
+    _write_wav(path, [1000, 3000, -2000, -4001, 32767, 32767] * 5, channels=2)
+    monkeypatch.setattr(waveform, "WAV_BLOCK_FRAMES", 4)
+    expected = struct.pack("<3h", 2000, -3000, 32767) * 5
+    for np in (waveform.np, None):
+        monkeypatch.setattr(waveform, "np", np)
+        pcm, rate = waveform._wav_pcm(path)
+        assert rate == 8000 and pcm == expected